@@ -1,7 +1,9 @@
 import asyncio
 import json
 import threading
-from typing import Dict
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict
 from uuid import uuid4
 
 from typing import Any, Dict
@@ -20,7 +22,6 @@ from auth.repository import AuthRepository
 from bot.repository import ThreadModel
 from bot.service import BotService
 from chat import ChatEngine, ChatEngineSelector
-from chat.exceptions import ChatResponseGenerationError
 
 from .reaction_event import Reaction, ReactionEventCreate
 from .reaction_event_repository import ReactionEventRepository
@@ -39,6 +40,96 @@ class MissingChatbot(Exception):
     message = "Whoops. Can't find the chatbot you're looking for."
 
 
+# Slack allows about one chat.update per second per channel; stay under it while streaming
+STREAM_UPDATE_INTERVAL = 1.5
+STREAM_CURSOR = " :writing_hand:"
+STREAM_FINAL_ATTEMPTS = 3
+
+
+class StreamedMessage:
+    """Edits a posted Slack message as response pieces arrive.
+
+    Pieces are coalesced: the first one is shown right away, later ones at most once every `interval`
+    seconds. A 429 from Slack pushes the next update back by its Retry-After. `finish` always sends the
+    complete text, waiting out rate limits if it has to.
+    """
+
+    def __init__(
+        self,
+        client: WebClient,
+        channel: str,
+        ts: str,
+        interval: float = STREAM_UPDATE_INTERVAL,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.client = client
+        self.channel = channel
+        self.ts = ts
+        self.interval = interval
+        self.clock = clock
+        self.sleep = sleep
+        self.text = ""
+        self.sent_text = None
+        self.next_update = 0.0
+        self.logger = logger.bind(service="StreamedMessage")
+
+    @staticmethod
+    def _retry_after(e: SlackApiError) -> float | None:
+        if e.response is None or e.response.status_code != 429:
+            return None
+        return float(e.response.headers.get("Retry-After", 1))
+
+    def _update(self, text: str) -> float | None:
+        """Sends `text`; returns the seconds to back off for if Slack rate limited the update."""
+        try:
+            self.client.chat_update(channel=self.channel, ts=self.ts, text=text)
+        except SlackApiError as e:
+            retry_after = self._retry_after(e)
+            if retry_after is None:
+                raise
+            self.logger.bind(retry_after=retry_after).warning("rate limited while streaming response")
+            return retry_after
+        self.sent_text = text
+        return None
+
+    def _due(self, now: float) -> bool:
+        return bool(self.text.strip()) and now >= self.next_update
+
+    def _flush(self, now: float):
+        retry_after = self._update(self.text + STREAM_CURSOR)
+        self.next_update = now + max(self.interval, retry_after or 0)
+
+    def append(self, piece: str):
+        self.text += piece
+        now = self.clock()
+        if self._due(now):
+            self._flush(now)
+
+    async def aappend(self, piece: str):
+        """append for an event loop; the Slack call, when one is due, runs on a thread."""
+        self.text += piece
+        now = self.clock()
+        if self._due(now):
+            await asyncio.to_thread(self._flush, now)
+
+    def finish(self, text: str | None = None):
+        if text is not None:
+            self.text = text
+        if self.text == self.sent_text:
+            return
+        for _ in range(STREAM_FINAL_ATTEMPTS - 1):
+            retry_after = self._update(self.text)
+            if retry_after is None:
+                return
+            self.sleep(retry_after)
+        self.client.chat_update(channel=self.channel, ts=self.ts, text=self.text)
+        self.sent_text = self.text
+
+    async def afinish(self, text: str | None = None):
+        await asyncio.to_thread(self.finish, text)
+
+
 class SlackAdapter:
 
     def __init__(
@@ -59,10 +150,22 @@ class SlackAdapter:
         self.handler = SlackRequestHandler(self.app)
         self.auth_respository = auth_respository
         self.slack_config = slack_config
+        self._generation_loop = None
+        self._generation_loop_lock = threading.Lock()
 
     def logger(self):
         return logger.bind(service="SlackAdapter")
 
+    def generation_loop(self) -> asyncio.AbstractEventLoop:
+        """The event loop, on a single thread, that runs every answer being generated; started on first use."""
+        with self._generation_loop_lock:
+            if self._generation_loop is None:
+                self._generation_loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._generation_loop.run_forever, name="slack-generation", daemon=True
+                ).start()
+        return self._generation_loop
+
     # Function to listen for events on Slack. No need to test this since this is purely dependent on
     # Bolt
     async def handle_events(self, req: Request):  # pragma: no cover
@@ -245,7 +348,7 @@ class SlackAdapter:
                 source_adapter_message_id, 
                 source_adapter_user_id)
 
-    def send_generated_response(
+    async def asend_generated_response(
         self,
         channel: str,
         ts: str,
@@ -266,25 +369,31 @@ class SlackAdapter:
             with sentry_sdk.start_transaction(
                 trace_id=trace_id,
                 op="send_generated_response",
-                name=f"{__name__}.{self.send_generated_response.__qualname__}",
+                name=f"{__name__}.{self.asend_generated_response.__qualname__}",
             ):
+                message = StreamedMessage(client, channel, ts)
                 try:
-                    chatbot_response = engine.generate_response(
+                    async for piece in engine.agenerate_response_stream(
                         query=question, access_level=access_level
-                    )
+                    ):
+                        await message.aappend(piece)
                     self.logger().info("sending generated response")
-                    client.chat_update(
-                        channel=channel, ts=ts, text=chatbot_response
-                    )
+                    await message.afinish()
 
-                except ChatResponseGenerationError as e:  # pragma: no cover
+                except Exception as e:
+                    # whatever failed, the loading message must not be left streaming forever
                     sentry_sdk.capture_exception(e)
                     self.logger().error(e)
-                    client.chat_update(
-                        channel=channel,
-                        ts=ts,
-                        text="Something went wrong when trying to generate your response.",
-                    )
+                    await message.afinish("Something went wrong when trying to generate your response.")
+
+    def _report_generation_failure(self, future: Future):
+        """Done-callback for answers run on the generation loop, whose exceptions would otherwise go unseen."""
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            sentry_sdk.capture_exception(error)
+            self.logger().bind(err=str(error)).error("failed to send generated response")
 
     def ask_form(self, _: Request):
         return {
@@ -454,7 +563,9 @@ class SlackAdapter:
                 thread_ts=thread_ts,
             )
 
-            bot_engine = self.engine_selector.select_engine(engine_type=chatbot.model)
+            bot_engine = self.engine_selector.select_engine(
+                engine_type=chatbot.model, instructions=chatbot.system_prompt
+            )
 
             if history:
                 for event in history:
@@ -462,19 +573,19 @@ class SlackAdapter:
                     content = event.get("content")
                     bot_engine.add_chat_history(role, content)
 
-            send_response_thread = threading.Thread(
-                target=self.send_generated_response,
-                kwargs={
-                    "channel": channel_id,
-                    "ts": loading_message["ts"],
-                    "engine": bot_engine,
-                    "question": question,
-                    "access_level": access_level,
-                    "client": client
-                },
+            # answered on the generation loop, so an answer in flight doesn't hold a thread of its own
+            answer = asyncio.run_coroutine_threadsafe(
+                self.asend_generated_response(
+                    channel=channel_id,
+                    ts=loading_message["ts"],
+                    engine=bot_engine,
+                    question=question,
+                    access_level=access_level,
+                    client=client,
+                ),
+                self.generation_loop(),
             )
-
-            send_response_thread.start()
+            answer.add_done_callback(self._report_generation_failure)
 
             return Response(status_code=200)
 
@@ -579,6 +690,9 @@ class SlackAdapter:
         INTRODUCTION_KEY_WORD = "asked:"
 
         for i, message in enumerate(all_messages):
+            if "ts" in event and message.get("ts") == event["ts"]:
+                # the reply being answered; the engine gets it as the question, so it isn't history yet
+                continue
             if i == 0:
                 question = self.extract_question(message, INTRODUCTION_KEY_WORD)
                 if question == None:
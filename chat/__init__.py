@@ -2,6 +2,13 @@ import openai as op
 
 from bot import ModelEngine
 
+from .clients import (
+    build_anthropic_client,
+    build_async_anthropic_client,
+    build_async_openai_client,
+    build_openai_client,
+)
+from .history import HistoryWindow
 from .openai_chat import ChatOpenAI
 from .engine import ChatEngine
 from .anthropic_chat import ChatAnthropic
@@ -18,10 +25,22 @@ class ChatEngineSelector:
         postgres_user: str,
         postgres_password: str,
         postgres_host: str,
-        postgres_port: int
+        postgres_port: int,
+        postgres_pool_min_size: int = 2,
+        postgres_pool_max_size: int = 10,
     ) -> None:
+        # the retriever's query embeddings still go through the module-level client
         op.api_key = openai_api_key
-        self.anthropic_api_key = anthropic_api_key
+        # built once and borrowed by every engine, so questions don't pay for connection setup
+        self.openai_client = build_openai_client(openai_api_key)
+        self.anthropic_client = build_anthropic_client(anthropic_api_key)
+        self.async_openai_client = build_async_openai_client(openai_api_key)
+        self.async_anthropic_client = build_async_anthropic_client(anthropic_api_key)
+        # shared too, so thread summaries made for one question are reused by the follow-ups
+        self.history_windows = {
+            ModelEngine.OPENAI: HistoryWindow(ChatOpenAI.model),
+            ModelEngine.ANTHROPIC: HistoryWindow(ChatAnthropic.model),
+        }
         
         self.retriever = Retriever(
             PostgresHandler(
@@ -30,12 +49,27 @@ class ChatEngineSelector:
                 password=postgres_password,
                 host=postgres_host,
                 port=postgres_port,
-                dimension=1536
-            )
+                dimension=1536,
+                min_connections=postgres_pool_min_size,
+                max_connections=postgres_pool_max_size,
+            ),
+            async_client=self.async_openai_client,
         )
 
-    def select_engine(self, engine_type: ModelEngine) -> ChatEngine:
+    def select_engine(self, engine_type: ModelEngine, instructions: str | None = None) -> ChatEngine:
         if engine_type == ModelEngine.OPENAI:
-            return ChatOpenAI(self.retriever)
+            return ChatOpenAI(
+                self.retriever,
+                client=self.openai_client,
+                history_window=self.history_windows[engine_type],
+                instructions=instructions,
+                async_client=self.async_openai_client,
+            )
         elif engine_type == ModelEngine.ANTHROPIC:
-            return ChatAnthropic(self.retriever, api_key=self.anthropic_api_key)
+            return ChatAnthropic(
+                self.retriever,
+                client=self.anthropic_client,
+                history_window=self.history_windows[engine_type],
+                instructions=instructions,
+                async_client=self.async_anthropic_client,
+            )
@@ -1,15 +1,32 @@
-from anthropic import Anthropic
+import asyncio
+from typing import AsyncIterator, Dict, Iterator, List
+
+from anthropic import Anthropic, AsyncAnthropic
 
 from rag.retriever.retriever import Retriever
 
-from .engine import ChatEngine
+from .engine import SUMMARY_HEADER, ChatEngine
+from .history import HistoryWindow
+
+# cached prefixes live for five minutes after their last use
+CACHE_CONTROL = {"type": "ephemeral"}
 
 
 class ChatAnthropic(ChatEngine):
+    model = "claude-3-haiku-20240307"
 
-    def __init__(self, retriever: Retriever, api_key: str) -> None:
-        super().__init__(retriever)
-        self.client = Anthropic(api_key=api_key)
+    def __init__(
+        self,
+        retriever: Retriever,
+        api_key: str | None = None,
+        client: Anthropic | None = None,
+        history_window: HistoryWindow | None = None,
+        instructions: str | None = None,
+        async_client: AsyncAnthropic | None = None,
+    ) -> None:
+        super().__init__(retriever, history_window, instructions)
+        self.client = client if client is not None else Anthropic(api_key=api_key)
+        self.async_client = async_client
 
     def _get_generate_system(self) -> dict:
         return {
@@ -20,11 +37,67 @@ class ChatAnthropic(ChatEngine):
                         """,
         }
 
-    def _api_call(self, full_input: str):
+    def _complete(self, system: str, messages: List[dict]) -> str:
         response = self.client.messages.create(
-            model="claude-3-haiku-20240307",
+            model=self.model,
             max_tokens=1024,
-            system=self._get_generate_system()["content"],
-            messages=self.history[1:],
+            system=system,
+            messages=messages,
         )
         return response.content[0].text
+
+    def _request(self) -> dict:
+        """Builds the request with one cache breakpoint, on the thread's previous turn.
+
+        Caching is by prefix, so that breakpoint covers the system prompt, the summary and the earlier turns, all
+        of which the next question in the thread starts with. The system prompt alone is far below the minimum
+        cacheable length, so a breakpoint after it would never be written.
+        """
+        system, summary, turns = self._prompt()
+        blocks = [{"type": "text", "text": system}]
+        if summary:
+            blocks.append({"type": "text", "text": f"{SUMMARY_HEADER}{summary}"})
+        messages = [dict(turn) for turn in turns]
+        if len(messages) > 1:
+            messages[-2]["content"] = [
+                {"type": "text", "text": messages[-2]["content"], "cache_control": CACHE_CONTROL}
+            ]
+        return {"model": self.model, "max_tokens": 1024, "system": blocks, "messages": messages}
+
+    @staticmethod
+    def _usage(usage) -> Dict[str, int]:
+        return {
+            "input_tokens": usage.input_tokens,
+            "cache_read_tokens": getattr(usage, "cache_read_input_tokens", None) or 0,
+            "cache_write_tokens": getattr(usage, "cache_creation_input_tokens", None) or 0,
+            "output_tokens": usage.output_tokens,
+        }
+
+    def _api_call(self, full_input: str):
+        response = self.client.messages.create(**self._request())
+        self._report_usage(self._usage(response.usage))
+        return response.content[0].text
+
+    def _api_stream(self, full_input: str) -> Iterator[str]:
+        with self.client.messages.stream(**self._request()) as stream:
+            yield from stream.text_stream
+            self._report_usage(self._usage(stream.get_final_message().usage))
+
+    def _get_async_client(self) -> AsyncAnthropic:
+        if self.async_client is None:
+            self.async_client = AsyncAnthropic(api_key=self.client.api_key)
+        return self.async_client
+
+    async def _aapi_call(self, full_input: str) -> str:
+        # building the prompt may summarize old turns, which blocks
+        request = await asyncio.to_thread(self._request)
+        response = await self._get_async_client().messages.create(**request)
+        self._report_usage(self._usage(response.usage))
+        return response.content[0].text
+
+    async def _aapi_stream(self, full_input: str) -> AsyncIterator[str]:
+        request = await asyncio.to_thread(self._request)
+        async with self._get_async_client().messages.stream(**request) as stream:
+            async for text in stream.text_stream:
+                yield text
+            self._report_usage(self._usage((await stream.get_final_message()).usage))
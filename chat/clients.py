@@ -0,0 +1,54 @@
+import httpx
+from anthropic import Anthropic, AsyncAnthropic
+from anthropic import DefaultAsyncHttpxClient as AnthropicAsyncHttpxClient
+from anthropic import DefaultHttpxClient as AnthropicHttpxClient
+from openai import AsyncOpenAI, OpenAI
+from openai import DefaultAsyncHttpxClient as OpenAIAsyncHttpxClient
+from openai import DefaultHttpxClient as OpenAIHttpxClient
+
+# long enough for a full completion, but give up quickly on a provider that can't be reached
+LLM_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+LLM_MAX_RETRIES = 2
+# one pool per provider shared by every conversation, kept warm between questions
+LLM_CONNECTION_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=120.0)
+
+
+def build_openai_client(api_key: str) -> OpenAI:
+    """A long-lived OpenAI client; it is thread-safe, so one is shared by every engine."""
+    return OpenAI(
+        api_key=api_key,
+        timeout=LLM_TIMEOUT,
+        max_retries=LLM_MAX_RETRIES,
+        http_client=OpenAIHttpxClient(timeout=LLM_TIMEOUT, limits=LLM_CONNECTION_LIMITS),
+    )
+
+
+def build_anthropic_client(api_key: str) -> Anthropic:
+    """A long-lived Anthropic client; it is thread-safe, so one is shared by every engine."""
+    return Anthropic(
+        api_key=api_key,
+        timeout=LLM_TIMEOUT,
+        max_retries=LLM_MAX_RETRIES,
+        http_client=AnthropicHttpxClient(timeout=LLM_TIMEOUT, limits=LLM_CONNECTION_LIMITS),
+    )
+
+
+# the async clients' pools belong to the event loop that first uses them; keep each to one loop
+
+
+def build_async_openai_client(api_key: str) -> AsyncOpenAI:
+    return AsyncOpenAI(
+        api_key=api_key,
+        timeout=LLM_TIMEOUT,
+        max_retries=LLM_MAX_RETRIES,
+        http_client=OpenAIAsyncHttpxClient(timeout=LLM_TIMEOUT, limits=LLM_CONNECTION_LIMITS),
+    )
+
+
+def build_async_anthropic_client(api_key: str) -> AsyncAnthropic:
+    return AsyncAnthropic(
+        api_key=api_key,
+        timeout=LLM_TIMEOUT,
+        max_retries=LLM_MAX_RETRIES,
+        http_client=AnthropicAsyncHttpxClient(timeout=LLM_TIMEOUT, limits=LLM_CONNECTION_LIMITS),
+    )
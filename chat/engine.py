@@ -1,14 +1,35 @@
+import asyncio
 from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from loguru import logger
 
 from chat.exceptions import ChatResponseGenerationError
+from chat.history import HistoryWindow
 from rag.retriever.retriever import Retriever
 
+SUMMARY_SYSTEM = (
+    "Summarize the conversation you are given in under 150 words. Keep names, facts, numbers and decisions "
+    "the user may refer back to; drop pleasantries."
+)
+SUMMARY_HEADER = "Summary of the earlier conversation:\n"
+
 
 class ChatEngine(ABC):
+    model: str
 
-    def __init__(self, retriever: Retriever):
+    def __init__(
+        self,
+        retriever: Retriever,
+        history_window: Optional[HistoryWindow] = None,
+        instructions: Optional[str] = None,
+    ):
         self.history = [self._get_generate_system()]
         self.retriever = retriever
+        self.history_window = history_window if history_window is not None else HistoryWindow(self.model)
+        # the bot's own system prompt, sent after the engine's
+        self.instructions = instructions
+        self.last_usage: Optional[Dict[str, int]] = None
 
     @abstractmethod
     def _get_generate_system(self) -> dict:
@@ -18,27 +39,139 @@ class ChatEngine(ABC):
     def _api_call(self, full_input: str):
         """Abstract method for making the API call in the child classes."""
 
+    def _api_stream(self, full_input: str) -> Iterator[str]:
+        """Yields the response in pieces as the API produces them. Engines without a streaming API yield it whole."""
+        yield self._api_call(full_input)
+
+    async def _aapi_call(self, full_input: str) -> str:
+        """Async counterpart of _api_call. Engines without an async client run the blocking call on a thread."""
+        return await asyncio.to_thread(self._api_call, full_input)
+
+    async def _aapi_stream(self, full_input: str) -> AsyncIterator[str]:
+        """Async counterpart of _api_stream."""
+        yield await self._aapi_call(full_input)
+
+    @abstractmethod
+    def _complete(self, system: str, messages: List[dict]) -> str:
+        """A one-off completion outside the conversation, used for history summaries."""
+
+    def _summarize(self, previous_summary: Optional[str], turns: List[dict]) -> str:
+        transcript = "\n".join(f"{turn['role']}: {turn['content']}" for turn in turns)
+        if previous_summary:
+            transcript = f"Summary of what came before:\n{previous_summary}\n\n{transcript}"
+        return self._complete(SUMMARY_SYSTEM, [{"role": "user", "content": transcript}])
+
+    def _prompt(self) -> Tuple[str, Optional[str], List[dict]]:
+        """Returns the prompt in three parts, most stable first, so provider prompt caches can reuse the prefix:
+        the system prompt with the bot's instructions, a summary of the turns that no longer fit the history
+        window (None if they all do), and the newest turns that do."""
+        summary, turns = self.history_window.fit(self.history[1:], self._summarize)
+        system = self.history[0]["content"]
+        if self.instructions:
+            system += f"\n{self.instructions}"
+        return system, summary, turns
+
+    def _report_usage(self, usage: Dict[str, int]):
+        """Logs an answer's token usage; input_tokens counts only the part of the prompt not read from cache."""
+        self.last_usage = usage
+        logger.bind(service="ChatEngine", model=self.model, **usage).info("llm usage")
+
     def retrieve(self, query: str, access_level: int):
         return self.retriever.query(query, access_level)
 
-    def generate_response(self, query: str, access_level: int = 1) -> str:
-        if not query:
-            return ""
-        
+    async def aretrieve(self, query: str, access_level: int):
+        return await self.retriever.aquery(query, access_level)
+
+    def _add_user_turn(self, query: str, context) -> dict:
+        full_input = f"Given a context: {context}\n Given a query: {query}\n Please answer query based on the given context." if context else query
+
+        self.add_chat_history("user", full_input)
+        return self.history[-1]
+
+    def _prepare_input(self, query: str, access_level: int) -> dict:
+        """Adds the user turn, with the retrieved context, to the history and returns it."""
         if not access_level or access_level < 1:
             access_level = 1
         
-        context = self.retrieve(query, access_level)
-        full_input = f"Given a context: {context}\n Given a query: {query}\n Please answer query based on the given context." if context else query
+        return self._add_user_turn(query, self.retrieve(query, access_level))
 
-        self.add_chat_history("user", full_input)
+    async def _aprepare_input(self, query: str, access_level: int) -> dict:
+        if not access_level or access_level < 1:
+            access_level = 1
+
+        return self._add_user_turn(query, await self.aretrieve(query, access_level))
+
+    def generate_response(self, query: str, access_level: int = 1) -> str:
+        if not query:
+            return ""
+
+        turn = self._prepare_input(query, access_level)
 
         try:
-            assistant_response = self._api_call(full_input)
+            assistant_response = self._api_call(turn["content"])
             self.add_chat_history("assistant", assistant_response)
             return assistant_response
         except Exception as e:
             raise ChatResponseGenerationError(f"Error generating response: {str(e)}")
+        finally:
+            # the context is only needed for this answer; later turns see the bare query
+            turn["content"] = query
+
+    def generate_response_stream(self, query: str, access_level: int = 1) -> Iterator[str]:
+        """Like generate_response, but yields the response piece by piece as it is generated."""
+        if not query:
+            return
+
+        turn = self._prepare_input(query, access_level)
+
+        pieces = []
+        try:
+            for piece in self._api_stream(turn["content"]):
+                pieces.append(piece)
+                yield piece
+        except Exception as e:
+            raise ChatResponseGenerationError(f"Error generating response: {str(e)}")
+        finally:
+            turn["content"] = query
+        self.add_chat_history("assistant", "".join(pieces))
+
+    async def agenerate_response(self, query: str, access_level: int = 1) -> str:
+        """Async generate_response: retrieval stages run concurrently and the LLM is called with the async client,
+        so an answer in flight holds no thread."""
+        if not query:
+            return ""
+
+        turn = None
+        try:
+            # retrieval runs inside the try too, so a failed stage surfaces like a failed completion
+            turn = await self._aprepare_input(query, access_level)
+            assistant_response = await self._aapi_call(turn["content"])
+            self.add_chat_history("assistant", assistant_response)
+            return assistant_response
+        except Exception as e:
+            raise ChatResponseGenerationError(f"Error generating response: {str(e)}")
+        finally:
+            if turn is not None:
+                turn["content"] = query
+
+    async def agenerate_response_stream(self, query: str, access_level: int = 1) -> AsyncIterator[str]:
+        """Async generate_response_stream."""
+        if not query:
+            return
+
+        turn = None
+        pieces = []
+        try:
+            turn = await self._aprepare_input(query, access_level)
+            async for piece in self._aapi_stream(turn["content"]):
+                pieces.append(piece)
+                yield piece
+        except Exception as e:
+            raise ChatResponseGenerationError(f"Error generating response: {str(e)}")
+        finally:
+            if turn is not None:
+                turn["content"] = query
+        self.add_chat_history("assistant", "".join(pieces))
 
     def reset_history(self):
         """Reset the chat history."""
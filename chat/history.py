@@ -0,0 +1,115 @@
+import functools
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+import tiktoken
+from loguru import logger
+
+HISTORY_TOKEN_BUDGET = 3000
+# for models without a local tokenizer (e.g. Claude), a rough estimate that errs on the high side
+CHARS_PER_TOKEN = 3
+# role and separators each message costs on top of its content
+MESSAGE_OVERHEAD_TOKENS = 4
+
+Summarize = Callable[[Optional[str], List[dict]], str]
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        # a model tiktoken doesn't know, or an encoding that can't be downloaded
+        return None
+
+
+def count_tokens(text: str, model: str) -> int:
+    encoding = _encoding(model)
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+class HistoryWindow:
+    """Fits a conversation into a token budget for one model.
+
+    The newest turns are kept whole and the current turn always is; the turns before them are replaced by a
+    rolling summary. Summaries are cached under a hash chain over the turns they cover, so when a thread grows,
+    only the turns that newly fell out of the window are summarized, on top of the summary already made.
+    Thread-safe; one window per model is shared by every engine.
+    """
+
+    def __init__(self, model: str, token_budget: int = HISTORY_TOKEN_BUDGET, max_summaries: int = 1024):
+        if token_budget < 1:
+            raise ValueError("token_budget must be at least 1.")
+        self.model = model
+        self.token_budget = token_budget
+        self.max_summaries = max_summaries
+        self._summaries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.logger = logger.bind(service="HistoryWindow", model=model)
+
+    def count(self, turn: dict) -> int:
+        return count_tokens(turn["content"], self.model) + MESSAGE_OVERHEAD_TOKENS
+
+    def _first_kept(self, turns: List[dict]) -> int:
+        used = 0
+        start = len(turns)
+        for i in range(len(turns) - 1, -1, -1):
+            used += self.count(turns[i])
+            if used > self.token_budget and start < len(turns):
+                break
+            start = i
+        # the kept turns start with a user turn, as the Anthropic API requires
+        while start < len(turns) - 1 and turns[start]["role"] != "user":
+            start += 1
+        return start
+
+    @staticmethod
+    def _chain(turns: List[dict]) -> List[str]:
+        keys, key = [], ""
+        for turn in turns:
+            key = hashlib.sha256(f"{key}\0{turn['role']}\0{turn['content']}".encode()).hexdigest()
+            keys.append(key)
+        return keys
+
+    def _cached(self, keys: List[str]) -> Tuple[Optional[str], int]:
+        """Returns the summary of the longest cached prefix and that prefix's length."""
+        with self._lock:
+            for covered in range(len(keys), 0, -1):
+                summary = self._summaries.get(keys[covered - 1])
+                if summary is not None:
+                    self._summaries.move_to_end(keys[covered - 1])
+                    return summary, covered
+        return None, 0
+
+    def _store(self, key: str, summary: str):
+        with self._lock:
+            self._summaries[key] = summary
+            self._summaries.move_to_end(key)
+            while len(self._summaries) > self.max_summaries:
+                self._summaries.popitem(last=False)
+
+    def fit(self, turns: List[dict], summarize: Summarize) -> Tuple[Optional[str], List[dict]]:
+        """Returns a summary of the turns that don't fit (None if they all do) and the turns that do.
+
+        `summarize(previous_summary, turns)` extends a summary, or starts one when it is None, with `turns`.
+        If it fails, the dropped turns are covered only by whatever summary was already cached.
+        """
+        start = self._first_kept(turns)
+        if start == 0:
+            return None, list(turns)
+
+        dropped = turns[:start]
+        keys = self._chain(dropped)
+        summary, covered = self._cached(keys)
+        if covered < len(dropped):
+            try:
+                summary = summarize(summary, dropped[covered:])
+            except Exception as e:
+                self.logger.bind(err=str(e), turns=len(dropped) - covered).warning("failed to summarize history")
+            else:
+                self._store(keys[-1], summary)
+        return summary, turns[start:]
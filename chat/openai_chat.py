@@ -1,9 +1,30 @@
+import asyncio
+from typing import AsyncIterator, Dict, Iterator, List
+
 import openai
+from openai import AsyncOpenAI, OpenAI
+
+from rag.retriever.retriever import Retriever
 
-from .engine import ChatEngine
+from .engine import SUMMARY_HEADER, ChatEngine
+from .history import HistoryWindow
 
 
 class ChatOpenAI(ChatEngine):
+    model = "gpt-4o-mini"
+
+    def __init__(
+        self,
+        retriever: Retriever,
+        client: OpenAI | None = None,
+        history_window: HistoryWindow | None = None,
+        instructions: str | None = None,
+        async_client: AsyncOpenAI | None = None,
+    ) -> None:
+        super().__init__(retriever, history_window, instructions)
+        # without a shared client, fall back to the openai module's global one
+        self.client = client if client is not None else openai
+        self.async_client = async_client
 
     def _get_generate_system(self) -> dict:
         return {
@@ -14,9 +35,80 @@ class ChatOpenAI(ChatEngine):
                         """,
         }
 
+    def _complete(self, system: str, messages: List[dict]) -> str:
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "system", "content": system}, *messages],
+        )
+        return response.choices[0].message.content
+
+    def _messages(self) -> List[dict]:
+        # OpenAI caches long prompt prefixes on its own; keeping the stable parts first is all it needs
+        system, summary, turns = self._prompt()
+        if summary:
+            system += f"\n{SUMMARY_HEADER}{summary}"
+        return [{"role": "system", "content": system}, *turns]
+
+    @staticmethod
+    def _usage(usage) -> Dict[str, int]:
+        details = usage.prompt_tokens_details
+        cached = (details.cached_tokens or 0) if details is not None else 0
+        return {
+            "input_tokens": usage.prompt_tokens - cached,
+            "cache_read_tokens": cached,
+            "cache_write_tokens": 0,
+            "output_tokens": usage.completion_tokens,
+        }
+
     def _api_call(self, full_input: str):
-        response = openai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=self.history,
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=self._messages(),
         )
+        if response.usage is not None:
+            self._report_usage(self._usage(response.usage))
         return response.choices[0].message.content
+
+    def _api_stream(self, full_input: str) -> Iterator[str]:
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=self._messages(),
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        for chunk in stream:
+            # usage comes in a final chunk without choices
+            if chunk.usage is not None:
+                self._report_usage(self._usage(chunk.usage))
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def _get_async_client(self) -> AsyncOpenAI:
+        if self.async_client is None:
+            self.async_client = openai.AsyncOpenAI(api_key=openai.api_key)
+        return self.async_client
+
+    async def _aapi_call(self, full_input: str) -> str:
+        # building the prompt may summarize old turns, which blocks
+        messages = await asyncio.to_thread(self._messages)
+        response = await self._get_async_client().chat.completions.create(
+            model=self.model,
+            messages=messages,
+        )
+        if response.usage is not None:
+            self._report_usage(self._usage(response.usage))
+        return response.choices[0].message.content
+
+    async def _aapi_stream(self, full_input: str) -> AsyncIterator[str]:
+        messages = await asyncio.to_thread(self._messages)
+        stream = await self._get_async_client().chat.completions.create(
+            model=self.model,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        async for chunk in stream:
+            if chunk.usage is not None:
+                self._report_usage(self._usage(chunk.usage))
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
@@ -1,10 +1,11 @@
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
 from chat.exceptions import ChatResponseGenerationError
 
 from .anthropic_chat import ChatAnthropic
+from .history import HistoryWindow
 
 
 @pytest.fixture
@@ -84,3 +85,130 @@ class TestChatAnthropic:
             chat.generate_response("Test query")
 
         assert str(excinfo.value) == "Error generating response: API error"
+
+    def test_generate_response_stream(self, mock_anthropic, retriever, sample_query):
+        mock_client = MagicMock()
+        mock_anthropic.return_value = mock_client
+        mock_client.messages.stream.return_value.__enter__.return_value.text_stream = iter(["Mocked ", "stream"])
+
+        chat = ChatAnthropic(retriever, api_key="random-str")
+        pieces = list(chat.generate_response_stream(sample_query))
+
+        assert pieces == ["Mocked ", "stream"]
+        assert chat.history[-1] == {"role": "assistant", "content": "Mocked stream"}
+        mock_client.messages.create.assert_not_called()
+
+    def test_generate_response_stream_failure(self, mock_anthropic, retriever):
+        mock_client = MagicMock()
+        mock_anthropic.return_value = mock_client
+        mock_client.messages.stream.side_effect = Exception("API error")
+
+        chat = ChatAnthropic(retriever, api_key="random-str")
+        with pytest.raises(ChatResponseGenerationError) as excinfo:
+            list(chat.generate_response_stream("Test query"))
+
+        assert str(excinfo.value) == "Error generating response: API error"
+
+    def test_old_turns_are_summarized_into_system_prompt(self, mock_anthropic, retriever):
+        mock_client = MagicMock()
+        mock_client.messages.create.side_effect = [
+            MagicMock(content=[MagicMock(text="The user is Molvative.")]),
+            MagicMock(content=[MagicMock(text="Molvative")]),
+        ]
+
+        chat = ChatAnthropic(
+            retriever, client=mock_client, history_window=HistoryWindow(ChatAnthropic.model, token_budget=1)
+        )
+        chat.add_chat_history("user", "My name is Molvative")
+        chat.add_chat_history("assistant", "Hi Molvative")
+        response = chat.generate_response("Say my name!")
+
+        summary_call, answer_call = mock_client.messages.create.call_args_list
+        assert "user: My name is Molvative" in summary_call.kwargs["messages"][0]["content"]
+        assert answer_call.kwargs["system"][-1] == {
+            "type": "text",
+            "text": "Summary of the earlier conversation:\nThe user is Molvative.",
+        }
+        assert [turn["role"] for turn in answer_call.kwargs["messages"]] == ["user"]
+        assert response == "Molvative"
+        mock_anthropic.assert_not_called()
+
+    def test_request_places_cache_breakpoint(self, mock_anthropic, retriever):
+        mock_client = MagicMock()
+        mock_client.messages.create.return_value = MagicMock(content=[MagicMock(text="Molvative")])
+
+        chat = ChatAnthropic(retriever, client=mock_client, instructions="Answer in Indonesian.")
+        chat.add_chat_history("user", "My name is Molvative")
+        chat.add_chat_history("assistant", "Hi Molvative")
+        chat.generate_response("Say my name!")
+
+        request = mock_client.messages.create.call_args.kwargs
+        assert request["system"] == [{
+            "type": "text",
+            "text": chat.history[0]["content"] + "\nAnswer in Indonesian.",
+        }]
+        assert request["messages"][1]["content"] == [
+            {"type": "text", "text": "Hi Molvative", "cache_control": {"type": "ephemeral"}}
+        ]
+        assert request["messages"][2]["role"] == "user"
+        # the breakpoint is only on the request, not in the stored history
+        assert chat.history[2] == {"role": "assistant", "content": "Hi Molvative"}
+
+    def test_reports_cache_usage(self, mock_anthropic, retriever, sample_query):
+        mock_client = MagicMock()
+        mock_client.messages.create.return_value = MagicMock(
+            content=[MagicMock(text="Mocked response content")],
+            usage=MagicMock(input_tokens=12, output_tokens=30, cache_read_input_tokens=2048, cache_creation_input_tokens=None),
+        )
+
+        chat = ChatAnthropic(retriever, client=mock_client)
+        chat.generate_response(sample_query)
+
+        assert chat.last_usage == {"input_tokens": 12, "cache_read_tokens": 2048, "cache_write_tokens": 0, "output_tokens": 30}
+
+    def test_reports_cache_usage_when_streaming(self, mock_anthropic, retriever, sample_query):
+        mock_client = MagicMock()
+        stream = mock_client.messages.stream.return_value.__enter__.return_value
+        stream.text_stream = iter(["Mocked"])
+        stream.get_final_message.return_value = MagicMock(
+            usage=MagicMock(input_tokens=12, output_tokens=1, cache_read_input_tokens=0, cache_creation_input_tokens=2048)
+        )
+
+        chat = ChatAnthropic(retriever, client=mock_client)
+        list(chat.generate_response_stream(sample_query))
+
+        assert chat.last_usage["cache_write_tokens"] == 2048
+
+    @pytest.mark.asyncio
+    async def test_agenerate_response(self, mock_anthropic, retriever, sample_query):
+        retriever.aquery = AsyncMock(return_value=["Mocked context"])
+        async_client = MagicMock()
+        async_client.messages.create = AsyncMock(return_value=MagicMock(content=[MagicMock(text="Mocked async content")]))
+
+        chat = ChatAnthropic(retriever, client=MagicMock(), async_client=async_client)
+        response = await chat.agenerate_response(sample_query)
+
+        assert response == "Mocked async content"
+        assert "cache_control" not in async_client.messages.create.call_args.kwargs["system"][0]
+
+    @pytest.mark.asyncio
+    async def test_agenerate_response_stream(self, mock_anthropic, retriever, sample_query):
+        async def text_stream():
+            yield "Mocked "
+            yield "stream"
+
+        retriever.aquery = AsyncMock(return_value=[])
+        async_client = MagicMock()
+        stream = async_client.messages.stream.return_value.__aenter__.return_value
+        stream.text_stream = text_stream()
+        stream.get_final_message = AsyncMock(return_value=MagicMock(
+            usage=MagicMock(input_tokens=12, output_tokens=2, cache_read_input_tokens=2048, cache_creation_input_tokens=0)
+        ))
+
+        chat = ChatAnthropic(retriever, client=MagicMock(), async_client=async_client)
+        pieces = [piece async for piece in chat.agenerate_response_stream(sample_query)]
+
+        assert pieces == ["Mocked ", "stream"]
+        assert chat.last_usage["cache_read_tokens"] == 2048
+        assert chat.history[-1] == {"role": "assistant", "content": "Mocked stream"}
+
@@ -0,0 +1,92 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from chat.history import MESSAGE_OVERHEAD_TOKENS, HistoryWindow, count_tokens
+
+MODEL = "claude-3-haiku-20240307"
+
+
+def turns(count):
+    # 30 characters is 10 estimated tokens, 14 with the per-message overhead
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"{i:02d}".ljust(30, "x")}
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def summarize():
+    return MagicMock(side_effect=lambda previous, dropped: f"{previous or ''}+{len(dropped)}")
+
+
+def test_count_tokens_estimates_without_tokenizer():
+    assert count_tokens("x" * 30, MODEL) == 10
+    assert count_tokens("x" * 31, MODEL) == 11
+
+def test_invalid_token_budget():
+    with pytest.raises(ValueError, match="token_budget must be at least 1."):
+        HistoryWindow(MODEL, token_budget=0)
+
+def test_fit_keeps_everything_within_budget(summarize):
+    window = HistoryWindow(MODEL, token_budget=100)
+
+    summary, kept = window.fit(turns(4), summarize)
+
+    assert summary is None
+    assert kept == turns(4)
+    summarize.assert_not_called()
+
+def test_fit_always_keeps_current_turn(summarize):
+    window = HistoryWindow(MODEL, token_budget=1)
+
+    summary, kept = window.fit(turns(3), summarize)
+
+    assert kept == turns(3)[2:]
+    summarize.assert_called_once_with(None, turns(3)[:2])
+    assert summary == "+2"
+
+def test_fit_keeps_newest_turns_starting_with_user(summarize):
+    # room for three turns, but the third newest is an assistant turn
+    window = HistoryWindow(MODEL, token_budget=3 * (10 + MESSAGE_OVERHEAD_TOKENS))
+
+    summary, kept = window.fit(turns(7), summarize)
+
+    assert kept == turns(7)[4:]
+    assert summary == "+4"
+
+def test_fit_extends_cached_summary(summarize):
+    window = HistoryWindow(MODEL, token_budget=3 * (10 + MESSAGE_OVERHEAD_TOKENS))
+    window.fit(turns(5), summarize)
+
+    summary, kept = window.fit(turns(7), summarize)
+
+    # only the two turns that newly fell out of the window are summarized
+    assert summarize.call_args_list[-1].args == ("+2", turns(7)[2:4])
+    assert summary == "+2+2"
+    assert kept == turns(7)[4:]
+
+def test_fit_reuses_summary_for_same_thread(summarize):
+    window = HistoryWindow(MODEL, token_budget=2 * (10 + MESSAGE_OVERHEAD_TOKENS))
+
+    first = window.fit(turns(5), summarize)
+    second = window.fit(turns(5), summarize)
+
+    assert first == second
+    summarize.assert_called_once()
+
+def test_fit_survives_summary_failure():
+    window = HistoryWindow(MODEL, token_budget=1)
+
+    summary, kept = window.fit(turns(3), MagicMock(side_effect=RuntimeError("api down")))
+
+    assert summary is None
+    assert kept == turns(3)[2:]
+
+def test_summaries_are_bounded(summarize):
+    window = HistoryWindow(MODEL, token_budget=1, max_summaries=1)
+
+    window.fit(turns(3), summarize)
+    window.fit(turns(5)[2:], summarize)
+
+    assert len(window._summaries) == 1
@@ -1,5 +1,5 @@
 from typing import List
-from unittest.mock import MagicMock, patch
+from unittest.mock import DEFAULT, AsyncMock, MagicMock, patch
 
 import pytest
 
@@ -64,10 +64,11 @@ class MockCompletion:
         self.created = 123456789
         self.model = "mock_model"
         self.object = "text_completion"
+        self.usage = None
 
 @pytest.fixture
 def mock_openai_api():
-    with patch("openai.chat.completions.create") as mock_chat_completion, \
+    with patch("openai.resources.chat.completions.Completions.create") as mock_chat_completion, \
          patch("openai.embeddings.create") as mock_embeddings:
 
         # Mock embeddings response
@@ -154,8 +155,116 @@ class TestChat:
         assert response == "Mocked response content"
 
     def test_generate_response_failure(self, chat):
-        with patch("openai.chat.completions.create", side_effect=Exception("API error")):
+        with patch("openai.resources.chat.completions.Completions.create", side_effect=Exception("API error")):
             with pytest.raises(ChatResponseGenerationError) as excinfo:
                 chat.generate_response("Test query")
 
-            assert str(excinfo.value) == "Error generating response: API error"
\ No newline at end of file
+            assert str(excinfo.value) == "Error generating response: API error"
+
+    def test_generate_response_stream(self, chat):
+        chunks = [
+            MagicMock(choices=[MagicMock(delta=MagicMock(content="Mocked "))], usage=None),
+            MagicMock(choices=[MagicMock(delta=MagicMock(content=None))], usage=None),
+            MagicMock(choices=[MagicMock(delta=MagicMock(content="stream"))], usage=None),
+            MagicMock(choices=[], usage=MagicMock(prompt_tokens=1500, completion_tokens=2, prompt_tokens_details=None)),
+        ]
+        with patch("openai.resources.chat.completions.Completions.create", return_value=iter(chunks)) as mock_create:
+            pieces = list(chat.generate_response_stream("what is apache doris", 1))
+
+        assert pieces == ["Mocked ", "stream"]
+        assert mock_create.call_args.kwargs["stream"] is True
+        assert mock_create.call_args.kwargs["stream_options"] == {"include_usage": True}
+        assert chat.last_usage == {"input_tokens": 1500, "cache_read_tokens": 0, "cache_write_tokens": 0, "output_tokens": 2}
+        assert chat.history[-1] == {"role": "assistant", "content": "Mocked stream"}
+
+    def test_generate_empty_response_stream(self, chat):
+        assert list(chat.generate_response_stream("", "")) == []
+
+    def test_generate_response_stream_failure(self, chat):
+        with patch("openai.resources.chat.completions.Completions.create", side_effect=Exception("API error")):
+            with pytest.raises(ChatResponseGenerationError) as excinfo:
+                list(chat.generate_response_stream("Test query"))
+
+            assert str(excinfo.value) == "Error generating response: API error"
+        assert chat.history[-1]["role"] == "user"
+
+    def test_past_turns_drop_retrieved_context(self, chat, mock_openai_api):
+        chat.retrieve = MagicMock(return_value=["Doris is a database"])
+        sent = []
+        mock_openai_api.side_effect = lambda **kwargs: sent.append(kwargs["messages"][-1]["content"]) or DEFAULT
+
+        chat.generate_response("what is apache doris", 1)
+
+        assert "Doris is a database" in sent[0]
+        assert chat.history[1] == {"role": "user", "content": "what is apache doris"}
+
+    def test_reports_cached_prompt_tokens(self, chat, mock_openai_api):
+        mock_openai_api.return_value.usage = MagicMock(
+            prompt_tokens=1500, completion_tokens=20, prompt_tokens_details=MagicMock(cached_tokens=1024)
+        )
+
+        chat.generate_response("what is apache doris", 1)
+
+        assert chat.last_usage == {"input_tokens": 476, "cache_read_tokens": 1024, "cache_write_tokens": 0, "output_tokens": 20}
+
+    def test_instructions_follow_system_prompt(self, chat, mock_openai_api):
+        chat.instructions = "Answer in Indonesian."
+
+        chat.generate_response("what is apache doris", 1)
+
+        system = mock_openai_api.call_args.kwargs["messages"][0]
+        assert system == {"role": "system", "content": chat.history[0]["content"] + "\nAnswer in Indonesian."}
+
+    @pytest.mark.asyncio
+    async def test_agenerate_response(self, chat):
+        chat.retriever.aquery = AsyncMock(return_value=["Doris is a database"])
+        chat.async_client = MagicMock()
+        chat.async_client.chat.completions.create = AsyncMock(
+            return_value=MockCompletion(choices=[MockCompletionChoice(content="Mocked async content")])
+        )
+
+        response = await chat.agenerate_response("what is apache doris", 1)
+
+        assert response == "Mocked async content"
+        chat.retriever.aquery.assert_awaited_once_with("what is apache doris", 1)
+        assert chat.history[-2:] == [
+            {"role": "user", "content": "what is apache doris"},
+            {"role": "assistant", "content": "Mocked async content"},
+        ]
+
+    @pytest.mark.asyncio
+    async def test_agenerate_response_stream(self, chat):
+        async def chunks():
+            yield MagicMock(choices=[MagicMock(delta=MagicMock(content="Mocked "))], usage=None)
+            yield MagicMock(choices=[MagicMock(delta=MagicMock(content="stream"))], usage=None)
+
+        chat.retriever.aquery = AsyncMock(return_value=[])
+        chat.async_client = MagicMock()
+        chat.async_client.chat.completions.create = AsyncMock(return_value=chunks())
+
+        pieces = [piece async for piece in chat.agenerate_response_stream("what is apache doris", 1)]
+
+        assert pieces == ["Mocked ", "stream"]
+        assert chat.history[-1] == {"role": "assistant", "content": "Mocked stream"}
+
+    @pytest.mark.asyncio
+    async def test_agenerate_response_failure(self, chat):
+        chat.retriever.aquery = AsyncMock(return_value=[])
+        chat.async_client = MagicMock()
+        chat.async_client.chat.completions.create = AsyncMock(side_effect=Exception("API error"))
+
+        with pytest.raises(ChatResponseGenerationError, match="Error generating response: API error"):
+            await chat.agenerate_response("Test query")
+
+
+    @pytest.mark.asyncio
+    async def test_agenerate_response_retrieval_failure(self, chat):
+        chat.retriever.aquery = AsyncMock(side_effect=Exception("vector store unavailable"))
+        history = list(chat.history)
+
+        with pytest.raises(ChatResponseGenerationError, match="Error generating response: vector store unavailable"):
+            await chat.agenerate_response("Test query")
+        with pytest.raises(ChatResponseGenerationError, match="Error generating response: vector store unavailable"):
+            [piece async for piece in chat.agenerate_response_stream("Test query")]
+
+        assert chat.history == history
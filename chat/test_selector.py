@@ -5,6 +5,7 @@ import pytest
 from bot import ModelEngine
 
 from . import ChatEngineSelector
+from .clients import LLM_MAX_RETRIES, LLM_TIMEOUT
 from .anthropic_chat import ChatAnthropic
 from .openai_chat import ChatOpenAI
 
@@ -59,4 +60,26 @@ class TestChatEngineSelector:
 
         engine = engine_selector.select_engine(ModelEngine.ANTHROPIC)
 
-        assert isinstance(engine, ChatAnthropic)
\ No newline at end of file
+        assert isinstance(engine, ChatAnthropic)
+    
+    @patch("chat.PostgresHandler")
+    def test_engines_share_clients(self, mock_postgres_handler, sample_string, sample_int):
+        engine_selector = ChatEngineSelector(
+            openai_api_key=sample_string,
+            anthropic_api_key=sample_string,
+            postgres_db=sample_string,
+            postgres_user=sample_string,
+            postgres_password=sample_string,
+            postgres_host=sample_string,
+            postgres_port=sample_int
+        )
+
+        first = engine_selector.select_engine(ModelEngine.ANTHROPIC)
+        second = engine_selector.select_engine(ModelEngine.ANTHROPIC)
+
+        assert first is not second
+        assert first.client is second.client is engine_selector.anthropic_client
+        assert engine_selector.select_engine(ModelEngine.OPENAI).client is engine_selector.openai_client
+        assert engine_selector.select_engine(ModelEngine.OPENAI, instructions="Be brief.").instructions == "Be brief."
+        assert engine_selector.anthropic_client.timeout == LLM_TIMEOUT
+        assert engine_selector.openai_client.max_retries == LLM_MAX_RETRIES
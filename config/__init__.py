@@ -26,6 +26,15 @@ class AppConfig:
             return [email.strip() for email in var.split(",") if email.strip()], found
         return [], found
 
+    def parse_env_int(self, var_name: str, default: int) -> tuple[int, bool]:
+        var = os.getenv(var_name, "")
+        if var == "":
+            return default, True
+        try:
+            return int(var), True
+        except ValueError:
+            logging.error(f"config error: '{var_name}' must be integer")
+            return default, False
 
     def __init__(self) -> None:
         invalid = False
@@ -132,6 +141,17 @@ class AppConfig:
                 logging.error("config error: 'POSTGRES_PORT' must be integer")
                 invalid = True
 
+        self.postgres_pool_min_size, valid = self.parse_env_int("POSTGRES_POOL_MIN_SIZE", 2)
+        if not valid:
+            invalid = True
+
+        self.postgres_pool_max_size, valid = self.parse_env_int("POSTGRES_POOL_MAX_SIZE", 10)
+        if not valid:
+            invalid = True
+        elif self.postgres_pool_max_size < self.postgres_pool_min_size:
+            logging.error("config error: 'POSTGRES_POOL_MAX_SIZE' must not be lower than 'POSTGRES_POOL_MIN_SIZE'")
+            invalid = True
+
         self.aws_access_key_id, found = self.validate_env_var("AWS_ACCESS_KEY_ID")
         if not found:
             invalid = True
@@ -228,6 +228,44 @@ class TestAppConfig:
 
         assert config.postgres_port == 5432
 
+    def test_configure_default_postgres_pool_size(self, monkeypatch):
+        monkeypatch.setenv("PORT", "")
+        monkeypatch.setenv("SLACK_CLIENT_ID", "123456.789")
+        monkeypatch.setenv("SLACK_CLIENT_SECRET", "1a2b3c4d5e6f")
+        monkeypatch.setenv("SLACK_SCOPES", "channels:history")
+        monkeypatch.setenv("OPENAI_API_KEY", "test-openai-api-key")
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test-anthropic-api-key")
+        monkeypatch.setenv("TOTAL_ACCESS_LEVELS", "5")
+        monkeypatch.setenv("ADMIN_EMAILS", "admin@broom.id,user@broom.id")
+        monkeypatch.setenv("POSTGRES_DB", "test")
+        monkeypatch.setenv("POSTGRES_USER", "test")
+        monkeypatch.setenv("POSTGRES_PASSWORD", "test")
+        monkeypatch.setenv("POSTGRES_HOST", "test")
+        monkeypatch.setenv("POSTGRES_PORT", "5432")
+        monkeypatch.setenv("AWS_PUBLIC_BUCKET_NAME", "test")
+        monkeypatch.setenv("AWS_REGION", "ap-test")
+        monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+        monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+        monkeypatch.setenv("AWS_ENDPOINT_URL", "test")
+
+        config = AppConfig()
+
+        assert config.postgres_pool_min_size == 2
+        assert config.postgres_pool_max_size == 10
+
+    def test_configure_invalid_postgres_pool_size(self, monkeypatch):
+        monkeypatch.setenv("POSTGRES_POOL_MAX_SIZE", "many")
+
+        with pytest.raises(ValueError, match="invalid app config"):
+            AppConfig()
+
+    def test_configure_postgres_pool_max_below_min(self, monkeypatch):
+        monkeypatch.setenv("POSTGRES_POOL_MIN_SIZE", "5")
+        monkeypatch.setenv("POSTGRES_POOL_MAX_SIZE", "2")
+
+        with pytest.raises(ValueError, match="invalid app config"):
+            AppConfig()
+
     def test_configure_invalid_postgres_port(self, monkeypatch):
         monkeypatch.setenv("POSTGRES_PORT", "invalid_port")
 
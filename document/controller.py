@@ -85,6 +85,8 @@ class DocumentControllerV1(ABC):
             self.logger.error(e.args)
             raise HTTPException(status_code=500)
 
+    # deliberately not async: FastAPI runs plain handlers on its threadpool, so the blocking S3 upload
+    # never stalls the event loop
     def upload_document(self, 
       file: Annotated[UploadFile, File()], 
       type: Annotated[str, Form()],
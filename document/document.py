@@ -39,6 +39,7 @@ class DocumentType(str, Enum):
     CSV = "csv"
     PDF = "pdf"
     TXT = "txt"
+    XLSX = "xlsx"
 
 class Document(BaseModel):
     id: UUID4
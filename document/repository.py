@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 from datetime import datetime
-from uuid import uuid4
+from uuid import UUID, uuid4
 
 from loguru import logger
 from sqlalchemy import Column, DateTime, Integer, String, Uuid
@@ -35,7 +35,7 @@ class DocumentRepository(ABC):
         pass
 
     @abstractmethod
-    def create_document(self, doc_create: DocumentCreate):
+    def create_document(self, doc_create: DocumentCreate) -> UUID:
         pass
 
     # note: Not implemented to ensure vector database and document entries are not out of sync
@@ -87,7 +87,7 @@ class PostgresDocumentRepository(DocumentRepository):
                 q = session.query(DocumentModel).filter(DocumentModel.object_name == object_name)
                 return q.first()
         
-    def create_document(self, doc_create: DocumentCreate):
+    def create_document(self, doc_create: DocumentCreate) -> UUID:
         with self.create_session() as session:
             with self.logger.catch(message="create document error", reraise=True):
                 doc_id = uuid4()
@@ -99,4 +99,5 @@ class PostgresDocumentRepository(DocumentRepository):
                 self.logger.debug(f"saving document entry: {new_doc}")
                 session.add(new_doc)
                 session.commit()
+                return doc_id
         
\ No newline at end of file
@@ -1,16 +1,56 @@
 from abc import ABC, abstractmethod
 import io
 import os
+from typing import Callable
 
 from fastapi import UploadFile
 from loguru import logger
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import BotoCoreError, NoCredentialsError, PartialCredentialsError
 
 from document.document import FileExtensionDoesNotMatchType, FileSizeExceededMaxLimit, ObjectNameError
 from document.dto import AWSConfig, DocumentCreate, DocumentFilter, DocumentResponse, DocumentUpdate
 from document.repository import DocumentRepository
 
+UPLOAD_PART_SIZE = 8 * 1024 * 1024
+
+# files above one part go up as a multipart upload; at most `max_concurrency` parts per upload are held in memory
+UPLOAD_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=UPLOAD_PART_SIZE,
+    multipart_chunksize=UPLOAD_PART_SIZE,
+    max_concurrency=2,
+)
+
+
+class SizeLimitedReader:
+    """Non-seekable reader over `stream` that raises FileSizeExceededMaxLimit once more than `max_size` bytes are read."""
+
+    def __init__(self, stream, max_size: int):
+        self.stream = stream
+        self.max_size = max_size
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size)
+        self.bytes_read += len(data)
+        if self.bytes_read > self.max_size:
+            raise FileSizeExceededMaxLimit
+        return data
+
+
+def remaining_size(stream) -> int | None:
+    """Bytes left in a seekable stream, found without reading it; None when the stream cannot tell."""
+    try:
+        position = stream.tell()
+        end = stream.seek(0, io.SEEK_END)
+        stream.seek(position)
+    except (AttributeError, OSError):
+        return None
+    if not isinstance(position, int) or not isinstance(end, int):
+        return None
+    return end - position
+
 
 class DocumentService(ABC):
     @abstractmethod
@@ -43,9 +83,17 @@ class DocumentService(ABC):
     #     pass
       
 class DocumentServiceV1(DocumentService):
-    def __init__(self, aws_config: AWSConfig, repository: DocumentRepository, max_file_size=10*1024*1024):
+    def __init__(
+        self,
+        aws_config: AWSConfig,
+        repository: DocumentRepository,
+        max_file_size=10*1024*1024,
+        on_document_created: Callable[[str], None] | None = None,
+    ):
+        """`on_document_created(document_id)` is called after each upload, e.g. to queue its indexing."""
         super().__init__()
         self.repository = repository
+        self.on_document_created = on_document_created
         self.s3_client = boto3.client(
             's3',
             aws_access_key_id=aws_config.aws_access_key_id,
@@ -58,23 +106,30 @@ class DocumentServiceV1(DocumentService):
         self.logger = logger.bind(service="DocumentService")
 
     def upload_document(self, file_content, object_name, type):
-        try:
-            
-            file_content_bytes = file_content.file.read()
+        """Streams the file to S3 a part at a time instead of reading it into memory.
 
-            file_size = len(file_content_bytes)
-            if file_size > self.max_file_size:
-                self.logger.error(f"File size exceeds the maximum limit of {self.max_file_size} bytes.")
+        Oversized files are rejected before anything is sent when their size is known up front, and otherwise
+        as soon as the stream passes `max_file_size`, which aborts the multipart upload.
+        """
+        try:
+            file_size = remaining_size(file_content.file)
+            if file_size is not None and file_size > self.max_file_size:
                 raise FileSizeExceededMaxLimit
 
             _, file_extension = os.path.splitext(file_content.filename)
             if file_extension.lower().lstrip('.') != type:
                 self.logger.error(f"File extension '{file_extension}' does not match the expected type '{type}'.")
                 raise FileExtensionDoesNotMatchType
-            
-            file_object = io.BytesIO(file_content_bytes)
 
-            self.s3_client.upload_fileobj(file_object, self.bucket_name, object_name)
+            self.s3_client.upload_fileobj(
+                SizeLimitedReader(file_content.file, self.max_file_size),
+                self.bucket_name,
+                object_name,
+                Config=UPLOAD_TRANSFER_CONFIG,
+            )
+        except FileSizeExceededMaxLimit:
+            self.logger.error(f"File size exceeds the maximum limit of {self.max_file_size} bytes.")
+            raise
         except NoCredentialsError:
             self.logger.error("AWS credentials not found.")
             raise
@@ -102,6 +157,16 @@ class DocumentServiceV1(DocumentService):
         self.logger.debug(f"model dump: {request.model_dump()}" )
         if self.repository.get_document_by_name(request.object_name) is None:
             self.upload_document(file, request.object_name, request.type)
-            self.repository.create_document(request)
+            doc_id = self.repository.create_document(request)
+            self._notify_created(str(doc_id))
         else:
-            raise ObjectNameError("Object by this name already exists")
\ No newline at end of file
+            raise ObjectNameError("Object by this name already exists")
+
+    def _notify_created(self, doc_id: str):
+        if self.on_document_created is None:
+            return
+        try:
+            self.on_document_created(doc_id)
+        except Exception as e:
+            # the upload itself succeeded; the next batch indexing run still picks the document up
+            self.logger.bind(document_id=doc_id, err=str(e)).error("failed to queue document indexing")
@@ -36,12 +36,13 @@ class TestDocumentRepository:
             updated_at=datetime.now()
         )
         
-        setup_repository.create_document(doc_create)
+        doc_id = setup_repository.create_document(doc_create)
         
         # verify document exists
         with setup_session() as session:
             result = session.query(DocumentModel).filter_by(object_name="sample_object").first()
             assert result is not None
+            assert result.id == doc_id
             assert result.title == "Sample Document"
             assert result.type == DocumentType.CSV.value
 
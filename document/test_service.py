@@ -5,7 +5,7 @@ from sqlalchemy import create_engine
 from document.document import DocumentType, FileExtensionDoesNotMatchType, FileSizeExceededMaxLimit, ObjectNameError
 from document.dto import DocumentCreate, DocumentFilter
 from document.repository import DocumentModel, PostgresDocumentRepository
-from document.service import DocumentServiceV1
+from document.service import UPLOAD_TRANSFER_CONFIG, DocumentServiceV1, SizeLimitedReader, remaining_size
 import io
 from unittest.mock import ANY, MagicMock
 import pytest
@@ -44,6 +44,29 @@ class TestDocumentService:
         assert len(document) == 1
         assert document[0].title == "New Document"
 
+    def test_create_document_notifies_created(self, setup_service, setup_repository):
+        setup_service.on_document_created = MagicMock()
+        new_document = DocumentCreate(type=DocumentType.TXT, title="New Document", object_name="new_doc.txt", access_level=0)
+        mock_file_content = MagicMock()
+        mock_file_content.file = io.BytesIO(b"test data")
+        mock_file_content.filename = "new_doc.txt"
+
+        setup_service.create_document(new_document, mock_file_content)
+
+        document = setup_repository.get_document_by_name("new_doc.txt")
+        setup_service.on_document_created.assert_called_once_with(str(document.id))
+
+    def test_create_document_notify_failure_keeps_upload(self, setup_service, setup_repository):
+        setup_service.on_document_created = MagicMock(side_effect=RuntimeError("queue unavailable"))
+        new_document = DocumentCreate(type=DocumentType.TXT, title="New Document", object_name="new_doc.txt", access_level=0)
+        mock_file_content = MagicMock()
+        mock_file_content.file = io.BytesIO(b"test data")
+        mock_file_content.filename = "new_doc.txt"
+
+        setup_service.create_document(new_document, mock_file_content)
+
+        assert setup_repository.get_document_by_name("new_doc.txt") is not None
+
     def test_create_document_existing_name_raises_error(self, setup_service):
         existing_document = DocumentCreate(
             type=DocumentType.CSV,
@@ -73,7 +96,7 @@ class TestDocumentService:
 
         # Assert that the S3 upload_fileobj method was called once
         setup_service.mock_s3_client.upload_fileobj.assert_called_once_with(
-            ANY, "test_bucket", "test_object_name.txt"
+            ANY, "test_bucket", "test_object_name.txt", Config=UPLOAD_TRANSFER_CONFIG
         )
 
     def test_upload_document_file_extension_does_not_match_type(self, setup_service):
@@ -96,6 +119,40 @@ class TestDocumentService:
             setup_service.upload_document(mock_file_content, "test_object_name.txt", "txt")
 
 
+    def test_upload_document_max_file_size_while_streaming(self, setup_service):
+        uploaded = []
+
+        def upload_fileobj(fileobj, bucket, key, Config):
+            while chunk := fileobj.read(1024 * 1024):
+                uploaded.append(chunk)
+        setup_service.mock_s3_client.upload_fileobj.side_effect = upload_fileobj
+
+        # a stream whose size cannot be known up front
+        stream = io.BufferedReader(io.BytesIO(b"a" * (11 * 1024 * 1024)))
+        stream.seekable = lambda: False
+        stream.tell = MagicMock(side_effect=OSError)
+        mock_file_content = MagicMock()
+        mock_file_content.file = stream
+        mock_file_content.filename = "test_object_name.txt"
+
+        with pytest.raises(FileSizeExceededMaxLimit):
+            setup_service.upload_document(mock_file_content, "test_object_name.txt", "txt")
+        # the upload stopped at the limit instead of reading the rest of the file
+        assert sum(map(len, uploaded)) == 10 * 1024 * 1024
+
+    def test_size_limited_reader(self):
+        reader = SizeLimitedReader(io.BytesIO(b"abcdef"), max_size=4)
+        assert reader.read(4) == b"abcd"
+        with pytest.raises(FileSizeExceededMaxLimit):
+            reader.read(4)
+
+    def test_remaining_size(self):
+        stream = io.BytesIO(b"abcdef")
+        stream.read(2)
+        assert remaining_size(stream) == 4
+        assert stream.tell() == 2
+        assert remaining_size(MagicMock()) is None
+
     def test_upload_document_no_credentials_error(self, setup_service):
         setup_service.mock_s3_client.upload_fileobj.side_effect = NoCredentialsError
 
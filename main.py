@@ -35,7 +35,8 @@ from document.dto import AWSConfig
 from document.repository import PostgresDocumentRepository
 from document.service import DocumentServiceV1
 from document.view import DocumentViewV1
-from rag.automation.document_automation import DocumentIndexing
+from rag.automation.controller import IndexingJobControllerV1
+from rag.automation.job_queue import IndexingJob, IndexingJobLog, IndexingJobQueue
 from web.logging import RequestLoggingMiddleware
 
 load_dotenv(override=True)
@@ -111,11 +112,18 @@ if __name__ == "__main__":
         postgres_password=config.postgres_password,
         postgres_host=config.postgres_host,
         postgres_port=config.postgres_port,
+        postgres_pool_min_size=config.postgres_pool_min_size,
+        postgres_pool_max_size=config.postgres_pool_max_size,
     )
 
     document_repository = PostgresDocumentRepository(sessionmaker)
 
-    document_service = DocumentServiceV1(aws_config, document_repository)
+    # documents are indexed by `python -m rag.automation.worker` processes, not by the web server
+    indexing_job_queue = IndexingJobQueue()
+
+    document_service = DocumentServiceV1(
+        aws_config, document_repository, on_document_created=indexing_job_queue.submit_document
+    )
 
     document_controller = DocumentControllerV1(document_service)
 
@@ -123,7 +131,7 @@ if __name__ == "__main__":
 
     reaction_event_repository = PostgresReactionEventRepository(sessionmaker)
 
-    automation = DocumentIndexing(aws_config, document_service)
+    indexing_job_controller = IndexingJobControllerV1(indexing_job_queue)
 
     workspace_data_repository = PostgresWorkspaceDataRepository(sessionmaker)
 
@@ -396,10 +404,32 @@ if __name__ == "__main__":
 
     app.add_api_route(
         "/index",
-        endpoint=automation.process_documents,
-        response_class=HTMLResponse,
-        description="Page that displays existing chatbots",
+        endpoint=indexing_job_controller.submit_job,
+        methods=["GET", "POST"],
+        status_code=status.HTTP_202_ACCEPTED,
+        response_model=IndexingJob,
+        description="Queues an indexing run for the background workers",
+    )
+    app.add_api_route(
+        "/api/index/jobs/{job_id}",
+        endpoint=indexing_job_controller.fetch_job,
+        methods=["GET"],
+        response_model=IndexingJob,
+        name="Indexing Job Status",
+    )
+    app.add_api_route(
+        "/api/index/jobs/{job_id}/cancel",
+        endpoint=indexing_job_controller.cancel_job,
+        methods=["POST"],
+        response_model=IndexingJob,
+        name="Cancel Indexing Job",
+    )
+    app.add_api_route(
+        "/api/index/jobs/{job_id}/logs",
+        endpoint=indexing_job_controller.fetch_job_logs,
+        methods=["GET"],
+        response_model=list[IndexingJobLog],
+        name="Indexing Job Logs",
     )
 
-    # automation.process_documents()
     uvicorn.run(app, host="0.0.0.0", port=config.port, access_log=False)
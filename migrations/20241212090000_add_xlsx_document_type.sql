@@ -0,0 +1,2 @@
+-- Add value to enum type: "document_type"
+ALTER TYPE "public"."document_type" ADD VALUE 'xlsx';
@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from fastapi import HTTPException
+from loguru import logger
+
+from rag.automation.job_queue import IndexingJob, IndexingJobLog, IndexingJobQueue
+
+
+class IndexingJobControllerV1:
+    """Enqueues indexing runs for the background workers and reports on them; nothing is indexed in-request."""
+
+    def __init__(self, queue: IndexingJobQueue):
+        self.queue = queue
+        self.logger = logger.bind(service="IndexingJobController")
+
+    def submit_job(self, start_date: datetime | None = None) -> IndexingJob:
+        job = self.queue.submit(start_date)
+        self.logger.bind(job_id=job.id).info("queued indexing job")
+        return job
+
+    def fetch_job(self, job_id: int) -> IndexingJob:
+        job = self.queue.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404)
+        return job
+
+    def cancel_job(self, job_id: int) -> IndexingJob:
+        job = self.queue.cancel(job_id)
+        if job is None:
+            raise HTTPException(status_code=404)
+        return job
+
+    def fetch_job_logs(self, job_id: int) -> list[IndexingJobLog]:
+        self.fetch_job(job_id)
+        return self.queue.logs(job_id)
@@ -1,28 +1,111 @@
+import hashlib
+import multiprocessing
 import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
 from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
 
 import boto3
 import pandas as pd
 import requests
+from loguru import logger
 from sqlalchemy import text
 
 from document.document import Document
 from document.dto import AWSConfig
 from document.service import DocumentServiceV1
 from document.utils import generate_presigned_url
+from rag.automation.indexing_state import IndexingStateStore
+from rag.automation.summary_cache import PostgresTableSummaryCache
 from rag.parsing.parsing_csv import CSVProcessor
 from rag.parsing.parsing_pdf import PDFProcessor
 from rag.parsing.parsing_txt import TXTProcessor
+from rag.parsing.parsing_xlsx import XLSXProcessor, read_sheet_chunks, sheet_names
+from rag.parsing.processor import TableInfo, TableSummaryCache
+from rag.sql.bulk_loader import TableLoader, read_csv_chunks
 from rag.sql.postgres_db_loader import get_postgres_engine
 from rag.vectordb.postgres_handler import PostgresHandler
 from rag.vectordb.postgres_node_storage import PostgresNodeStorage
 
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# (connect, read) seconds; the read timeout applies per chunk, not to the whole download
+DOWNLOAD_TIMEOUT = (10, 60)
+
+PROCESSORS = {
+    'csv': CSVProcessor,
+    'pdf': PDFProcessor,
+    'txt': TXTProcessor,
+    'xlsx': XLSXProcessor,
+}
+
+# rows read for the LLM table summary; the table itself is bulk-loaded from the file
+SUMMARY_SAMPLE_ROWS = 100
+
+# CPU-bound parsing (text extraction + OCR) that is worth shipping to the process pool
+PROCESS_POOL_TYPES = {'pdf'}
+
+# Postgres silently truncates longer identifiers, so longer table names could collide
+MAX_IDENTIFIER_BYTES = 63
+
+
+def parse_nodes(document_type: str, document_path: str):
+    """Parses and chunks a document into nodes. Module-level so process pool workers can run it."""
+    processor_class = PROCESSORS.get(document_type)
+    if processor_class is None:
+        raise ValueError(f"Unsupported document type: {document_type}")
+    return processor_class(document_path).process()
+
+
+def sheet_table_name(title: str, sheet_name: str) -> str:
+    """The table a workbook sheet is loaded into: `{title} - {sheet}` when that fits in a Postgres identifier,
+    otherwise its truncated prefix plus a short hash of the full name, so distinct sheets never share a table."""
+    name = f"{title} - {sheet_name}"
+    if len(name.encode()) <= MAX_IDENTIFIER_BYTES:
+        return name
+    digest = hashlib.sha256(name.encode()).hexdigest()[:8]
+    prefix = name.encode()[:MAX_IDENTIFIER_BYTES - len(digest) - 1].decode(errors="ignore").rstrip()
+    return f"{prefix}_{digest}"
+
 
 class DocumentIndexing:
-    def __init__(self, aws_config: AWSConfig, service:DocumentServiceV1):
+    def __init__(
+        self,
+        aws_config: AWSConfig,
+        service:DocumentServiceV1,
+        state_store: Optional[IndexingStateStore] = None,
+        summary_cache: Optional[TableSummaryCache] = None,
+        download_chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+        temp_dir: Optional[str] = None,
+        download_workers: int = 4,
+        parse_workers: Optional[int] = None,
+        store_workers: int = 2,
+    ):
+        """`download_workers` documents are in flight at once, each fetched on its own thread.
+        PDFs are parsed on a pool of `parse_workers` processes (default: one per core, 0 parses in-thread)
+        that is started on first use and kept until `close()`, and at most `store_workers` documents are embedded and written to the database concurrently.
+        """
+        if download_workers < 1 or store_workers < 1:
+            raise ValueError("download_workers and store_workers must be at least 1.")
 
         self.service = service
+        self.download_workers = download_workers
+        self.parse_workers = parse_workers if parse_workers is not None else (os.cpu_count() or 1)
+        self._store_slots = threading.BoundedSemaphore(store_workers)
+        self._parse_pool: Optional[ProcessPoolExecutor] = None
+        self._parse_pool_lock = threading.Lock()
+        self.download_chunk_size = download_chunk_size
+        self.temp_dir = temp_dir
+        self.state_store = state_store if state_store is not None else IndexingStateStore()
+        self.summary_cache = summary_cache if summary_cache is not None else PostgresTableSummaryCache()
+        self.logger = logger.bind(service="DocumentIndexing")
         self.aws_config = aws_config
+        self._postgres_handler: Optional[PostgresHandler] = None
+        self._postgres_lock = threading.Lock()
         self.s3_client = boto3.client(
             's3',
             aws_access_key_id=self.aws_config.aws_access_key_id,
@@ -39,24 +122,52 @@ class DocumentIndexing:
         doc_filter = {key: value for key, value in doc_filter.items() if value is not None}
         return self.service.get_documents(filter=doc_filter)
 
+    def fetch_documents_by_id(self, document_ids: List[str]) -> list:
+        documents = [self.service.get_document_by_id(document_id) for document_id in document_ids]
+        return [document for document in documents if document is not None]
+
     def _request_url(self, document_type, document_url):
-        response = requests.get(document_url)
-        response.raise_for_status()
+        """Streams the document into a temp file of its own and returns its path; the caller removes it."""
+        response = requests.get(document_url, stream=True, timeout=DOWNLOAD_TIMEOUT)
+        try:
+            response.raise_for_status()
+
+            fd, document_path = tempfile.mkstemp(prefix="document-", suffix=f".{document_type}", dir=self.temp_dir)
+            try:
+                with os.fdopen(fd, "wb") as file:
+                    for chunk in response.iter_content(chunk_size=self.download_chunk_size):
+                        file.write(chunk)
+            except BaseException:
+                os.remove(document_path)
+                raise
+        finally:
+            response.close()
 
-        document_path = f"temp.{document_type}"
-        with open(document_path, "wb") as file:
-            file.write(response.content)
-        
         return document_path
+
+    @contextmanager
+    def _download(self, document: Document) -> Iterator[str]:
+        document_url = generate_presigned_url(document, self.s3_client, self.aws_config.aws_public_bucket_name)
+        document_path = self._request_url(document.type, document_url)
+        try:
+            yield document_path
+        finally:
+            try:
+                os.remove(document_path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _file_hash(document_path: str) -> str:
+        digest = hashlib.sha256()
+        with open(document_path, "rb") as file:
+            for block in iter(lambda: file.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
     
     def _get_processor(self, document_type: str, document_url: str):
         """Returns the appropriate processor based on document type."""
-        processors = {
-            'csv': CSVProcessor,
-            'pdf': PDFProcessor,
-            'txt': TXTProcessor,
-        }
-        processor_class = processors.get(document_type)
+        processor_class = PROCESSORS.get(document_type)
         if processor_class:
             return processor_class(document_url)
         raise ValueError(f"Unsupported document type: {document_type}")
@@ -74,39 +185,145 @@ class DocumentIndexing:
         })
         return node
 
-    def process_documents(self, start_date: datetime = None):
-        """Main method to process documents based on their type."""
-        documents = self.fetch_documents(start_date)
-        
-        for document in documents:
+    def process_documents(
+        self,
+        start_date: datetime = None,
+        on_progress: Optional[Callable[[Document, str, Dict[str, int], int], None]] = None,
+        should_cancel: Optional[Callable[[], bool]] = None,
+        document_ids: Optional[List[str]] = None,
+    ) -> Dict[str, int]:
+        """Indexes new, changed and previously failed documents; up-to-date documents are skipped without downloading.
 
-            document_url = generate_presigned_url(document, self.s3_client, self.aws_config.aws_public_bucket_name)
+        Considers the documents created after `start_date`, or only `document_ids` when given.
 
-            document_type = document.type
-            # Ambil dokumen url
-            document_path = self._request_url(document_type, document_url)
+        `on_progress(document, outcome, counts, total)` is called on the calling thread as each document finishes.
+        Once `should_cancel()` returns True, documents that have not started yet are skipped as "cancelled".
+        Returns the number of documents per outcome.
+        """
+        if document_ids is not None:
+            documents = self.fetch_documents_by_id(document_ids)
+        else:
+            documents = self.fetch_documents(start_date) or []
+        states = self.state_store.get_states([str(document.id) for document in documents])
+        counts = {"indexed": 0, "unchanged": 0, "failed": 0, "cancelled": 0}
 
-            processor = self._get_processor(document.type, document_path)
-            
-            if document.type == 'csv':
-                summary = processor.process()
-                data = processor.df
-                self._store_tabular(document.title, data, document, summary)
+        def record(document: Document, outcome: str):
+            counts[outcome] += 1
+            if on_progress is not None:
+                on_progress(document, outcome, counts, len(documents))
 
+        pending = []
+        for document in documents:
+            state = states.get(str(document.id))
+            if state is not None and state.is_current(document):
+                record(document, "unchanged")
             else:
-                nodes = processor.process()
-                nodes = [self._update_metadata(node, document) for node in nodes]
+                pending.append((document, state))
 
-                print(len(nodes))
+        with ThreadPoolExecutor(max_workers=self.download_workers) as pipeline:
+            outcomes = pipeline.map(lambda item: self._process_document(*item, should_cancel=should_cancel), pending)
+            for (document, _), outcome in zip(pending, outcomes):
+                record(document, outcome)
 
-                self._store_vector(nodes, document.access_level)
+        self.logger.bind(documents=len(documents), **counts).info("indexing run finished")
+        return counts
 
-    def _store_tabular(self, table_name: str, data: pd.DataFrame, document: Document, summary: str):
-        engine = get_postgres_engine()
+    def _process_document(
+        self,
+        document: Document,
+        state,
+        should_cancel: Optional[Callable[[], bool]] = None,
+    ) -> str:
+        """Runs one document through download, parse and store; failures are recorded, never raised."""
+        if should_cancel is not None and should_cancel():
+            return "cancelled"
+        try:
+            with self._download(document) as document_path:
+                content_hash = self._file_hash(document_path)
+
+                if state is not None and state.has_content(content_hash):
+                    # only the metadata was touched; advance the watermark without re-indexing
+                    self.state_store.mark_indexed(document, content_hash)
+                    return "unchanged"
+
+                self.state_store.mark_started(document, content_hash)
+                self._index_document(document, document_path)
+                self.state_store.mark_indexed(document, content_hash)
+                return "indexed"
+        except Exception as e:
+            self.logger.bind(document_id=str(document.id), err=str(e)).error("failed to index document")
+            self.state_store.mark_failed(document, str(e))
+            return "failed"
+
+    def _get_parse_pool(self) -> ProcessPoolExecutor:
+        with self._parse_pool_lock:
+            if self._parse_pool is None:
+                # spawn, not fork: forking a process that already runs download threads can copy held locks
+                self._parse_pool = ProcessPoolExecutor(
+                    max_workers=self.parse_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._parse_pool
+
+    def _discard_parse_pool(self, parse_pool: ProcessPoolExecutor):
+        """Drops a broken pool so the next parse starts a new one, unless another thread already replaced it."""
+        with self._parse_pool_lock:
+            if self._parse_pool is parse_pool:
+                self._parse_pool = None
+        parse_pool.shutdown(wait=False)
+
+    def _parse(self, document_type: str, document_path: str):
+        if self.parse_workers == 0 or document_type not in PROCESS_POOL_TYPES:
+            return parse_nodes(document_type, document_path)
+
+        for attempt in range(2):
+            parse_pool = self._get_parse_pool()
+            try:
+                return parse_pool.submit(parse_nodes, document_type, document_path).result()
+            except BrokenProcessPool:
+                # a worker died (OOM kill, crash in native code) and broke the pool for every document in it;
+                # each of them is retried once on a new pool before it is marked failed
+                self._discard_parse_pool(parse_pool)
+                if attempt:
+                    raise
+                self.logger.bind(document_type=document_type).warning("parse pool broken, retrying on a new pool")
 
-        data["access_level"] = document.access_level
+    def _index_document(self, document: Document, document_path: str):
+        if document.type == 'csv':
+            summary = CSVProcessor(
+                document_path, sample_rows=SUMMARY_SAMPLE_ROWS, summary_cache=self.summary_cache
+            ).process()
+            with self._store_slots:
+                self._store_tabular(document.title, read_csv_chunks(document_path), document, summary)
 
-        data.to_sql(table_name, con=engine, if_exists="replace", index=False)
+        elif document.type == 'xlsx':
+            # every sheet becomes a table of its own, each streamed from the file as it is loaded
+            for sheet_name in sheet_names(document_path):
+                processor = XLSXProcessor(
+                    document_path, sheet_name, sample_rows=SUMMARY_SAMPLE_ROWS, summary_cache=self.summary_cache
+                )
+                if processor.load().empty:
+                    continue
+                summary = processor.summarize()
+                with self._store_slots:
+                    self._store_tabular(
+                        sheet_table_name(document.title, sheet_name),
+                        read_sheet_chunks(document_path, sheet_name),
+                        document,
+                        summary,
+                    )
+
+        else:
+            nodes = self._parse(document.type, document_path)
+            nodes = [self._update_metadata(node, document) for node in nodes]
+
+            with self._store_slots:
+                self._store_vector(nodes, document.access_level, str(document.id))
+
+    def _store_tabular(self, table_name: str, chunks: Iterable[pd.DataFrame], document: Document, summary: TableInfo):
+        engine = get_postgres_engine()
+
+        stats = TableLoader(engine).load(chunks, table_name, document.access_level)
+        self.logger.bind(document_id=str(document.id), table=table_name, **stats).info("loaded table")
         
         create_metadata_table_query = text(
             "CREATE TABLE IF NOT EXISTS metadata_table (\n"
@@ -121,14 +338,21 @@ class DocumentIndexing:
             "    summary TEXT\n"
             ");"
         )
+        # a spreadsheet document has one table, and one metadata row, per sheet
+        add_table_name_query = text("ALTER TABLE metadata_table ADD COLUMN IF NOT EXISTS table_name VARCHAR;")
+        create_metadata_index_query = text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS metadata_table_document_table_idx ON metadata_table (document_id, table_name);"
+        )
         
-        with engine.connect() as conn:
+        with engine.begin() as conn:
             conn.execute(create_metadata_table_query)
+            conn.execute(add_table_name_query)
+            conn.execute(create_metadata_index_query)
 
             insert_metadata_query = text(
-                "INSERT INTO metadata_table (document_id, title, type, object_name, created_at, updated_at, access_level, summary)\n"
-                "VALUES (:document_id, :title, :type, :object_name, :created_at, :updated_at, :access_level, :summary)\n"
-                "ON CONFLICT (document_id) DO UPDATE\n"
+                "INSERT INTO metadata_table (document_id, table_name, title, type, object_name, created_at, updated_at, access_level, summary)\n"
+                "VALUES (:document_id, :table_name, :title, :type, :object_name, :created_at, :updated_at, :access_level, :summary)\n"
+                "ON CONFLICT (document_id, table_name) DO UPDATE\n"
                 "SET title = EXCLUDED.title,\n"
                 "    type = EXCLUDED.type,\n"
                 "    object_name = EXCLUDED.object_name,\n"
@@ -140,32 +364,47 @@ class DocumentIndexing:
 
             conn.execute(insert_metadata_query, {
                 "document_id": document.id,
+                "table_name": table_name,
                 "title": document.title,
                 "type": document.type,
                 "object_name": document.object_name,
                 "created_at": document.created_at,
                 "updated_at": document.updated_at,
                 "access_level": document.access_level,
-                "summary": summary
+                "summary": summary.model_dump_json()
             })
 
-    def _store_vector(self, nodes, access_level):
-        POSTGRES_DB = os.getenv("POSTGRES_DB")
-        POSTGRES_USER = os.getenv("POSTGRES_USER")
-        POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD")
-        POSTGRES_HOST = os.getenv("POSTGRES_HOST")
-        POSTGRES_PORT = int(os.getenv("POSTGRES_PORT", 5432))
-        
-        postgres_handler = PostgresHandler(
-            db_name=POSTGRES_DB,
-            user=POSTGRES_USER,
-            password=POSTGRES_PASSWORD,
-            host=POSTGRES_HOST,
-            port=POSTGRES_PORT,
-            dimension=1536
-        )
+    def _vector_handler(self) -> PostgresHandler:
+        """Connects to the vector store on first use; the handler and its pool are shared by every document."""
+        with self._postgres_lock:
+            if self._postgres_handler is None:
+                POSTGRES_DB = os.getenv("POSTGRES_DB")
+                POSTGRES_USER = os.getenv("POSTGRES_USER")
+                POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD")
+                POSTGRES_HOST = os.getenv("POSTGRES_HOST")
+                POSTGRES_PORT = int(os.getenv("POSTGRES_PORT", 5432))
+
+                self._postgres_handler = PostgresHandler(
+                    db_name=POSTGRES_DB,
+                    user=POSTGRES_USER,
+                    password=POSTGRES_PASSWORD,
+                    host=POSTGRES_HOST,
+                    port=POSTGRES_PORT,
+                    dimension=1536
+                )
+            return self._postgres_handler
 
-        postgres_storage = PostgresNodeStorage(postgres_handler)
-        postgres_storage.store_nodes([node.text for node in nodes], access_level)
+    def _store_vector(self, nodes, access_level, document_id=None):
+        postgres_storage = PostgresNodeStorage(self._vector_handler())
+        postgres_storage.store_nodes([node.text for node in nodes], access_level, document_id)
 
-        postgres_handler.close()
\ No newline at end of file
+    def close(self):
+        """Stops the parse pool and closes the vector store connection pool, if they were started."""
+        with self._parse_pool_lock:
+            if self._parse_pool is not None:
+                self._parse_pool.shutdown()
+                self._parse_pool = None
+        with self._postgres_lock:
+            if self._postgres_handler is not None:
+                self._postgres_handler.close()
+                self._postgres_handler = None
\ No newline at end of file
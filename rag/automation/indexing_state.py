@@ -0,0 +1,131 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from document.document import Document
+from rag.sql.postgres_db_loader import get_postgres_engine
+from rag.vectordb.batch_embedder import EMBEDDING_MODEL
+
+# Bump whenever parsing or chunking output changes, so every document is re-indexed on the next run.
+PARSER_VERSION = "3"
+
+STATUS_INDEXING = "indexing"
+STATUS_INDEXED = "indexed"
+STATUS_FAILED = "failed"
+
+STATE_TABLE = "document_indexing_state"
+
+
+class IndexingState(BaseModel):
+    document_id: str
+    content_hash: Optional[str] = None
+    parser_version: str
+    embedding_model: str
+    status: str
+    document_updated_at: Optional[datetime] = None
+    indexed_at: Optional[datetime] = None
+    error: Optional[str] = None
+
+    def is_current(self, document: Document) -> bool:
+        """True when the document was indexed successfully by the current pipeline and not modified since."""
+        return (
+            self.status == STATUS_INDEXED
+            and self.parser_version == PARSER_VERSION
+            and self.embedding_model == EMBEDDING_MODEL
+            and self.document_updated_at is not None
+            and self.document_updated_at >= document.updated_at
+        )
+
+    def has_content(self, content_hash: str) -> bool:
+        """True when the indexed content is byte-identical to `content_hash` under the current pipeline."""
+        return (
+            self.status == STATUS_INDEXED
+            and self.parser_version == PARSER_VERSION
+            and self.embedding_model == EMBEDDING_MODEL
+            and self.content_hash == content_hash
+        )
+
+
+class IndexingStateStore:
+    """Per-document indexing state, so scheduled runs only touch new, changed or failed documents."""
+
+    def __init__(self, engine: Optional[Engine] = None):
+        self.engine = engine if engine is not None else get_postgres_engine()
+        self._table_ready = False
+
+    def _ensure_table(self, conn):
+        if self._table_ready:
+            return
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {STATE_TABLE} (\n"
+            "    document_id VARCHAR PRIMARY KEY,\n"
+            "    content_hash VARCHAR,\n"
+            "    parser_version VARCHAR NOT NULL,\n"
+            "    embedding_model VARCHAR NOT NULL,\n"
+            "    status VARCHAR NOT NULL,\n"
+            "    document_updated_at TIMESTAMP,\n"
+            "    started_at TIMESTAMP,\n"
+            "    indexed_at TIMESTAMP,\n"
+            "    error TEXT\n"
+            ");"
+        ))
+        self._table_ready = True
+
+    def get_states(self, document_ids: List[str]) -> Dict[str, IndexingState]:
+        if not document_ids:
+            return {}
+        with self.engine.begin() as conn:
+            self._ensure_table(conn)
+            rows = conn.execute(
+                text(
+                    "SELECT document_id, content_hash, parser_version, embedding_model, status, "
+                    f"document_updated_at, indexed_at, error FROM {STATE_TABLE} WHERE document_id = ANY(:ids);"
+                ),
+                {"ids": document_ids},
+            ).mappings().all()
+        return {row["document_id"]: IndexingState(**row) for row in rows}
+
+    def _upsert(self, document: Document, status: str, content_hash: Optional[str] = None, error: Optional[str] = None):
+        now = datetime.now()
+        with self.engine.begin() as conn:
+            self._ensure_table(conn)
+            conn.execute(
+                text(
+                    f"INSERT INTO {STATE_TABLE} (document_id, content_hash, parser_version, embedding_model, status, "
+                    "document_updated_at, started_at, indexed_at, error)\n"
+                    "VALUES (:document_id, :content_hash, :parser_version, :embedding_model, :status, "
+                    ":document_updated_at, :started_at, :indexed_at, :error)\n"
+                    "ON CONFLICT (document_id) DO UPDATE\n"
+                    f"SET content_hash = COALESCE(EXCLUDED.content_hash, {STATE_TABLE}.content_hash),\n"
+                    "    parser_version = EXCLUDED.parser_version,\n"
+                    "    embedding_model = EXCLUDED.embedding_model,\n"
+                    "    status = EXCLUDED.status,\n"
+                    "    document_updated_at = EXCLUDED.document_updated_at,\n"
+                    f"    started_at = COALESCE(EXCLUDED.started_at, {STATE_TABLE}.started_at),\n"
+                    f"    indexed_at = COALESCE(EXCLUDED.indexed_at, {STATE_TABLE}.indexed_at),\n"
+                    "    error = EXCLUDED.error;"
+                ),
+                {
+                    "document_id": str(document.id),
+                    "content_hash": content_hash,
+                    "parser_version": PARSER_VERSION,
+                    "embedding_model": EMBEDDING_MODEL,
+                    "status": status,
+                    "document_updated_at": document.updated_at,
+                    "started_at": now if status == STATUS_INDEXING else None,
+                    "indexed_at": now if status == STATUS_INDEXED else None,
+                    "error": error,
+                },
+            )
+
+    def mark_started(self, document: Document, content_hash: str):
+        self._upsert(document, STATUS_INDEXING, content_hash=content_hash)
+
+    def mark_indexed(self, document: Document, content_hash: str):
+        self._upsert(document, STATUS_INDEXED, content_hash=content_hash)
+
+    def mark_failed(self, document: Document, error: str):
+        self._upsert(document, STATUS_FAILED, error=error)
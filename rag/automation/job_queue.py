@@ -0,0 +1,237 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, computed_field
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from rag.sql.postgres_db_loader import get_postgres_engine
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+FINISHED_STATUSES = (JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED)
+
+JOBS_TABLE = "indexing_jobs"
+JOB_LOGS_TABLE = "indexing_job_logs"
+
+JOB_COLUMNS = (
+    "id, status, start_date, document_id, total, done, indexed, unchanged, failed, cancel_requested, worker_id, error, "
+    "created_at, started_at, heartbeat_at, finished_at"
+)
+
+
+class IndexingJob(BaseModel):
+    id: int
+    status: str
+    start_date: Optional[datetime] = None
+    document_id: Optional[str] = None
+    total: int = 0
+    done: int = 0
+    indexed: int = 0
+    unchanged: int = 0
+    failed: int = 0
+    cancel_requested: bool = False
+    worker_id: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    heartbeat_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    @computed_field
+    @property
+    def queued_seconds(self) -> Optional[float]:
+        if self.started_at is None:
+            return None
+        return (self.started_at - self.created_at).total_seconds()
+
+    @computed_field
+    @property
+    def run_seconds(self) -> Optional[float]:
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return (self.finished_at - self.started_at).total_seconds()
+
+
+class IndexingJobLog(BaseModel):
+    created_at: datetime
+    level: str
+    message: str
+
+
+class IndexingJobQueue:
+    """Durable queue of indexing runs in Postgres.
+
+    Workers claim jobs with FOR UPDATE SKIP LOCKED, so any number of them can poll the same table
+    without handing one job to two workers. A running job whose heartbeat is older than
+    `stale_after_seconds` is considered abandoned by a dead worker and is claimed again.
+
+    A job either rescans documents created after `start_date` or indexes the single document `document_id`.
+    Single-document jobs are claimed ahead of rescans, and at most one of them is queued per document:
+    re-submitting a document that is still waiting returns the job already queued for it.
+    """
+
+    def __init__(self, engine: Optional[Engine] = None, stale_after_seconds: int = 1800):
+        self.engine = engine if engine is not None else get_postgres_engine()
+        self.stale_after_seconds = stale_after_seconds
+        self._tables_ready = False
+
+    def _ensure_tables(self, conn):
+        if self._tables_ready:
+            return
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {JOBS_TABLE} (\n"
+            "    id SERIAL PRIMARY KEY,\n"
+            "    status VARCHAR NOT NULL,\n"
+            "    start_date TIMESTAMP,\n"
+            "    total INTEGER NOT NULL DEFAULT 0,\n"
+            "    done INTEGER NOT NULL DEFAULT 0,\n"
+            "    indexed INTEGER NOT NULL DEFAULT 0,\n"
+            "    unchanged INTEGER NOT NULL DEFAULT 0,\n"
+            "    failed INTEGER NOT NULL DEFAULT 0,\n"
+            "    cancel_requested BOOLEAN NOT NULL DEFAULT FALSE,\n"
+            "    worker_id VARCHAR,\n"
+            "    error TEXT,\n"
+            "    created_at TIMESTAMP NOT NULL DEFAULT NOW(),\n"
+            "    started_at TIMESTAMP,\n"
+            "    heartbeat_at TIMESTAMP,\n"
+            "    finished_at TIMESTAMP\n"
+            ");"
+        ))
+        conn.execute(text(f"ALTER TABLE {JOBS_TABLE} ADD COLUMN IF NOT EXISTS document_id VARCHAR;"))
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {JOBS_TABLE}_status_idx ON {JOBS_TABLE} (status, created_at);"))
+        conn.execute(text(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS {JOBS_TABLE}_queued_document_idx ON {JOBS_TABLE} (document_id)\n"
+            f"WHERE status = '{JOB_QUEUED}' AND document_id IS NOT NULL;"
+        ))
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {JOB_LOGS_TABLE} (\n"
+            "    id SERIAL PRIMARY KEY,\n"
+            f"    job_id INTEGER NOT NULL REFERENCES {JOBS_TABLE}(id) ON DELETE CASCADE,\n"
+            "    created_at TIMESTAMP NOT NULL DEFAULT NOW(),\n"
+            "    level VARCHAR NOT NULL,\n"
+            "    message TEXT NOT NULL\n"
+            ");"
+        ))
+        self._tables_ready = True
+
+    def _execute(self, query: str, params: Optional[dict] = None):
+        with self.engine.begin() as conn:
+            self._ensure_tables(conn)
+            conn.execute(text(query), params or {})
+
+    def _fetch_job(self, query: str, params: dict) -> Optional[IndexingJob]:
+        with self.engine.begin() as conn:
+            self._ensure_tables(conn)
+            row = conn.execute(text(query), params).mappings().first()
+        return IndexingJob(**row) if row is not None else None
+
+    def submit(self, start_date: Optional[datetime] = None) -> IndexingJob:
+        return self._fetch_job(
+            f"INSERT INTO {JOBS_TABLE} (status, start_date) VALUES (:status, :start_date) RETURNING {JOB_COLUMNS};",
+            {"status": JOB_QUEUED, "start_date": start_date},
+        )
+
+    def submit_document(self, document_id: str) -> IndexingJob:
+        """Queues indexing of one document, coalescing with a job still queued for the same document."""
+        return self._fetch_job(
+            f"INSERT INTO {JOBS_TABLE} (status, document_id) VALUES (:status, :document_id)\n"
+            f"ON CONFLICT (document_id) WHERE status = '{JOB_QUEUED}' AND document_id IS NOT NULL\n"
+            # a no-op update, so the already queued job is returned
+            "DO UPDATE SET status = EXCLUDED.status\n"
+            f"RETURNING {JOB_COLUMNS};",
+            {"status": JOB_QUEUED, "document_id": str(document_id)},
+        )
+
+    def get(self, job_id: int) -> Optional[IndexingJob]:
+        return self._fetch_job(f"SELECT {JOB_COLUMNS} FROM {JOBS_TABLE} WHERE id = :id;", {"id": job_id})
+
+    def claim(self, worker_id: str) -> Optional[IndexingJob]:
+        """Atomically takes the oldest queued (or abandoned) job and marks it running for `worker_id`."""
+        return self._fetch_job(
+            f"UPDATE {JOBS_TABLE}\n"
+            "SET status = :running, worker_id = :worker_id, started_at = NOW(), heartbeat_at = NOW()\n"
+            "WHERE id = (\n"
+            f"    SELECT id FROM {JOBS_TABLE}\n"
+            "    WHERE status = :queued\n"
+            "       OR (status = :running AND heartbeat_at < NOW() - make_interval(secs => :stale_after))\n"
+            "    ORDER BY document_id IS NULL, created_at\n"
+            "    FOR UPDATE SKIP LOCKED\n"
+            "    LIMIT 1\n"
+            f")\nRETURNING {JOB_COLUMNS};",
+            {
+                "running": JOB_RUNNING,
+                "queued": JOB_QUEUED,
+                "worker_id": worker_id,
+                "stale_after": self.stale_after_seconds,
+            },
+        )
+
+    def update_progress(self, job_id: int, counts: Dict[str, int], total: int):
+        """Records progress and doubles as the job's heartbeat."""
+        self._execute(
+            f"UPDATE {JOBS_TABLE}\n"
+            "SET total = :total, done = :done, indexed = :indexed, unchanged = :unchanged, failed = :failed, "
+            "heartbeat_at = NOW()\n"
+            "WHERE id = :id;",
+            {
+                "id": job_id,
+                "total": total,
+                "done": counts.get("indexed", 0) + counts.get("unchanged", 0) + counts.get("failed", 0),
+                "indexed": counts.get("indexed", 0),
+                "unchanged": counts.get("unchanged", 0),
+                "failed": counts.get("failed", 0),
+            },
+        )
+
+    def heartbeat(self, job_id: int):
+        """Marks a running job as alive, so it is not claimed again as abandoned."""
+        self._execute(
+            f"UPDATE {JOBS_TABLE} SET heartbeat_at = NOW() WHERE id = :id AND status = :running;",
+            {"id": job_id, "running": JOB_RUNNING},
+        )
+
+    def finish(self, job_id: int, status: str, error: Optional[str] = None):
+        if status not in FINISHED_STATUSES:
+            raise ValueError(f"Unsupported final job status: {status}")
+        self._execute(
+            f"UPDATE {JOBS_TABLE} SET status = :status, error = :error, finished_at = NOW() WHERE id = :id;",
+            {"id": job_id, "status": status, "error": error},
+        )
+
+    def cancel(self, job_id: int) -> Optional[IndexingJob]:
+        """Cancels a queued job right away; a running job is asked to stop after its in-flight documents."""
+        return self._fetch_job(
+            f"UPDATE {JOBS_TABLE}\n"
+            "SET cancel_requested = TRUE,\n"
+            "    status = CASE WHEN status = :queued THEN :cancelled ELSE status END,\n"
+            "    finished_at = CASE WHEN status = :queued THEN NOW() ELSE finished_at END\n"
+            f"WHERE id = :id\nRETURNING {JOB_COLUMNS};",
+            {"id": job_id, "queued": JOB_QUEUED, "cancelled": JOB_CANCELLED},
+        )
+
+    def is_cancel_requested(self, job_id: int) -> bool:
+        with self.engine.begin() as conn:
+            self._ensure_tables(conn)
+            return bool(conn.execute(
+                text(f"SELECT cancel_requested FROM {JOBS_TABLE} WHERE id = :id;"), {"id": job_id}
+            ).scalar())
+
+    def log(self, job_id: int, message: str, level: str = "INFO"):
+        self._execute(
+            f"INSERT INTO {JOB_LOGS_TABLE} (job_id, level, message) VALUES (:job_id, :level, :message);",
+            {"job_id": job_id, "level": level, "message": message},
+        )
+
+    def logs(self, job_id: int) -> List[IndexingJobLog]:
+        with self.engine.begin() as conn:
+            self._ensure_tables(conn)
+            rows = conn.execute(
+                text(f"SELECT created_at, level, message FROM {JOB_LOGS_TABLE} WHERE job_id = :job_id ORDER BY id;"),
+                {"job_id": job_id},
+            ).mappings().all()
+        return [IndexingJobLog(**row) for row in rows]
@@ -0,0 +1,55 @@
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from rag.parsing.processor import TableInfo, TableSummaryCache
+from rag.sql.postgres_db_loader import get_postgres_engine
+
+SUMMARY_CACHE_TABLE = "table_summary_cache"
+
+
+class PostgresTableSummaryCache(TableSummaryCache):
+    """Table summaries by fingerprint. A changed schema, sample, prompt or model changes the fingerprint,
+    so stale summaries are never returned; they are simply no longer looked up."""
+
+    def __init__(self, engine: Optional[Engine] = None):
+        self.engine = engine if engine is not None else get_postgres_engine()
+        self._table_ready = False
+
+    def _ensure_table(self, conn):
+        if self._table_ready:
+            return
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {SUMMARY_CACHE_TABLE} (\n"
+            "    fingerprint VARCHAR PRIMARY KEY,\n"
+            "    table_name VARCHAR NOT NULL,\n"
+            "    table_summary TEXT NOT NULL,\n"
+            "    created_at TIMESTAMP NOT NULL DEFAULT NOW()\n"
+            ");"
+        ))
+        self._table_ready = True
+
+    def get(self, fingerprint: str) -> Optional[TableInfo]:
+        with self.engine.begin() as conn:
+            self._ensure_table(conn)
+            row = conn.execute(
+                text(f"SELECT table_name, table_summary FROM {SUMMARY_CACHE_TABLE} WHERE fingerprint = :fingerprint;"),
+                {"fingerprint": fingerprint},
+            ).mappings().first()
+        return TableInfo(**row) if row is not None else None
+
+    def put(self, fingerprint: str, table_info: TableInfo):
+        with self.engine.begin() as conn:
+            self._ensure_table(conn)
+            conn.execute(
+                text(
+                    f"INSERT INTO {SUMMARY_CACHE_TABLE} (fingerprint, table_name, table_summary)\n"
+                    "VALUES (:fingerprint, :table_name, :table_summary)\n"
+                    "ON CONFLICT (fingerprint) DO UPDATE\n"
+                    "SET table_name = EXCLUDED.table_name,\n"
+                    "    table_summary = EXCLUDED.table_summary,\n"
+                    "    created_at = NOW();"
+                ),
+                {"fingerprint": fingerprint, "table_name": table_info.table_name, "table_summary": table_info.table_summary},
+            )
@@ -0,0 +1,58 @@
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi import HTTPException
+
+from rag.automation.controller import IndexingJobControllerV1
+from rag.automation.job_queue import IndexingJob, IndexingJobLog, IndexingJobQueue
+
+
+@pytest.fixture
+def mock_queue():
+    return MagicMock(spec=IndexingJobQueue)
+
+@pytest.fixture
+def controller(mock_queue):
+    return IndexingJobControllerV1(mock_queue)
+
+@pytest.fixture
+def job():
+    return IndexingJob(id=3, status="queued", created_at=datetime(2024, 12, 1))
+
+
+def test_submit_job(controller, mock_queue, job):
+    mock_queue.submit.return_value = job
+
+    assert controller.submit_job(datetime(2024, 11, 1)) == job
+    mock_queue.submit.assert_called_once_with(datetime(2024, 11, 1))
+
+def test_fetch_job(controller, mock_queue, job):
+    mock_queue.get.return_value = job
+
+    assert controller.fetch_job(3) == job
+
+def test_fetch_job_not_found(controller, mock_queue):
+    mock_queue.get.return_value = None
+
+    with pytest.raises(HTTPException) as excinfo:
+        controller.fetch_job(3)
+    assert excinfo.value.status_code == 404
+
+def test_cancel_job(controller, mock_queue, job):
+    mock_queue.cancel.return_value = job.model_copy(update={"status": "cancelled", "cancel_requested": True})
+
+    assert controller.cancel_job(3).status == "cancelled"
+
+def test_cancel_job_not_found(controller, mock_queue):
+    mock_queue.cancel.return_value = None
+
+    with pytest.raises(HTTPException):
+        controller.cancel_job(3)
+
+def test_fetch_job_logs(controller, mock_queue, job):
+    mock_queue.get.return_value = job
+    logs = [IndexingJobLog(created_at=datetime(2024, 12, 1), level="INFO", message="started by worker-1")]
+    mock_queue.logs.return_value = logs
+
+    assert controller.fetch_job_logs(3) == logs
@@ -1,15 +1,27 @@
+import os
+import threading
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
-from unittest.mock import MagicMock, mock_open, patch
+from unittest.mock import MagicMock, patch
 
 import pandas as pd
 import pytest
 
 from document.document import Document
 from document.service import DocumentServiceV1
-from rag.automation.document_automation import DocumentIndexing
+from rag.automation.document_automation import (
+    DOWNLOAD_TIMEOUT,
+    MAX_IDENTIFIER_BYTES,
+    DocumentIndexing,
+    parse_nodes,
+    sheet_table_name,
+)
+from rag.automation.indexing_state import PARSER_VERSION, IndexingState, IndexingStateStore
+from rag.vectordb.batch_embedder import EMBEDDING_MODEL
 from rag.parsing.parsing_csv import CSVProcessor
 from rag.parsing.parsing_pdf import PDFProcessor
 from rag.parsing.parsing_txt import TXTProcessor
+from rag.parsing.processor import TableInfo, TableSummaryCache
 
 
 @pytest.fixture
@@ -40,8 +52,37 @@ def aws_config():
     )
 # Fixture for DocumentIndexing instance with a mock service
 @pytest.fixture
-def document_indexing(mock_service, aws_config):
-    return DocumentIndexing(aws_config=aws_config, service=mock_service)
+def mock_state_store():
+    store = MagicMock(spec=IndexingStateStore)
+    store.get_states.return_value = {}
+    return store
+
+@pytest.fixture
+def mock_summary_cache():
+    cache = MagicMock(spec=TableSummaryCache)
+    cache.get.return_value = None
+    return cache
+
+@pytest.fixture
+def document_indexing(mock_service, aws_config, mock_state_store, mock_summary_cache, tmp_path):
+    return DocumentIndexing(
+        aws_config=aws_config,
+        service=mock_service,
+        state_store=mock_state_store,
+        summary_cache=mock_summary_cache,
+        temp_dir=str(tmp_path),
+        parse_workers=0,
+    )
+
+def indexed_state(document, content_hash="hash", updated_at=None):
+    return IndexingState(
+        document_id=str(document.id),
+        content_hash=content_hash,
+        parser_version=PARSER_VERSION,
+        embedding_model=EMBEDDING_MODEL,
+        status="indexed",
+        document_updated_at=updated_at or document.updated_at,
+    )
 
 def test_s3_client_initialization(document_indexing, aws_config):
     assert document_indexing.s3_client is not None
@@ -140,7 +181,7 @@ def test_process_documents_pdf(mock_requests_get, mock_generate_presigned_url, m
     document_indexing.process_documents()
 
     mock_generate_presigned_url.assert_called_once()
-    mock_requests_get.assert_called_once_with("https://dummy_url")  
+    mock_requests_get.assert_called_once_with("https://dummy_url", stream=True, timeout=DOWNLOAD_TIMEOUT)
     mock_pdf_process.assert_called_once()
     document_indexing._store_vector.assert_called_once()
 
@@ -165,29 +206,64 @@ def test_process_documents_txt(mock_requests_get, mock_generate_presigned_url, m
     document_indexing.process_documents()
 
     mock_generate_presigned_url.assert_called_once()
-    mock_requests_get.assert_called_once_with("https://dummy_url")  
+    mock_requests_get.assert_called_once_with("https://dummy_url", stream=True, timeout=DOWNLOAD_TIMEOUT)
     mock_txt_process.assert_called_once()
     document_indexing._store_vector.assert_called_once()
 
+@patch("rag.automation.document_automation.read_sheet_chunks")
+@patch("rag.automation.document_automation.XLSXProcessor")
+@patch("rag.automation.document_automation.sheet_names")
+def test_index_document_xlsx(mock_sheet_names, mock_xlsx_processor, mock_read_sheet_chunks, document_indexing, document):
+    document.type = 'xlsx'
+    mock_sheet_names.return_value = ["Sales", "Empty", "Stock"]
+    processors = {
+        name: MagicMock(**{"load.return_value": pd.DataFrame({"a": []} if name == "Empty" else {"a": [1]})})
+        for name in mock_sheet_names.return_value
+    }
+    mock_xlsx_processor.side_effect = lambda path, sheet_name, sample_rows, summary_cache: processors[sheet_name]
+    document_indexing._store_tabular = MagicMock()
+
+    document_indexing._index_document(document, "temp.xlsx")
+
+    assert [c.args[0] for c in document_indexing._store_tabular.call_args_list] == [
+        f"{document.title} - Sales", f"{document.title} - Stock"
+    ]
+    mock_read_sheet_chunks.assert_any_call("temp.xlsx", "Stock")
+    processors["Empty"].summarize.assert_not_called()
+
+def test_sheet_table_name():
+    assert sheet_table_name("Sales Report", "Q1") == "Sales Report - Q1"
+
+    title = "Laporan Keuangan Tahunan Perusahaan Daerah Provinsi Jawa Barat 2024"
+    first, second = sheet_table_name(title, "Pendapatan"), sheet_table_name(title, "Belanja")
+    # both would truncate to the same 63-byte identifier in Postgres
+    assert first != second
+    assert len(first.encode()) <= MAX_IDENTIFIER_BYTES and len(second.encode()) <= MAX_IDENTIFIER_BYTES
+    assert first.startswith("Laporan Keuangan")
+    assert sheet_table_name(title, "Pendapatan") == first
+
+    # a multi-byte character is never split by the truncation
+    assert len(sheet_table_name("Ringkasan é" * 10, "Data").encode()) <= MAX_IDENTIFIER_BYTES
+
 @patch("rag.automation.document_automation.get_postgres_engine")
-@patch("pandas.DataFrame.to_sql")
+@patch("rag.automation.document_automation.TableLoader")
 @patch("rag.automation.document_automation.text")
-def test_store_tabular(mock_text, mock_to_sql, mock_get_engine, document, document_indexing):
+def test_store_tabular(mock_text, mock_loader, mock_get_engine, document, document_indexing):
     mock_engine = MagicMock()
     mock_get_engine.return_value = mock_engine
     mock_connection = MagicMock()
-    mock_engine.connect.return_value.__enter__.return_value = mock_connection
+    mock_engine.begin.return_value.__enter__.return_value = mock_connection
     mock_text.return_value = "MOCKED_QUERY"
 
-    summary = "This is a test summary."
-    data = pd.DataFrame({"column1": [1, 2, 3]})
+    mock_loader.return_value.load.return_value = {"rows": 3, "seconds": 0.1, "rows_per_second": 30.0, "peak_rss_mb": 100.0}
+    summary = TableInfo(table_name="test_table", table_summary="This is a test summary.")
 
     instance = document_indexing
-    instance._store_tabular("test_table", data, document, summary)
+    chunks = iter([pd.DataFrame({"column1": ["1", "2", "3"]})])
+    instance._store_tabular("test_table", chunks, document, summary)
 
-    mock_to_sql.assert_called_once_with("test_table", con=mock_engine, if_exists="replace", index=False)
-    assert "access_level" in data.columns
-    assert all(data["access_level"] == document.access_level)
+    mock_loader.assert_called_once_with(mock_engine)
+    mock_loader.return_value.load.assert_called_once_with(chunks, "test_table", document.access_level)
     
     mock_text.assert_any_call(
         "CREATE TABLE IF NOT EXISTS metadata_table (\n"
@@ -203,11 +279,14 @@ def test_store_tabular(mock_text, mock_to_sql, mock_get_engine, document, docume
         ");"
     )
     mock_connection.execute.assert_any_call("MOCKED_QUERY")
+    mock_text.assert_any_call(
+        "CREATE UNIQUE INDEX IF NOT EXISTS metadata_table_document_table_idx ON metadata_table (document_id, table_name);"
+    )
 
     mock_text.assert_any_call(
-        "INSERT INTO metadata_table (document_id, title, type, object_name, created_at, updated_at, access_level, summary)\n"
-        "VALUES (:document_id, :title, :type, :object_name, :created_at, :updated_at, :access_level, :summary)\n"
-        "ON CONFLICT (document_id) DO UPDATE\n"
+        "INSERT INTO metadata_table (document_id, table_name, title, type, object_name, created_at, updated_at, access_level, summary)\n"
+        "VALUES (:document_id, :table_name, :title, :type, :object_name, :created_at, :updated_at, :access_level, :summary)\n"
+        "ON CONFLICT (document_id, table_name) DO UPDATE\n"
         "SET title = EXCLUDED.title,\n"
         "    type = EXCLUDED.type,\n"
         "    object_name = EXCLUDED.object_name,\n"
@@ -220,13 +299,14 @@ def test_store_tabular(mock_text, mock_to_sql, mock_get_engine, document, docume
         "MOCKED_QUERY",
         {
             "document_id": document.id,
+            "table_name": "test_table",
             "title": document.title,
             "type": document.type,
             "object_name": document.object_name,
             "created_at": document.created_at,
             "updated_at": document.updated_at,
             "access_level": document.access_level,
-            "summary": summary
+            "summary": summary.model_dump_json()
         }
     )
 
@@ -246,7 +326,7 @@ def test_store_vector(mock_postgres_storage, mock_postgres_handler, mock_getenv,
     
     mock_handler_instance = mock_postgres_handler.return_value
     mock_storage_instance = mock_postgres_storage.return_value
-    document_indexing._store_vector(mock_nodes, 5)
+    document_indexing._store_vector(mock_nodes, 5, "doc-1")
 
     mock_postgres_handler.assert_called_once_with(
         db_name="test_db",
@@ -259,9 +339,18 @@ def test_store_vector(mock_postgres_storage, mock_postgres_handler, mock_getenv,
     mock_postgres_storage.assert_called_once_with(mock_handler_instance)
 
     mock_storage_instance.store_nodes.assert_called_once_with(
-        ["node text 1", "node text 2"], 5
+        ["node text 1", "node text 2"], 5, "doc-1"
     )
 
+    # the handler and its pool outlive the document and are reused by the next one
+    document_indexing._store_vector(mock_nodes, 2, "doc-2")
+    mock_postgres_handler.assert_called_once()
+    mock_postgres_storage.assert_called_with(mock_handler_instance)
+    mock_handler_instance.close.assert_not_called()
+
+    document_indexing.close()
+    mock_handler_instance.close.assert_called_once()
+    document_indexing.close()
     mock_handler_instance.close.assert_called_once()
 
 @patch("document.document.Document.generate_presigned_url")
@@ -281,25 +370,247 @@ def test_generate_presigned_url(mock_generate_presigned_url):
     assert url == "", "Expected the presigned URL to be an empty string in placeholder implementation"
 
 @patch("rag.automation.document_automation.requests.get")
-@patch("builtins.open", new_callable=mock_open)
-def test_request_url(mock_open, mock_requests_get, document_indexing):
-    # Mock the response of requests.get
+def test_request_url(mock_requests_get, document_indexing, tmp_path):
+    document_indexing.temp_dir = str(tmp_path)
+    document_indexing.download_chunk_size = 4
     mock_response = MagicMock()
-    mock_response.content = b"mocked content"
-    mock_response.status_code = 200
+    mock_response.iter_content.return_value = [b"mock", b"ed c", b"onte", b"nt"]
     mock_requests_get.return_value = mock_response
 
-    # Call the _request_url method
     file_path = document_indexing._request_url("pdf", "https://dummy_url")
 
-    # Verify requests.get was called with the correct URL
-    mock_requests_get.assert_called_once_with("https://dummy_url")
+    mock_requests_get.assert_called_once_with("https://dummy_url", stream=True, timeout=DOWNLOAD_TIMEOUT)
+    mock_response.iter_content.assert_called_once_with(chunk_size=4)
+    mock_response.close.assert_called_once()
+
+    # every download gets its own file, so concurrent runs cannot overwrite each other
+    assert os.path.dirname(file_path) == str(tmp_path)
+    assert file_path.endswith(".pdf")
+    with open(file_path, "rb") as file:
+        assert file.read() == b"mocked content"
+    assert document_indexing._request_url("pdf", "https://dummy_url") != file_path
+
+@patch("rag.automation.document_automation.requests.get")
+def test_request_url_removes_partial_file(mock_requests_get, document_indexing, tmp_path):
+    document_indexing.temp_dir = str(tmp_path)
+    mock_response = MagicMock()
+    mock_response.iter_content.side_effect = ConnectionError("connection reset")
+    mock_requests_get.return_value = mock_response
+
+    with pytest.raises(ConnectionError):
+        document_indexing._request_url("pdf", "https://dummy_url")
+
+    assert os.listdir(tmp_path) == []
+    mock_response.close.assert_called_once()
+
+@patch("rag.automation.document_automation.generate_presigned_url")
+def test_process_documents_removes_downloads(mock_generate_presigned_url, document_indexing, document, tmp_path):
+    downloaded = tmp_path / "document.csv"
+    downloaded.write_bytes(b"a,b")
+    document_indexing.fetch_documents = MagicMock(return_value=[document])
+    document_indexing._request_url = MagicMock(return_value=str(downloaded))
+    document_indexing._index_document = MagicMock(side_effect=RuntimeError("parse error"))
+
+    document_indexing.process_documents()
+
+    assert not downloaded.exists()
+
+def test_process_documents_skips_up_to_date_documents(document_indexing, document, mock_state_store):
+    mock_state_store.get_states.return_value = {str(document.id): indexed_state(document)}
+    document_indexing.fetch_documents = MagicMock(return_value=[document])
+    document_indexing._request_url = MagicMock()
+    document_indexing._index_document = MagicMock()
+
+    document_indexing.process_documents()
+
+    document_indexing._request_url.assert_not_called()
+    document_indexing._index_document.assert_not_called()
+    mock_state_store.mark_indexed.assert_not_called()
+
+@patch("rag.automation.document_automation.generate_presigned_url")
+def test_process_documents_reindexes_changed_documents(mock_generate_presigned_url, document_indexing, document, mock_state_store):
+    stale = indexed_state(document, content_hash="old", updated_at=datetime(2024, 1, 1))
+    mock_state_store.get_states.return_value = {str(document.id): stale}
+    document_indexing.fetch_documents = MagicMock(return_value=[document])
+    document_indexing._request_url = MagicMock(return_value="temp.csv")
+    document_indexing._file_hash = MagicMock(return_value="new")
+    document_indexing._index_document = MagicMock()
+
+    document_indexing.process_documents()
+
+    document_indexing._index_document.assert_called_once_with(document, "temp.csv")
+    mock_state_store.mark_started.assert_called_once_with(document, "new")
+    mock_state_store.mark_indexed.assert_called_once_with(document, "new")
+
+@patch("rag.automation.document_automation.generate_presigned_url")
+def test_process_documents_advances_watermark_for_unchanged_content(mock_generate_presigned_url, document_indexing, document, mock_state_store):
+    touched = indexed_state(document, content_hash="same", updated_at=datetime(2024, 1, 1))
+    mock_state_store.get_states.return_value = {str(document.id): touched}
+    document_indexing.fetch_documents = MagicMock(return_value=[document])
+    document_indexing._request_url = MagicMock(return_value="temp.csv")
+    document_indexing._file_hash = MagicMock(return_value="same")
+    document_indexing._index_document = MagicMock()
+
+    document_indexing.process_documents()
+
+    document_indexing._index_document.assert_not_called()
+    mock_state_store.mark_indexed.assert_called_once_with(document, "same")
+
+@patch("rag.automation.document_automation.generate_presigned_url")
+def test_process_documents_records_failures_and_continues(mock_generate_presigned_url, document_indexing, document, mock_state_store):
+    other = document.model_copy(update={"id": "0b5e3a6c-4a8e-4c4f-9a53-2f4f6f1c9b10"})
+    document_indexing.fetch_documents = MagicMock(return_value=[document, other])
+    document_indexing._request_url = MagicMock(return_value="temp.csv")
+    document_indexing._file_hash = MagicMock(return_value="hash")
+    document_indexing._index_document = MagicMock(side_effect=[RuntimeError("parse error"), None])
+
+    document_indexing.process_documents()
+
+    mock_state_store.mark_failed.assert_called_once_with(document, "parse error")
+    mock_state_store.mark_indexed.assert_called_once_with(other, "hash")
+
+def test_process_documents_without_documents(document_indexing, mock_state_store):
+    document_indexing.fetch_documents = MagicMock(return_value=None)
+
+    document_indexing.process_documents()
+
+    mock_state_store.get_states.assert_called_once_with([])
+
+def test_file_hash(tmp_path):
+    path = tmp_path / "doc.txt"
+    path.write_bytes(b"content")
+
+    assert DocumentIndexing._file_hash(str(path)) == "ed7002b439e9ac845f22357d822bac1444730fbdb6016d3ec9432297b9ec9f73"
+
+@patch("rag.automation.document_automation.ProcessPoolExecutor")
+def test_parse_dispatches_pdfs_to_parse_pool(mock_process_pool, document_indexing):
+    mock_pdf_processor = MagicMock()
+    parse_pool = mock_process_pool.return_value
+    parse_pool.submit.return_value.result.return_value = ["pdf node"]
+    document_indexing.parse_workers = 2
+
+    with patch.dict("rag.automation.document_automation.PROCESSORS", {"pdf": mock_pdf_processor}):
+        assert document_indexing._parse("pdf", "doc.pdf") == ["pdf node"]
+        assert document_indexing._parse("pdf", "doc.pdf") == ["pdf node"]
+        parse_pool.submit.assert_called_with(parse_nodes, "pdf", "doc.pdf")
+        mock_pdf_processor.assert_not_called()
+
+        # the pool is started once and outlives each parse until the indexer is closed
+        mock_process_pool.assert_called_once()
+        assert mock_process_pool.call_args.kwargs["max_workers"] == 2
+        parse_pool.shutdown.assert_not_called()
+        document_indexing.close()
+        parse_pool.shutdown.assert_called_once()
+
+        # without pool workers, or for cheap formats, parsing stays on the calling thread
+        document_indexing.parse_workers = 0
+        mock_pdf_processor.return_value.process.return_value = ["inline node"]
+        assert document_indexing._parse("pdf", "doc.pdf") == ["inline node"]
+        mock_pdf_processor.assert_called_once_with("doc.pdf")
+
+@patch("rag.automation.document_automation.ProcessPoolExecutor")
+def test_parse_retries_on_new_pool_when_broken(mock_process_pool, document_indexing):
+    broken_pool, fresh_pool = MagicMock(), MagicMock()
+    broken_pool.submit.return_value.result.side_effect = BrokenProcessPool("worker died")
+    fresh_pool.submit.return_value.result.return_value = ["pdf node"]
+    mock_process_pool.side_effect = [broken_pool, fresh_pool]
+    document_indexing.parse_workers = 2
+
+    assert document_indexing._parse("pdf", "doc.pdf") == ["pdf node"]
+
+    broken_pool.shutdown.assert_called_once_with(wait=False)
+    assert document_indexing._get_parse_pool() is fresh_pool
+
+@patch("rag.automation.document_automation.ProcessPoolExecutor")
+def test_parse_fails_when_pool_breaks_twice(mock_process_pool, document_indexing):
+    broken_pools = [MagicMock(), MagicMock(), MagicMock()]
+    for pool in broken_pools:
+        pool.submit.return_value.result.side_effect = BrokenProcessPool("worker died")
+    mock_process_pool.side_effect = broken_pools
+    document_indexing.parse_workers = 2
+
+    with pytest.raises(BrokenProcessPool):
+        document_indexing._parse("pdf", "doc.pdf")
+
+    assert mock_process_pool.call_count == 2
+    broken_pools[1].shutdown.assert_called_once_with(wait=False)
+    # the next document gets a working pool rather than the broken one
+    assert document_indexing._get_parse_pool() is broken_pools[2]
+
+def test_parse_nodes_unsupported_type():
+    with pytest.raises(ValueError, match="Unsupported document type: docx"):
+        parse_nodes("docx", "doc.docx")
+
+@patch("rag.automation.document_automation.ProcessPoolExecutor")
+@patch("rag.automation.document_automation.generate_presigned_url")
+def test_process_documents_runs_stages_concurrently(mock_generate_presigned_url, mock_process_pool, mock_service, aws_config, mock_state_store, document):
+    indexing = DocumentIndexing(
+        aws_config=aws_config, service=mock_service, state_store=mock_state_store,
+        download_workers=3, parse_workers=2, store_workers=1,
+    )
+    documents = [document.model_copy(update={"id": f"00000000-0000-4000-8000-00000000000{i}", "type": "pdf"}) for i in range(3)]
+    indexing.fetch_documents = MagicMock(return_value=documents)
+    indexing._request_url = MagicMock(return_value="missing.pdf")
+    indexing._file_hash = MagicMock(return_value="hash")
+
+    mock_process_pool.return_value.submit.return_value.result.return_value = []
+
+    # every download thread must be running before any document finishes
+    all_started = threading.Barrier(3, timeout=5)
+    indexing._index_document = MagicMock(
+        side_effect=lambda document, path: (all_started.wait(), indexing._parse(document.type, path))
+    )
+
+    indexing.process_documents()
+    indexing.process_documents()
+
+    # all documents, across runs, share one parse pool until the indexer is closed
+    mock_process_pool.assert_called_once()
+    assert mock_process_pool.return_value.submit.call_count == 6
+    mock_process_pool.return_value.shutdown.assert_not_called()
+    assert mock_state_store.mark_indexed.call_count == 6
+
+    indexing.close()
+    mock_process_pool.return_value.shutdown.assert_called_once()
+
+def test_invalid_pipeline_settings(mock_service, aws_config, mock_state_store):
+    with pytest.raises(ValueError):
+        DocumentIndexing(aws_config=aws_config, service=mock_service, state_store=mock_state_store, store_workers=0)
+
+@patch("rag.automation.document_automation.generate_presigned_url")
+def test_process_documents_reports_progress(mock_generate_presigned_url, document_indexing, document, mock_state_store):
+    other = document.model_copy(update={"id": "0b5e3a6c-4a8e-4c4f-9a53-2f4f6f1c9b10"})
+    mock_state_store.get_states.return_value = {str(document.id): indexed_state(document)}
+    document_indexing.fetch_documents = MagicMock(return_value=[document, other])
+    document_indexing._request_url = MagicMock(return_value="missing.csv")
+    document_indexing._file_hash = MagicMock(return_value="hash")
+    document_indexing._index_document = MagicMock()
+    on_progress = MagicMock()
+
+    counts = document_indexing.process_documents(on_progress=on_progress)
+
+    assert counts == {"indexed": 1, "unchanged": 1, "failed": 0, "cancelled": 0}
+    assert [(c.args[0], c.args[1], c.args[3]) for c in on_progress.call_args_list] == [
+        (document, "unchanged", 2), (other, "indexed", 2)
+    ]
+
+def test_process_documents_cancelled(document_indexing, document, mock_state_store):
+    document_indexing.fetch_documents = MagicMock(return_value=[document])
+    document_indexing._request_url = MagicMock()
+
+    counts = document_indexing.process_documents(should_cancel=lambda: True)
+
+    assert counts["cancelled"] == 1
+    document_indexing._request_url.assert_not_called()
+    mock_state_store.mark_failed.assert_not_called()
 
-    # Verify open was called with the constructed file name
-    mock_open.assert_called_once_with("temp.pdf", "wb")
+def test_process_documents_by_id(document_indexing, document, mock_state_store):
+    document_indexing.service.get_document_by_id = MagicMock(side_effect=[document, None])
+    document_indexing.fetch_documents = MagicMock()
+    document_indexing._process_document = MagicMock(return_value="indexed")
 
-    # Verify file.write was called with the correct content
-    mock_open().write.assert_called_once_with(b"mocked content")
+    counts = document_indexing.process_documents(document_ids=[str(document.id), "deleted-document"])
 
-    # Ensure the returned path is correct
-    assert file_path == "temp.pdf"
\ No newline at end of file
+    assert counts["indexed"] == 1
+    document_indexing.fetch_documents.assert_not_called()
+    mock_state_store.get_states.assert_called_once_with([str(document.id)])
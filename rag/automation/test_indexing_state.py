@@ -0,0 +1,104 @@
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+
+from document.document import Document
+from rag.automation.indexing_state import PARSER_VERSION, IndexingState, IndexingStateStore
+from rag.vectordb.batch_embedder import EMBEDDING_MODEL
+
+
+@pytest.fixture
+def document():
+    return Document(
+        id="f295fafb-829a-49e8-879a-0eb81cc4d3ad",
+        title="Test Document",
+        type="pdf",
+        object_name="test.pdf",
+        created_at=datetime(2024, 11, 1),
+        updated_at=datetime(2024, 11, 2),
+        access_level=2
+    )
+
+@pytest.fixture
+def mock_engine():
+    engine = MagicMock()
+    conn = engine.begin.return_value.__enter__.return_value
+    return engine, conn
+
+def make_state(**overrides):
+    fields = {
+        "document_id": "f295fafb-829a-49e8-879a-0eb81cc4d3ad",
+        "content_hash": "hash",
+        "parser_version": PARSER_VERSION,
+        "embedding_model": EMBEDDING_MODEL,
+        "status": "indexed",
+        "document_updated_at": datetime(2024, 11, 2),
+    }
+    fields.update(overrides)
+    return IndexingState(**fields)
+
+
+def test_state_is_current(document):
+    assert make_state().is_current(document)
+    assert not make_state(document_updated_at=datetime(2024, 11, 1)).is_current(document)
+    assert not make_state(status="failed").is_current(document)
+    assert not make_state(status="indexing").is_current(document)
+    assert not make_state(parser_version="0").is_current(document)
+    assert not make_state(embedding_model="text-embedding-ada-002").is_current(document)
+
+def test_state_has_content():
+    assert make_state().has_content("hash")
+    assert not make_state().has_content("other")
+    assert not make_state(status="failed").has_content("hash")
+
+def test_get_states(mock_engine):
+    engine, conn = mock_engine
+    conn.execute.return_value.mappings.return_value.all.return_value = [
+        {
+            "document_id": "doc-1",
+            "content_hash": "hash",
+            "parser_version": PARSER_VERSION,
+            "embedding_model": EMBEDDING_MODEL,
+            "status": "indexed",
+            "document_updated_at": datetime(2024, 11, 2),
+            "indexed_at": datetime(2024, 11, 3),
+            "error": None,
+        }
+    ]
+    store = IndexingStateStore(engine)
+
+    states = store.get_states(["doc-1", "doc-2"])
+
+    assert list(states) == ["doc-1"]
+    assert states["doc-1"].status == "indexed"
+    # table creation + select
+    assert conn.execute.call_count == 2
+    assert conn.execute.call_args[0][1] == {"ids": ["doc-1", "doc-2"]}
+
+def test_get_states_empty(mock_engine):
+    engine, _ = mock_engine
+    assert IndexingStateStore(engine).get_states([]) == {}
+    engine.begin.assert_not_called()
+
+def test_mark_indexed_and_failed(mock_engine, document):
+    engine, conn = mock_engine
+    store = IndexingStateStore(engine)
+
+    store.mark_indexed(document, "hash")
+    params = conn.execute.call_args[0][1]
+    assert params["document_id"] == str(document.id)
+    assert params["status"] == "indexed"
+    assert params["content_hash"] == "hash"
+    assert params["document_updated_at"] == document.updated_at
+    assert params["indexed_at"] is not None
+
+    store.mark_failed(document, "boom")
+    params = conn.execute.call_args[0][1]
+    assert params["status"] == "failed"
+    assert params["error"] == "boom"
+    assert params["content_hash"] is None
+    assert params["indexed_at"] is None
+
+    # the table is only created once per store
+    assert conn.execute.call_count == 3
@@ -0,0 +1,147 @@
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+
+from rag.automation.job_queue import IndexingJob, IndexingJobQueue
+
+
+def job_row(**overrides):
+    row = {
+        "id": 1,
+        "status": "queued",
+        "start_date": None,
+        "document_id": None,
+        "total": 0,
+        "done": 0,
+        "indexed": 0,
+        "unchanged": 0,
+        "failed": 0,
+        "cancel_requested": False,
+        "worker_id": None,
+        "error": None,
+        "created_at": datetime(2024, 12, 1, 10, 0, 0),
+        "started_at": None,
+        "heartbeat_at": None,
+        "finished_at": None,
+    }
+    row.update(overrides)
+    return row
+
+@pytest.fixture
+def mock_engine():
+    engine = MagicMock()
+    conn = engine.begin.return_value.__enter__.return_value
+    return engine, conn
+
+@pytest.fixture
+def queue(mock_engine):
+    return IndexingJobQueue(mock_engine[0])
+
+
+def test_submit(queue, mock_engine):
+    _, conn = mock_engine
+    conn.execute.return_value.mappings.return_value.first.return_value = job_row()
+
+    job = queue.submit(datetime(2024, 11, 1))
+
+    assert job.id == 1 and job.status == "queued"
+    sql, params = str(conn.execute.call_args[0][0]), conn.execute.call_args[0][1]
+    assert sql.startswith("INSERT INTO indexing_jobs (status, start_date)")
+    assert params == {"status": "queued", "start_date": datetime(2024, 11, 1)}
+
+def test_tables_created_once(queue, mock_engine):
+    _, conn = mock_engine
+    conn.execute.return_value.mappings.return_value.first.return_value = None
+
+    queue.get(1)
+    queue.get(2)
+
+    # jobs table, document_id column, two indexes and logs table, then one select per lookup
+    assert conn.execute.call_count == 7
+
+def test_submit_document_coalesces_queued_jobs(queue, mock_engine):
+    _, conn = mock_engine
+    conn.execute.return_value.mappings.return_value.first.return_value = job_row(document_id="doc-1")
+
+    job = queue.submit_document("doc-1")
+
+    assert job.document_id == "doc-1"
+    sql, params = str(conn.execute.call_args[0][0]), conn.execute.call_args[0][1]
+    assert "ON CONFLICT (document_id) WHERE status = 'queued' AND document_id IS NOT NULL" in sql
+    assert params == {"status": "queued", "document_id": "doc-1"}
+
+def test_claim_skips_locked_jobs(queue, mock_engine):
+    _, conn = mock_engine
+    conn.execute.return_value.mappings.return_value.first.return_value = job_row(status="running", worker_id="w1")
+
+    job = queue.claim("w1")
+
+    assert job.worker_id == "w1"
+    sql, params = str(conn.execute.call_args[0][0]), conn.execute.call_args[0][1]
+    assert "FOR UPDATE SKIP LOCKED" in sql
+    assert "ORDER BY document_id IS NULL, created_at" in sql
+    assert "heartbeat_at < NOW() - make_interval(secs => :stale_after)" in sql
+    assert params == {"running": "running", "queued": "queued", "worker_id": "w1", "stale_after": 1800}
+
+def test_claim_empty_queue(queue, mock_engine):
+    _, conn = mock_engine
+    conn.execute.return_value.mappings.return_value.first.return_value = None
+
+    assert queue.claim("w1") is None
+
+def test_update_progress(queue, mock_engine):
+    _, conn = mock_engine
+
+    queue.update_progress(1, {"indexed": 2, "unchanged": 5, "failed": 1, "cancelled": 0}, total=10)
+
+    assert conn.execute.call_args[0][1] == {"id": 1, "total": 10, "done": 8, "indexed": 2, "unchanged": 5, "failed": 1}
+
+def test_heartbeat(queue, mock_engine):
+    _, conn = mock_engine
+
+    queue.heartbeat(1)
+
+    assert "SET heartbeat_at = NOW()" in str(conn.execute.call_args[0][0])
+    assert conn.execute.call_args[0][1] == {"id": 1, "running": "running"}
+
+def test_finish_rejects_unfinished_status(queue):
+    with pytest.raises(ValueError, match="Unsupported final job status: running"):
+        queue.finish(1, "running")
+
+def test_cancel(queue, mock_engine):
+    _, conn = mock_engine
+    conn.execute.return_value.mappings.return_value.first.return_value = job_row(status="cancelled", cancel_requested=True)
+
+    job = queue.cancel(1)
+
+    assert job.status == "cancelled"
+    assert "cancel_requested = TRUE" in str(conn.execute.call_args[0][0])
+
+def test_is_cancel_requested(queue, mock_engine):
+    _, conn = mock_engine
+    conn.execute.return_value.scalar.return_value = True
+
+    assert queue.is_cancel_requested(1) is True
+
+def test_logs(queue, mock_engine):
+    _, conn = mock_engine
+    conn.execute.return_value.mappings.return_value.all.return_value = [
+        {"created_at": datetime(2024, 12, 1), "level": "INFO", "message": "started by w1"}
+    ]
+
+    queue.log(1, "started by w1")
+    logs = queue.logs(1)
+
+    assert [log.message for log in logs] == ["started by w1"]
+
+def test_job_timings():
+    job = IndexingJob(**job_row(
+        started_at=datetime(2024, 12, 1, 10, 0, 30),
+        finished_at=datetime(2024, 12, 1, 10, 2, 30),
+    ))
+
+    assert job.queued_seconds == 30
+    assert job.run_seconds == 120
+    assert job.model_dump()["run_seconds"] == 120
+    assert IndexingJob(**job_row()).queued_seconds is None
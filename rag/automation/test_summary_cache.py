@@ -0,0 +1,59 @@
+from unittest.mock import MagicMock
+
+import pandas as pd
+import pytest
+
+from rag.automation.summary_cache import PostgresTableSummaryCache
+from rag.parsing.processor import TableInfo, table_fingerprint
+
+
+@pytest.fixture
+def mock_engine():
+    engine = MagicMock()
+    conn = engine.begin.return_value.__enter__.return_value
+    return engine, conn
+
+@pytest.fixture
+def cache(mock_engine):
+    return PostgresTableSummaryCache(mock_engine[0])
+
+
+def test_get_hit(cache, mock_engine):
+    _, conn = mock_engine
+    conn.execute.return_value.mappings.return_value.first.return_value = {
+        "table_name": "sales_2024", "table_summary": "Monthly sales per region."
+    }
+
+    assert cache.get("abc") == TableInfo(table_name="sales_2024", table_summary="Monthly sales per region.")
+    assert conn.execute.call_args[0][1] == {"fingerprint": "abc"}
+
+def test_get_miss(cache, mock_engine):
+    _, conn = mock_engine
+    conn.execute.return_value.mappings.return_value.first.return_value = None
+
+    assert cache.get("abc") is None
+
+def test_put_and_table_created_once(cache, mock_engine):
+    _, conn = mock_engine
+
+    cache.put("abc", TableInfo(table_name="sales_2024", table_summary="Monthly sales per region."))
+    cache.put("def", TableInfo(table_name="stock", table_summary="Stock levels."))
+
+    # the table is created once, then one upsert per put
+    assert conn.execute.call_count == 3
+    sql, params = str(conn.execute.call_args[0][0]), conn.execute.call_args[0][1]
+    assert "ON CONFLICT (fingerprint) DO UPDATE" in sql
+    assert params == {"fingerprint": "def", "table_name": "stock", "table_summary": "Stock levels."}
+
+def test_table_fingerprint():
+    df = pd.DataFrame({"region": ["north", "south"], "units": [10, 20]})
+    fingerprint = table_fingerprint(df, "gpt-4o-mini", "prompt")
+
+    assert fingerprint == table_fingerprint(df.copy(), "gpt-4o-mini", "prompt")
+    assert fingerprint != table_fingerprint(df, "gpt-4o", "prompt")
+    assert fingerprint != table_fingerprint(df, "gpt-4o-mini", "other prompt")
+    assert fingerprint != table_fingerprint(df.rename(columns={"units": "qty"}), "gpt-4o-mini", "prompt")
+    assert fingerprint != table_fingerprint(df.astype({"units": float}), "gpt-4o-mini", "prompt")
+    # rows past the sampled head do not matter
+    longer = pd.DataFrame({"region": ["north", "south"] * 10, "units": [10, 20] * 10})
+    assert table_fingerprint(longer, "m", "p") == table_fingerprint(pd.concat([longer, longer]), "m", "p")
@@ -0,0 +1,139 @@
+import threading
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+
+from rag.automation.document_automation import DocumentIndexing
+from rag.automation.job_queue import IndexingJob, IndexingJobQueue
+from rag.automation.worker import IndexingWorker
+
+
+@pytest.fixture
+def mock_queue():
+    queue = MagicMock(spec=IndexingJobQueue)
+    queue.claim.return_value = IndexingJob(id=7, status="running", created_at=datetime(2024, 12, 1))
+    queue.is_cancel_requested.return_value = False
+    return queue
+
+@pytest.fixture
+def mock_indexing():
+    indexing = MagicMock(spec=DocumentIndexing)
+    indexing.process_documents.return_value = {"indexed": 2, "unchanged": 1, "failed": 0, "cancelled": 0}
+    return indexing
+
+@pytest.fixture
+def worker(mock_queue, mock_indexing):
+    return IndexingWorker(mock_queue, mock_indexing, worker_id="worker-1", progress_interval=0)
+
+
+def test_run_once_without_jobs(worker, mock_queue, mock_indexing):
+    mock_queue.claim.return_value = None
+
+    assert worker.run_once() is False
+    mock_indexing.process_documents.assert_not_called()
+
+def test_run_once_succeeds(worker, mock_queue, mock_indexing):
+    assert worker.run_once() is True
+
+    mock_queue.claim.assert_called_once_with("worker-1")
+    mock_queue.update_progress.assert_called_with(7, {"indexed": 2, "unchanged": 1, "failed": 0, "cancelled": 0}, 3)
+    mock_queue.finish.assert_called_once_with(7, "succeeded")
+
+def test_run_once_document_job(worker, mock_queue, mock_indexing):
+    mock_queue.claim.return_value = IndexingJob(id=8, status="running", document_id="doc-1", created_at=datetime(2024, 12, 1))
+
+    worker.run_once()
+
+    assert mock_indexing.process_documents.call_args.kwargs["document_ids"] == ["doc-1"]
+    mock_queue.finish.assert_called_once_with(8, "succeeded")
+
+def test_run_once_reports_progress_and_failures(worker, mock_queue, mock_indexing):
+    document = MagicMock(id="doc-1", title="Broken PDF")
+
+    def process_documents(start_date, on_progress, should_cancel, document_ids):
+        assert should_cancel() is False
+        on_progress(document, "failed", {"indexed": 0, "unchanged": 0, "failed": 1, "cancelled": 0}, 4)
+        return {"indexed": 3, "unchanged": 0, "failed": 1, "cancelled": 0}
+    mock_indexing.process_documents.side_effect = process_documents
+
+    worker.run_once()
+
+    mock_queue.log.assert_any_call(7, "document doc-1 (Broken PDF) failed", level="ERROR")
+    mock_queue.update_progress.assert_any_call(7, {"indexed": 0, "unchanged": 0, "failed": 1, "cancelled": 0}, 4)
+    mock_queue.is_cancel_requested.assert_called_once_with(7)
+    mock_queue.finish.assert_called_once_with(7, "succeeded")
+
+def test_run_once_cancelled(worker, mock_queue, mock_indexing):
+    mock_indexing.process_documents.return_value = {"indexed": 1, "unchanged": 0, "failed": 0, "cancelled": 4}
+
+    worker.run_once()
+
+    mock_queue.finish.assert_called_once_with(7, "cancelled")
+
+def test_run_once_failed(worker, mock_queue, mock_indexing):
+    mock_indexing.process_documents.side_effect = RuntimeError("database unavailable")
+
+    worker.run_once()
+
+    mock_queue.finish.assert_called_once_with(7, "failed", error="database unavailable")
+    mock_queue.log.assert_any_call(7, "failed: database unavailable", level="ERROR")
+
+def test_run_once_heartbeats_while_job_runs(mock_queue, mock_indexing):
+    worker = IndexingWorker(mock_queue, mock_indexing, worker_id="worker-1", heartbeat_interval=0.01)
+    beats = threading.Semaphore(0)
+    mock_queue.heartbeat.side_effect = lambda job_id: beats.release()
+
+    def process_documents(*args, **kwargs):
+        # a single slow document reports no progress, but the job keeps beating
+        for _ in range(3):
+            assert beats.acquire(timeout=5)
+        return {"indexed": 1, "unchanged": 0, "failed": 0, "cancelled": 0}
+    mock_indexing.process_documents.side_effect = process_documents
+
+    worker.run_once()
+
+    mock_queue.finish.assert_called_once_with(7, "succeeded")
+    mock_queue.heartbeat.assert_called_with(7)
+    beats_after_finish = mock_queue.heartbeat.call_count
+    threading.Event().wait(0.05)
+    assert mock_queue.heartbeat.call_count == beats_after_finish
+    assert not any(thread.name == "indexing-heartbeat-7" for thread in threading.enumerate())
+
+def test_heartbeat_survives_errors(mock_queue, mock_indexing):
+    worker = IndexingWorker(mock_queue, mock_indexing, worker_id="worker-1", heartbeat_interval=0.01)
+    beats = threading.Semaphore(0)
+
+    def heartbeat(job_id):
+        beats.release()
+        raise ConnectionError("connection reset")
+    mock_queue.heartbeat.side_effect = heartbeat
+
+    def process_documents(*args, **kwargs):
+        # a failed beat must not stop the ones after it
+        for _ in range(2):
+            assert beats.acquire(timeout=5)
+        return {"indexed": 1, "unchanged": 0, "failed": 0, "cancelled": 0}
+    mock_indexing.process_documents.side_effect = process_documents
+
+    worker.run_once()
+
+    assert mock_queue.heartbeat.call_count >= 2
+    mock_queue.finish.assert_called_once_with(7, "succeeded")
+
+def test_run_forever_survives_poll_errors(worker, mock_queue):
+    stop = threading.Event()
+    calls = []
+
+    def claim(worker_id):
+        calls.append(worker_id)
+        if len(calls) == 1:
+            raise ConnectionError("connection refused")
+        stop.set()
+        return None
+    mock_queue.claim.side_effect = claim
+    worker.poll_interval = 0
+
+    worker.run_forever(stop)
+
+    assert len(calls) == 2
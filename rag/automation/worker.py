@@ -0,0 +1,151 @@
+# python -m rag.automation.worker
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+
+from loguru import logger
+
+from document.document import Document
+from rag.automation.document_automation import DocumentIndexing
+from rag.automation.job_queue import (
+    JOB_CANCELLED,
+    JOB_FAILED,
+    JOB_SUCCEEDED,
+    IndexingJob,
+    IndexingJobQueue,
+)
+
+
+class IndexingWorker:
+    """Polls the indexing job queue and runs claimed jobs; start more workers to index more in parallel."""
+
+    def __init__(
+        self,
+        queue: IndexingJobQueue,
+        indexing: DocumentIndexing,
+        worker_id: Optional[str] = None,
+        poll_interval: float = 1.0,
+        progress_interval: float = 2.0,
+        heartbeat_interval: float = 30.0,
+    ):
+        """A job's heartbeat is touched every `heartbeat_interval` seconds while it runs, independently of
+        progress, so a slow document never makes it look abandoned; keep it well under the queue's
+        `stale_after_seconds`.
+        """
+        self.queue = queue
+        self.indexing = indexing
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.poll_interval = poll_interval
+        self.progress_interval = progress_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.logger = logger.bind(service="IndexingWorker", worker_id=self.worker_id)
+
+    def run_once(self) -> bool:
+        """Runs the next queued job, if any. Returns whether a job was run."""
+        job = self.queue.claim(self.worker_id)
+        if job is None:
+            return False
+        self._run_job(job)
+        return True
+
+    def run_forever(self, stop: Optional[threading.Event] = None):
+        stop = stop or threading.Event()
+        self.logger.info("indexing worker started")
+        while not stop.is_set():
+            try:
+                if self.run_once():
+                    continue
+            except Exception as e:
+                # a broken database connection must not kill the worker
+                self.logger.bind(err=str(e)).error("failed to poll indexing jobs")
+            stop.wait(self.poll_interval)
+
+    def _heartbeat(self, job_id: int, stop: threading.Event):
+        while not stop.wait(self.heartbeat_interval):
+            try:
+                self.queue.heartbeat(job_id)
+            except Exception as e:
+                # a missed beat only matters if the next ones fail too; keep the job running
+                self.logger.bind(job_id=job_id, err=str(e)).warning("failed to record job heartbeat")
+
+    def _run_job(self, job: IndexingJob):
+        stop_heartbeat = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat, args=(job.id, stop_heartbeat), name=f"indexing-heartbeat-{job.id}", daemon=True
+        )
+        heartbeat.start()
+        try:
+            self._execute_job(job)
+        finally:
+            stop_heartbeat.set()
+            heartbeat.join()
+
+    def _execute_job(self, job: IndexingJob):
+        self.logger.bind(job_id=job.id, document_id=job.document_id).info("running indexing job")
+        self.queue.log(job.id, f"started by {self.worker_id}")
+        last_update = 0.0
+
+        def on_progress(document: Document, outcome: str, counts: Dict[str, int], total: int):
+            nonlocal last_update
+            if outcome == "failed":
+                self.queue.log(job.id, f"document {document.id} ({document.title}) failed", level="ERROR")
+            now = time.monotonic()
+            if now - last_update >= self.progress_interval:
+                self.queue.update_progress(job.id, counts, total)
+                last_update = now
+
+        start = time.perf_counter()
+        try:
+            counts = self.indexing.process_documents(
+                job.start_date,
+                on_progress=on_progress,
+                should_cancel=lambda: self.queue.is_cancel_requested(job.id),
+                document_ids=[job.document_id] if job.document_id is not None else None,
+            )
+        except Exception as e:
+            self.logger.bind(job_id=job.id, err=str(e)).error("indexing job failed")
+            self.queue.log(job.id, f"failed: {e}", level="ERROR")
+            self.queue.finish(job.id, JOB_FAILED, error=str(e))
+            return
+
+        total = sum(counts.values())
+        self.queue.update_progress(job.id, counts, total)
+        status = JOB_CANCELLED if counts.get("cancelled") else JOB_SUCCEEDED
+        summary = ", ".join(f"{outcome}={count}" for outcome, count in counts.items())
+        self.queue.log(job.id, f"{status} in {time.perf_counter() - start:.1f}s: {summary}")
+        self.queue.finish(job.id, status)
+        self.logger.bind(job_id=job.id, status=status, **counts).info("indexing job finished")
+
+
+def build_worker() -> IndexingWorker:  # pragma: no cover
+    from config import AppConfig, configure_logger
+    from db import config_db
+    from document.dto import AWSConfig
+    from document.repository import PostgresDocumentRepository
+    from document.service import DocumentServiceV1
+
+    config = AppConfig()
+    configure_logger(config.log_level)
+    aws_config = AWSConfig(
+        aws_access_key_id=config.aws_access_key_id,
+        aws_secret_access_key=config.aws_secret_access_key,
+        aws_public_bucket_name=config.aws_public_bucket_name,
+        aws_region=config.aws_region,
+        aws_endpoint_url=config.aws_endpoint_url,
+    )
+    document_service = DocumentServiceV1(aws_config, PostgresDocumentRepository(config_db(config.database_url)))
+    return IndexingWorker(IndexingJobQueue(), DocumentIndexing(aws_config, document_service))
+
+
+if __name__ == "__main__":  # pragma: no cover
+    from dotenv import load_dotenv
+
+    load_dotenv(override=True)
+    worker = build_worker()
+    try:
+        worker.run_forever()
+    finally:
+        worker.indexing.close()
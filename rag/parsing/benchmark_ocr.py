@@ -0,0 +1,59 @@
+# python -m rag.parsing.benchmark_ocr data/image-based-pdf-sample.pdf data/ppl_testing_pdf.pdf --dpi 200 --window 1
+import argparse
+import glob
+import multiprocessing
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict
+
+from rag.parsing.parsing_pdf import PDFProcessor
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure PDF text extraction + OCR throughput and peak memory.")
+    parser.add_argument("paths", nargs="*", help="PDFs to benchmark (default: data/*.pdf)")
+    parser.add_argument("--dpi", type=int, default=200)
+    parser.add_argument("--window", type=int, default=1, help="pages rasterized at a time")
+    parser.add_argument("--max-side", type=int, default=2000, help="downscale bitmaps to at most this many pixels per side (0: never)")
+    parser.add_argument("--color", action="store_true", help="rasterize in color instead of grayscale")
+    parser.add_argument("--force-ocr", action="store_true", help="OCR every page, even those with a text layer")
+    return parser.parse_args(argv)
+
+
+def run_benchmark(path: str, args) -> Dict[str, float]:
+    """Extracts one PDF and reports pages/sec and this process's peak RSS."""
+    processor = PDFProcessor(
+        path,
+        ocr_min_chars=10 ** 9 if args.force_ocr else 50,
+        ocr_dpi=args.dpi,
+        ocr_grayscale=not args.color,
+        ocr_max_side=args.max_side or None,
+        ocr_page_window=args.window,
+    )
+    start = time.perf_counter()
+    processor._load_document()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "pages": processor.stats["pages"],
+        "ocr_pages": processor.stats["ocr_pages"],
+        "seconds": round(elapsed, 3),
+        "pages_per_second": round(processor.stats["pages"] / elapsed, 2) if elapsed > 0 else 0.0,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    paths = args.paths or sorted(glob.glob("data/*.pdf"))
+    for path in paths:
+        # a fresh process per file, so peak RSS is not inherited from the previous document
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            result = executor.submit(run_benchmark, path, args).result()
+        print(f"{path}: " + ", ".join(f"{key}={value}" for key, value in result.items()))
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
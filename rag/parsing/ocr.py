@@ -0,0 +1,109 @@
+import os
+import resource
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+import easyocr
+from loguru import logger
+
+
+def current_rss_bytes() -> int:
+    """Resident memory of this process; falls back to the peak RSS where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class OCRReaderPool:
+    """Process-wide pool of loaded easyocr readers that PDF processors borrow instead of loading their own.
+
+    Readers are created on demand, up to `size`, and kept warm for the life of the process. A new reader is
+    only loaded while resident memory is below `max_memory_mb`; above it, callers wait for a loaded one.
+    """
+
+    def __init__(
+        self,
+        size: int = 1,
+        max_memory_mb: Optional[int] = None,
+        languages: Tuple[str, ...] = ("en",),
+        gpu: bool = False,
+    ):
+        if size < 1:
+            raise ValueError("OCR pool size must be at least 1.")
+        self.size = size
+        self.max_memory_mb = max_memory_mb
+        self.languages = list(languages)
+        self.gpu = gpu
+        self._idle: List[easyocr.Reader] = []
+        self._loaded = 0
+        self._loading = 0
+        self._available = threading.Condition()
+        self.stats = {"loads": 0, "borrows": 0, "waits": 0}
+        self.logger = logger.bind(service="OCRReaderPool")
+
+    def _may_load(self) -> bool:
+        """Whether another reader may be loaded. Caller must hold the condition's lock."""
+        if self._loaded + self._loading >= self.size:
+            return False
+        if self._loaded + self._loading == 0:
+            # the first reader is always allowed, or nothing could ever be OCR'd
+            return True
+        return self.max_memory_mb is None or current_rss_bytes() < self.max_memory_mb * 1024 * 1024
+
+    def _load(self) -> easyocr.Reader:
+        reader = easyocr.Reader(self.languages, gpu=self.gpu)
+        self.logger.bind(rss_mb=current_rss_bytes() // (1024 * 1024)).info("loaded OCR reader")
+        return reader
+
+    @contextmanager
+    def reader(self) -> Iterator[easyocr.Reader]:
+        """Borrows a reader for the duration of the block; easyocr readers are not shared between threads."""
+        with self._available:
+            self.stats["borrows"] += 1
+            while not self._idle and not self._may_load():
+                self.stats["waits"] += 1
+                self._available.wait()
+            borrowed = self._idle.pop() if self._idle else None
+            if borrowed is None:
+                self._loading += 1
+
+        if borrowed is None:
+            try:
+                borrowed = self._load()
+            except BaseException:
+                with self._available:
+                    self._loading -= 1
+                    self._available.notify()
+                raise
+            with self._available:
+                self._loading -= 1
+                self._loaded += 1
+                self.stats["loads"] += 1
+
+        try:
+            yield borrowed
+        finally:
+            with self._available:
+                self._idle.append(borrowed)
+                self._available.notify()
+
+
+_default_pool: Optional[OCRReaderPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def get_ocr_pool() -> OCRReaderPool:
+    """Returns the process's shared pool, sized by OCR_POOL_SIZE and capped by OCR_MAX_MEMORY_MB."""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            max_memory_mb = os.getenv("OCR_MAX_MEMORY_MB")
+            _default_pool = OCRReaderPool(
+                size=int(os.getenv("OCR_POOL_SIZE") or 1),
+                max_memory_mb=int(max_memory_mb) if max_memory_mb else None,
+            )
+        return _default_pool
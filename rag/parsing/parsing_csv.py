@@ -1,17 +1,24 @@
 from pathlib import Path
+from typing import Optional
 
 import pandas as pd
 from llama_index.core.llms import ChatMessage
 from llama_index.core.prompts import ChatPromptTemplate
 from llama_index.llms.openai import OpenAI
 
-from rag.parsing.processor import FileProcessor, TableInfo
+from rag.parsing.processor import SUMMARY_HEAD_ROWS, FileProcessor, TableInfo, TableSummaryCache, table_fingerprint
 
 
 class CSVProcessor(FileProcessor):
     
-    def __init__(self, document_path):
+    def __init__(
+        self, document_path, sample_rows: Optional[int] = None, summary_cache: Optional[TableSummaryCache] = None
+    ):
+        """With `sample_rows`, only the first rows are read; enough for the summary, without loading a large file.
+        Summaries found in `summary_cache` are reused instead of asking the LLM again."""
         self.document_path = Path(document_path)
+        self.sample_rows = sample_rows
+        self.summary_cache = summary_cache
         self.llm = OpenAI(model="gpt-4o-mini")
         self.df = None  # Initialize dataframe attribute
 
@@ -35,7 +42,7 @@ class CSVProcessor(FileProcessor):
     def _load_document(self):
         """Loads the CSV document into a pandas DataFrame."""
         try:
-            self.df = pd.read_csv(self.document_path)
+            self.df = pd.read_csv(self.document_path, nrows=self.sample_rows)
             return self.df
         except Exception as e:
             raise RuntimeError(f"Failed to load document: {str(e)}")
@@ -45,13 +52,23 @@ class CSVProcessor(FileProcessor):
         if self.df is None:
             raise RuntimeError("DataFrame is not loaded.")
         
-        df_str = self.df.head(10).to_csv()
+        prompt = self._get_prompt_template()
+        fingerprint = None
+        if self.summary_cache is not None:
+            fingerprint = table_fingerprint(self.df, self.llm.model, prompt.message_templates[0].content)
+            table_info = self.summary_cache.get(fingerprint)
+            if table_info is not None:
+                return table_info
+
+        df_str = self.df.head(SUMMARY_HEAD_ROWS).to_csv()
         table_info = self.llm.structured_predict(
             TableInfo, 
-            prompt=self._get_prompt_template(),
+            prompt=prompt,
             table_str=df_str
         )
-        
+
+        if fingerprint is not None:
+            self.summary_cache.put(fingerprint, table_info)
         return table_info
 
     def process(self):
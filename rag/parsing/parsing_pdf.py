@@ -1,55 +1,203 @@
+import math
+import re
+from itertools import groupby
 from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
 
-import easyocr
 import numpy as np
 from llama_index.core import Document
 from llama_index.core.node_parser import SentenceSplitter
 from llama_index.readers.file.docs.base import PDFReader
-from pdf2image import convert_from_path
+from loguru import logger
+from pdf2image import convert_from_path, pdfinfo_from_path
+from PIL import Image
 
+from rag.parsing.ocr import OCRReaderPool, get_ocr_pool
 from rag.parsing.processor import FileProcessor
 
+# pdfinfo reports each page of a -f/-l range as "Page    3 size: 595.28 x 841.89 pts (A4)"
+PAGE_SIZE_KEY = re.compile(r"Page\s+(\d+) size")
+PAGE_SIZE_VALUE = re.compile(r"([\d.]+) x ([\d.]+) pts")
+POINTS_PER_INCH = 72
+
 
 class PDFProcessor(FileProcessor):
-    
-    def __init__(self, document_path: str, chunk_size: int = 200, chunk_overlap: int = 0):
+
+    def __init__(
+        self,
+        document_path: str,
+        chunk_size: int = 200,
+        chunk_overlap: int = 0,
+        ocr_min_chars: int = 50,
+        ocr_pool: Optional[OCRReaderPool] = None,
+        ocr_dpi: int = 200,
+        ocr_grayscale: bool = True,
+        ocr_max_side: Optional[int] = 2000,
+        ocr_page_window: int = 1,
+        ocr_max_page_bytes: Optional[int] = 64 * 1024 * 1024,
+        ocr_min_dpi: int = 100,
+    ):
+        """Pages whose text layer has fewer than `ocr_min_chars` non-whitespace characters are OCR'd with a
+        reader borrowed from `ocr_pool` (the process-wide pool by default); every other page is taken
+        from the text layer as is.
+
+        Pages are rasterized `ocr_page_window` at a time at `ocr_dpi`, optionally in grayscale, and downscaled
+        so neither side exceeds `ocr_max_side` pixels. At most one window of bitmaps is alive at a time, so
+        OCR memory is bounded by the window size rather than the page count.
+
+        A page whose bitmap would exceed `ocr_max_page_bytes` at `ocr_dpi` (posters, engineering drawings) is
+        rendered at the highest DPI that fits, or not OCR'd at all when that falls below `ocr_min_dpi`.
+        """
+        if ocr_page_window < 1:
+            raise ValueError("ocr_page_window must be at least 1.")
         self.document_path = Path(document_path)
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
-        self.pdf_reader = PDFReader(return_full_document=True)
+        self.ocr_min_chars = ocr_min_chars
+        self.pdf_reader = PDFReader(return_full_document=False)
         self.splitting_parser = SentenceSplitter(chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap)
-        self.ocr_reader = easyocr.Reader(['en'], gpu=False)
+        self.ocr_pool = ocr_pool if ocr_pool is not None else get_ocr_pool()
+        self.ocr_dpi = ocr_dpi
+        self.ocr_grayscale = ocr_grayscale
+        self.ocr_max_side = ocr_max_side
+        self.ocr_page_window = ocr_page_window
+        self.ocr_max_page_bytes = ocr_max_page_bytes
+        self.ocr_min_dpi = ocr_min_dpi
+        self.stats = {"pages": 0, "ocr_pages": 0, "ocr_skipped_pages": 0, "ocr_oversized_pages": 0}
+        self.logger = logger.bind(service="PDFProcessor")
+
+    def _needs_ocr(self, text: str) -> bool:
+        return len("".join(text.split())) < self.ocr_min_chars
+
+    def _page_windows(self, page_numbers: List[int]) -> List[List[int]]:
+        """Groups runs of consecutive pages into windows of at most `ocr_page_window` pages."""
+        windows: List[List[int]] = []
+        for page_number in page_numbers:
+            if windows and page_number == windows[-1][-1] + 1 and len(windows[-1]) < self.ocr_page_window:
+                windows[-1].append(page_number)
+            else:
+                windows.append([page_number])
+        return windows
+
+    def _page_sizes(self, page_numbers: List[int]) -> Dict[int, Tuple[float, float]]:
+        """Returns the (width, height) in points of the given pages that pdfinfo reports a size for."""
+        info = pdfinfo_from_path(self.document_path, first_page=min(page_numbers), last_page=max(page_numbers))
+        sizes = {}
+        for key, value in info.items():
+            page = PAGE_SIZE_KEY.fullmatch(key)
+            size = PAGE_SIZE_VALUE.match(value) if page else None
+            if size:
+                sizes[int(page.group(1))] = (float(size.group(1)), float(size.group(2)))
+        return sizes
+
+    def _render_dpis(self, page_numbers: List[int]) -> Dict[int, Optional[int]]:
+        """Picks the DPI each page is rendered at so its bitmap fits `ocr_max_page_bytes`; None skips the page."""
+        if not self.ocr_max_page_bytes:
+            return {page_number: self.ocr_dpi for page_number in page_numbers}
+
+        sizes = self._page_sizes(page_numbers)
+        bytes_per_pixel = 1 if self.ocr_grayscale else 3
+        dpis = {}
+        for page_number in page_numbers:
+            width, height = sizes.get(page_number, (0, 0))
+            if width <= 0 or height <= 0:
+                dpis[page_number] = self.ocr_dpi
+                continue
+            # the bitmap is rendered in full before it is downscaled to ocr_max_side
+            bytes_per_square_dpi = (width / POINTS_PER_INCH) * (height / POINTS_PER_INCH) * bytes_per_pixel
+            fitting_dpi = int(math.sqrt(self.ocr_max_page_bytes / bytes_per_square_dpi))
+            if fitting_dpi >= self.ocr_dpi:
+                dpis[page_number] = self.ocr_dpi
+                continue
 
-    def _extract_text_with_ocr(self):
-        text_data = []
+            log = self.logger.bind(document=self.document_path.name, page=page_number, width_pts=width, height_pts=height)
+            if fitting_dpi >= self.ocr_min_dpi:
+                log.bind(dpi=fitting_dpi).warning("page too large to rasterize at ocr_dpi, lowering dpi")
+                dpis[page_number] = fitting_dpi
+            else:
+                log.warning("page too large to rasterize, skipping ocr")
+                self.stats["ocr_oversized_pages"] += 1
+                dpis[page_number] = None
+        return dpis
+
+    def _rasterize(self, page_numbers: List[int]) -> Iterator[Tuple[int, Image.Image]]:
+        """Yields (page number, image) pairs, rendering one page window at a time.
+
+        Pages too large to render within `ocr_max_page_bytes` even at `ocr_min_dpi` are left out.
+        """
+        if not page_numbers:
+            return
+        dpis = self._render_dpis(page_numbers)
+        renderable = [page_number for page_number in page_numbers if dpis[page_number] is not None]
+        for window in self._page_windows(renderable):
+            # a page rendered at a lowered DPI splits its window into runs of equal DPI
+            for dpi, run in groupby(window, key=dpis.get):
+                run = list(run)
+                images = convert_from_path(
+                    self.document_path,
+                    dpi=dpi,
+                    first_page=run[0],
+                    last_page=run[-1],
+                    grayscale=self.ocr_grayscale,
+                )
+                for page_number, page_image in zip(run, images):
+                    if self.ocr_max_side and max(page_image.size) > self.ocr_max_side:
+                        page_image.thumbnail((self.ocr_max_side, self.ocr_max_side))
+                    yield page_number, page_image
+                # drop these bitmaps before the next ones are rendered
+                del images
+
+    def _extract_text_with_ocr(self, page_numbers: Optional[List[int]] = None) -> Dict[int, str]:
+        """OCRs the given 1-based pages, or every page when None, and returns their text by page number."""
         try:
-            pages = convert_from_path(self.document_path)
-            for page_number, page_image in enumerate(pages):
-                page_image_array = np.array(page_image)
-                text = self.ocr_reader.readtext(page_image_array, detail=0)
-                text_data.append(f"Page {page_number + 1} OCR Text:\n{text}")
-            return "\n".join(text_data)
+            if page_numbers is None:
+                page_numbers = list(range(1, int(pdfinfo_from_path(self.document_path)["Pages"]) + 1))
+            with self.ocr_pool.reader() as ocr_reader:
+                return {
+                    page_number: "\n".join(ocr_reader.readtext(np.array(page_image), detail=0))
+                    for page_number, page_image in self._rasterize(page_numbers)
+                }
         except Exception as e:
             raise RuntimeError(f"Failed to perform OCR on document: {str(e)}")
 
-    
+    @staticmethod
+    def _merge_page_text(text_layer: str, ocr_text: str) -> str:
+        """Returns the OCR text plus the text-layer lines OCR did not already recover."""
+        seen = {" ".join(line.split()).casefold() for line in ocr_text.splitlines()}
+        extra = [
+            line for line in text_layer.splitlines()
+            if line.strip() and " ".join(line.split()).casefold() not in seen
+        ]
+        return "\n".join([ocr_text, *extra]).strip()
+
     def _load_document(self):
-        full_text = []
         try:
-            documents = self.pdf_reader.load_data(file=self.document_path)
-            if documents and isinstance(documents, list) and 'text' in documents[0]:
-                extracted_text = documents[0]['text']
-                full_text.append(f"Extracted Text:\n{extracted_text}")
+            page_texts = [page.text for page in self.pdf_reader.load_data(file=self.document_path)]
         except Exception as e:
             raise RuntimeError(f"Failed to load document: {str(e)}")
-        
+
+        # without a text layer the page count is unknown, so every page is OCR'd
+        ocr_pages = [n for n, text in enumerate(page_texts, start=1) if self._needs_ocr(text)] if page_texts else None
         try:
-            ocr_text = self._extract_text_with_ocr()
-            full_text.append(f"OCR Text:\n{ocr_text}")
+            ocr_texts = self._extract_text_with_ocr(ocr_pages) if ocr_pages is None or ocr_pages else {}
         except Exception as e:
             raise RuntimeError(f"Failed to load document: {str(e)}")
-        
-        combined_text = "\n\n".join(full_text)
+
+        if not page_texts:
+            page_texts = [""] * len(ocr_texts)
+        pages = [
+            self._merge_page_text(text, ocr_texts[page_number]) if page_number in ocr_texts else text
+            for page_number, text in enumerate(page_texts, start=1)
+        ]
+
+        self.stats["pages"] += len(pages)
+        self.stats["ocr_pages"] += len(ocr_texts)
+        self.stats["ocr_skipped_pages"] += len(pages) - len(ocr_texts)
+        self.logger.bind(
+            document=self.document_path.name, pages=len(pages), ocr_pages=len(ocr_texts)
+        ).info("extracted pdf text")
+
+        combined_text = "\n\n".join(page for page in pages if page.strip())
         return [Document(text=combined_text, id_=self.document_path.name)]
 
     def get_nodes(self, documents):
@@ -60,4 +208,4 @@ class PDFProcessor(FileProcessor):
 
     def process(self):
         documents = self._load_document()
-        return self.get_nodes(documents)
\ No newline at end of file
+        return self.get_nodes(documents)
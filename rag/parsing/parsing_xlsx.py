@@ -1,17 +1,91 @@
+from datetime import date, datetime, time
 from pathlib import Path
+from typing import Iterator, List, Optional
 
 import pandas as pd
 from llama_index.core.llms import ChatMessage
 from llama_index.core.prompts import ChatPromptTemplate
 from llama_index.llms.openai import OpenAI
+from openpyxl import load_workbook
 
-from rag.parsing.processor import FileProcessor, TableInfo
+from rag.parsing.processor import SUMMARY_HEAD_ROWS, FileProcessor, TableInfo, TableSummaryCache, table_fingerprint
+
+
+def sheet_names(document_path) -> List[str]:
+    """Names of the workbook's worksheets; chart sheets have no rows and are left out."""
+    workbook = load_workbook(document_path, read_only=True)
+    try:
+        return [worksheet.title for worksheet in workbook.worksheets]
+    finally:
+        workbook.close()
+
+
+def _cell_text(value) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat(sep=" ") if isinstance(value, datetime) else value.isoformat()
+    return str(value)
+
+
+def _column_names(header) -> List[str]:
+    """Header cells as column names, named and de-duplicated the way pandas does."""
+    names: List[str] = []
+    for position, value in enumerate(header):
+        name = _cell_text(value) or f"Unnamed: {position}"
+        candidate, suffix = name, 1
+        while candidate in names:
+            candidate, suffix = f"{name}.{suffix}", suffix + 1
+        names.append(candidate)
+    return names
+
+
+def read_sheet_chunks(document_path, sheet_name: str, chunk_rows: int = 50_000) -> Iterator[pd.DataFrame]:
+    """Streams a sheet as DataFrames of at most `chunk_rows` rows of strings, with the first row as header.
+
+    The workbook is opened read-only, so rows are parsed from the file as they are iterated instead of the
+    whole workbook being loaded; blank rows are skipped.
+    """
+    workbook = load_workbook(document_path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet_name]
+        # the stored dimensions can be stale, and read-only sheets trust them
+        worksheet.reset_dimensions()
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = _column_names(header)
+
+        batch = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            values = [_cell_text(value) for value in row[:len(columns)]]
+            batch.append(values + [None] * (len(columns) - len(values)))
+            if len(batch) == chunk_rows:
+                yield pd.DataFrame(batch, columns=columns, dtype=object)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns, dtype=object)
+    finally:
+        workbook.close()
 
 
 class XLSXProcessor(FileProcessor):
-    def __init__(self, document_path, sheet_name=None):
+    def __init__(
+        self,
+        document_path,
+        sheet_name=None,
+        sample_rows: Optional[int] = None,
+        summary_cache: Optional[TableSummaryCache] = None,
+    ):
+        """With `sample_rows`, only the first rows are read; enough for the summary, without loading a large sheet.
+        Summaries found in `summary_cache` are reused instead of asking the LLM again."""
         self.document_path = Path(document_path)
         self.sheet_name = sheet_name  # Specify which sheet to process
+        self.sample_rows = sample_rows
+        self.summary_cache = summary_cache
         self.llm = OpenAI(model="gpt-4o-mini")
         self.df = None  # Initialize dataframe attribute
 
@@ -36,7 +110,7 @@ class XLSXProcessor(FileProcessor):
     def _load_document(self):
         """Loads the XLSX document into a pandas DataFrame."""
         try:
-            self.df = pd.read_excel(self.document_path, sheet_name=self.sheet_name)
+            self.df = pd.read_excel(self.document_path, sheet_name=self.sheet_name, nrows=self.sample_rows)
             return self.df
         except FileNotFoundError:
             raise RuntimeError(f"File not found: {self.document_path}")
@@ -50,15 +124,33 @@ class XLSXProcessor(FileProcessor):
         if self.df is None:
             raise RuntimeError("DataFrame is not loaded.")
         
-        df_str = self.df.head(10).to_csv()
+        prompt = self._get_prompt_template()
+        fingerprint = None
+        if self.summary_cache is not None:
+            fingerprint = table_fingerprint(self.df, self.llm.model, prompt.message_templates[0].content)
+            table_info = self.summary_cache.get(fingerprint)
+            if table_info is not None:
+                return table_info
+
+        df_str = self.df.head(SUMMARY_HEAD_ROWS).to_csv()
         table_info = self.llm.structured_predict(
             TableInfo, 
-            prompt=self._get_prompt_template(),
+            prompt=prompt,
             table_str=df_str
         )
-        
+
+        if fingerprint is not None:
+            self.summary_cache.put(fingerprint, table_info)
         return table_info
 
+    def load(self) -> pd.DataFrame:
+        """Loads the sheet, or its first `sample_rows` rows; an empty sheet comes back as an empty DataFrame."""
+        return self._load_document()
+
+    def summarize(self) -> TableInfo:
+        """Summarizes the loaded sheet, reusing the cached summary of an identical table when there is one."""
+        return self._get_table_info()
+
     def process(self):
         """Main processing method: loads the document and generates table info."""
         self.df = self._load_document()
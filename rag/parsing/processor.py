@@ -1,12 +1,40 @@
+import hashlib
+import json
 from abc import ABC, abstractmethod
+from typing import Optional
 
+import pandas as pd
 from llama_index.core.bridge.pydantic import BaseModel, Field
 
+# rows of the table shown to the LLM when summarizing it
+SUMMARY_HEAD_ROWS = 10
+
 
 class TableInfo(BaseModel):
     table_name: str = Field(..., description="Unique table name (must use underscores and NO spaces)")
     table_summary: str = Field(..., description="Short, concise summary/caption of the table")
 
+
+def table_fingerprint(df: pd.DataFrame, model: str, prompt: str) -> str:
+    """Identifies a table summary by everything that determines it: the model, the prompt, the column names
+    and types, and the head of the table the LLM is shown."""
+    schema = json.dumps([[str(column), str(dtype)] for column, dtype in df.dtypes.items()])
+    head = df.head(SUMMARY_HEAD_ROWS).to_csv()
+    return hashlib.sha256(f"{model}\0{prompt}\0{schema}\0{head}".encode()).hexdigest()
+
+
+class TableSummaryCache(ABC):
+    """Stores table summaries by fingerprint, so unchanged tables are not summarized by the LLM again."""
+
+    @abstractmethod
+    def get(self, fingerprint: str) -> Optional[TableInfo]:
+        pass
+
+    @abstractmethod
+    def put(self, fingerprint: str, table_info: TableInfo):
+        pass
+
+
 # Abstract base class
 class FileProcessor(ABC):
 
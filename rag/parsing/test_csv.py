@@ -1,10 +1,11 @@
 from pathlib import Path
+from unittest.mock import MagicMock
 
 import pandas as pd
 import pytest
 
 from rag.parsing.parsing_csv import CSVProcessor
-from rag.parsing.processor import TableInfo
+from rag.parsing.processor import TableInfo, TableSummaryCache
 
 
 @pytest.fixture
@@ -41,6 +42,13 @@ def test_load_document(mock_csv_data):
     assert 'col1' in df.columns
     assert 'col2' in df.columns
 
+def test_load_document_sample_rows(mocker):
+    """Test _load_document only reads the first sample_rows rows when asked to."""
+    mock_read_csv = mocker.patch('pandas.read_csv', return_value=pd.DataFrame({'col1': [1]}))
+    processor = CSVProcessor("dummy_path", sample_rows=100)
+    processor._load_document()
+    mock_read_csv.assert_called_once_with(Path("dummy_path"), nrows=100)
+
 def test_load_document_failure(mocker):
     """Test load_document raises an exception when loading fails."""
     mocker.patch('pandas.read_csv', side_effect=Exception("CSV loading error"))
@@ -80,3 +88,29 @@ def test_get_table_info_no_df():
     processor.df = None  # Ensure that df is not loaded
     with pytest.raises(RuntimeError, match="DataFrame is not loaded."):
         processor._get_table_info()
+
+def test_get_table_info_cache_hit(mock_openai_llm):
+    """Test _get_table_info returns a cached summary without calling the LLM."""
+    summary_cache = MagicMock(spec=TableSummaryCache)
+    summary_cache.get.return_value = TableInfo(table_name="cached_table", table_summary="Cached summary.")
+    processor = CSVProcessor("dummy_path", summary_cache=summary_cache)
+    processor.df = pd.DataFrame({'col1': [1, 2], 'col2': [3, 4]})
+
+    table_info = processor._get_table_info()
+
+    assert table_info.table_name == "cached_table"
+    mock_openai_llm.structured_predict.assert_not_called()
+    summary_cache.put.assert_not_called()
+
+def test_get_table_info_cache_miss(mock_openai_llm):
+    """Test _get_table_info stores a fresh summary under the fingerprint it looked up."""
+    summary_cache = MagicMock(spec=TableSummaryCache)
+    summary_cache.get.return_value = None
+    processor = CSVProcessor("dummy_path", summary_cache=summary_cache)
+    processor.df = pd.DataFrame({'col1': [1, 2], 'col2': [3, 4]})
+
+    table_info = processor._get_table_info()
+
+    mock_openai_llm.structured_predict.assert_called_once()
+    fingerprint = summary_cache.get.call_args.args[0]
+    summary_cache.put.assert_called_once_with(fingerprint, table_info)
@@ -0,0 +1,86 @@
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+import rag.parsing.ocr as ocr
+from rag.parsing.ocr import OCRReaderPool, current_rss_bytes, get_ocr_pool
+
+
+@pytest.fixture
+def mock_reader_class(mocker):
+    return mocker.patch("rag.parsing.ocr.easyocr.Reader", side_effect=lambda *args, **kwargs: MagicMock())
+
+
+def test_pool_reuses_loaded_reader(mock_reader_class):
+    pool = OCRReaderPool(size=2)
+
+    with pool.reader() as first:
+        pass
+    with pool.reader() as second:
+        pass
+
+    assert first is second
+    mock_reader_class.assert_called_once_with(["en"], gpu=False)
+    assert pool.stats == {"loads": 1, "borrows": 2, "waits": 0}
+
+def test_pool_grows_up_to_size_for_concurrent_borrowers(mock_reader_class):
+    pool = OCRReaderPool(size=2)
+
+    with pool.reader() as first, pool.reader() as second:
+        assert first is not second
+
+    assert mock_reader_class.call_count == 2
+
+def test_pool_waits_when_full(mock_reader_class):
+    pool = OCRReaderPool(size=1)
+    borrowed = []
+
+    with pool.reader() as first:
+        waiter = threading.Thread(target=lambda: borrowed.append(pool.reader().__enter__()))
+        waiter.start()
+        waiter.join(timeout=0.2)
+        # the second borrower blocks until the only reader is returned
+        assert waiter.is_alive()
+    waiter.join(timeout=5)
+
+    assert borrowed == [first]
+    assert pool.stats["waits"] >= 1
+    mock_reader_class.assert_called_once()
+
+def test_pool_respects_memory_ceiling(mock_reader_class, mocker):
+    mocker.patch("rag.parsing.ocr.current_rss_bytes", return_value=2048 * 1024 * 1024)
+    pool = OCRReaderPool(size=4, max_memory_mb=1024)
+
+    with pool.reader():
+        # above the ceiling a second reader is not loaded, even though the pool is not full
+        assert not pool._may_load()
+
+    mock_reader_class.assert_called_once()
+
+def test_pool_recovers_from_failed_load(mocker):
+    mocker.patch("rag.parsing.ocr.easyocr.Reader", side_effect=[RuntimeError("download failed"), MagicMock()])
+    pool = OCRReaderPool(size=1)
+
+    with pytest.raises(RuntimeError, match="download failed"):
+        with pool.reader():
+            pass
+    with pool.reader() as reader:
+        assert reader is not None
+
+def test_invalid_pool_size():
+    with pytest.raises(ValueError, match="OCR pool size must be at least 1."):
+        OCRReaderPool(size=0)
+
+def test_get_ocr_pool_from_env(monkeypatch):
+    monkeypatch.setattr(ocr, "_default_pool", None)
+    monkeypatch.setenv("OCR_POOL_SIZE", "3")
+    monkeypatch.setenv("OCR_MAX_MEMORY_MB", "4096")
+
+    pool = get_ocr_pool()
+
+    assert (pool.size, pool.max_memory_mb) == (3, 4096)
+    assert get_ocr_pool() is pool
+
+def test_current_rss_bytes():
+    assert current_rss_bytes() > 0
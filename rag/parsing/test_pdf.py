@@ -1,17 +1,32 @@
 from pathlib import Path
+from unittest.mock import MagicMock
 
 import pytest
 from llama_index.core import Document
 
+from rag.parsing.ocr import OCRReaderPool
+from rag.parsing.benchmark_ocr import parse_args, run_benchmark
 from rag.parsing.parsing_pdf import PDFProcessor
 
 
+@pytest.fixture(autouse=True)
+def fresh_ocr_pool(mocker):
+    """Give every test its own OCR pool, so mocked readers do not leak between tests."""
+    pool = OCRReaderPool()
+    mocker.patch('rag.parsing.parsing_pdf.get_ocr_pool', return_value=pool)
+    return pool
+
+@pytest.fixture(autouse=True)
+def mock_pdfinfo(mocker):
+    """Mock pdfinfo; without page sizes every page is rendered at ocr_dpi."""
+    return mocker.patch('rag.parsing.parsing_pdf.pdfinfo_from_path', return_value={"Pages": 1})
+
 @pytest.fixture
 def mock_pdf_reader(mocker):
     """Mock the PDFReader."""
     mock_pdf_reader = mocker.patch('rag.parsing.parsing_pdf.PDFReader')
     instance = mock_pdf_reader.return_value
-    instance.load_data.return_value = ["Mocked Document Content"]
+    instance.load_data.return_value = [Document(text="Mocked Document Content")]
     return instance
 
 @pytest.fixture
@@ -33,7 +48,7 @@ def mock_sentence_splitter(mocker):
 @pytest.fixture
 def mock_ocr_reader(mocker):
     """Mock the OCR reader."""
-    mock_ocr_reader = mocker.patch('rag.parsing.parsing_pdf.easyocr.Reader')
+    mock_ocr_reader = mocker.patch('rag.parsing.ocr.easyocr.Reader')
     instance = mock_ocr_reader.return_value
     instance.readtext.return_value = ["Mocked OCR Text"]
     return instance
@@ -42,7 +57,7 @@ def mock_ocr_reader(mocker):
 def mock_pdf_to_image(mocker):
     """Mock the pdf2image convert_from_path."""
     mock_convert_from_path = mocker.patch('rag.parsing.parsing_pdf.convert_from_path')
-    mock_convert_from_path.return_value = ["Mocked Image"]
+    mock_convert_from_path.return_value = [MagicMock(size=(1700, 2200))]
     return mock_convert_from_path
 
 @pytest.fixture
@@ -63,17 +78,48 @@ def test_pdf_processor_init(mock_pdf_reader, mock_sentence_splitter):
     assert processor.splitting_parser == mock_sentence_splitter
 
 def test_load_document(mock_pdf_reader, mock_ocr_reader, mock_pdf_to_image, mock_numpy_array):
-    """Test the _load_document method."""
-    mock_pdf_reader.load_data.return_value = [{"text": "Mocked Document Content"}]
-    mock_ocr_reader.readtext.return_value = ["Mocked OCR Text"]
-    
+    """Test that only pages without a usable text layer are OCR'd."""
+    text_page = "A born-digital page with more than enough extractable text to skip OCR."
+    mock_pdf_reader.load_data.return_value = [Document(text=text_page), Document(text="Scan"), Document(text=" ")]
+    mock_ocr_reader.readtext.return_value = ["Mocked OCR Text", "scan"]
+
     processor = PDFProcessor("dummy_path")
     result = processor._load_document()
-    
-    expected_text = "Extracted Text:\nMocked Document Content\n\nOCR Text:\nPage 1 OCR Text:\n['Mocked OCR Text']"
-    expected_document = [Document(text=expected_text, id_="dummy_path")]
-    
-    assert result == expected_document
+
+    # OCR runs on pages 2 and 3 only; the text-layer line OCR already recovered is not duplicated
+    assert [(c.kwargs["first_page"], c.kwargs["last_page"]) for c in mock_pdf_to_image.call_args_list] == [(2, 2), (3, 3)]
+    expected_text = f"{text_page}\n\nMocked OCR Text\nscan\n\nMocked OCR Text\nscan"
+    assert result == [Document(text=expected_text, id_="dummy_path")]
+    assert processor.stats == {"pages": 3, "ocr_pages": 2, "ocr_skipped_pages": 1, "ocr_oversized_pages": 0}
+
+def test_load_document_text_pdf_skips_ocr(mock_pdf_reader, mock_pdf_to_image, mocker):
+    """Test that a born-digital PDF never rasterizes pages or loads the OCR model."""
+    mock_reader_class = mocker.patch('rag.parsing.ocr.easyocr.Reader')
+    mock_pdf_reader.load_data.return_value = [Document(text="Plenty of extracted text on this page."), Document(text="And on this one too.")]
+
+    processor = PDFProcessor("dummy_path", ocr_min_chars=10)
+    result = processor._load_document()
+
+    assert result[0].text == "Plenty of extracted text on this page.\n\nAnd on this one too."
+    mock_pdf_to_image.assert_not_called()
+    mock_reader_class.assert_not_called()
+    assert processor.stats["ocr_skipped_pages"] == 2
+
+def test_load_document_without_text_layer(mock_pdf_reader, mock_ocr_reader, mock_pdf_to_image, mock_numpy_array, mocker):
+    """Test that every page is OCR'd when the text layer yields no pages."""
+    mocker.patch('rag.parsing.parsing_pdf.pdfinfo_from_path', return_value={"Pages": 2})
+    mock_pdf_reader.load_data.return_value = []
+
+    processor = PDFProcessor("dummy_path")
+    result = processor._load_document()
+
+    assert mock_pdf_to_image.call_count == 2
+    assert result[0].text == "Mocked OCR Text\n\nMocked OCR Text"
+    assert processor.stats["ocr_pages"] == 2
+
+def test_merge_page_text():
+    """Test that text-layer lines missing from the OCR output are kept."""
+    assert PDFProcessor._merge_page_text("Header\n  invoice  TOTAL ", "Invoice total\n42") == "Invoice total\n42\nHeader"
 
 def test_get_nodes(mock_sentence_splitter):
     """Test the get_nodes method."""
@@ -104,18 +150,104 @@ def test_get_nodes_exception(mock_sentence_splitter):
     with pytest.raises(RuntimeError, match="Failed to get nodes from documents: Node extraction error"):
         processor.get_nodes(documents)
         
-def test_extract_text_with_ocr_exception(mock_pdf_to_image):
+def test_extract_text_with_ocr_exception(mock_pdf_to_image, mock_ocr_reader):
     """Test the _extract_text_with_ocr method when an exception is raised."""
     mock_pdf_to_image.side_effect = Exception("OCR extraction error")
     processor = PDFProcessor("dummy_path")
     with pytest.raises(RuntimeError, match="Failed to perform OCR on document: OCR extraction error"):
-        processor._extract_text_with_ocr()
+        processor._extract_text_with_ocr([1])
         
-def test_load_document_ocr_exception(mock_pdf_reader, mock_ocr_reader):
+def test_load_document_ocr_exception(mock_pdf_reader, mock_ocr_reader, mock_pdf_to_image, mock_numpy_array):
     """Test the _load_document method when OCR extraction raises an exception."""
-    mock_pdf_reader.load_data.return_value = [{"text": "Mocked Document Content"}]
+    mock_pdf_reader.load_data.return_value = [Document(text="")]
     mock_ocr_reader.readtext.side_effect = Exception("OCR processing error")
 
     processor = PDFProcessor("dummy_path")
     with pytest.raises(RuntimeError, match="Failed to load document: Failed to perform OCR on document"):
         processor._load_document()
+
+def test_processors_share_ocr_reader(mock_pdf_reader, mock_pdf_to_image, mock_numpy_array, mocker):
+    """Test that the OCR model is loaded once and reused across documents."""
+    mock_reader_class = mocker.patch('rag.parsing.ocr.easyocr.Reader')
+    mock_reader_class.return_value.readtext.return_value = ["Mocked OCR Text"]
+    mock_pdf_reader.load_data.return_value = [Document(text="")]
+
+    PDFProcessor("first.pdf")._load_document()
+    PDFProcessor("second.pdf")._load_document()
+
+    mock_reader_class.assert_called_once_with(["en"], gpu=False)
+    assert mock_reader_class.return_value.readtext.call_count == 2
+
+def test_rasterize_renders_one_window_at_a_time(mock_pdf_to_image):
+    """Test that pages are rendered in bounded windows with the configured preprocessing."""
+    pages = {n: MagicMock(size=(1700, 2200)) for n in range(1, 6)}
+    mock_pdf_to_image.side_effect = lambda path, first_page, last_page, **kwargs: [pages[n] for n in range(first_page, last_page + 1)]
+    processor = PDFProcessor("dummy_path", ocr_dpi=150, ocr_grayscale=True, ocr_max_side=2000, ocr_page_window=2)
+
+    rendered = processor._rasterize([1, 2, 3, 5])
+    assert next(rendered) == (1, pages[1])
+    # the next window is not rendered until the current one is consumed
+    assert mock_pdf_to_image.call_count == 1
+    assert list(rendered) == [(2, pages[2]), (3, pages[3]), (5, pages[5])]
+
+    assert [(c.kwargs["first_page"], c.kwargs["last_page"]) for c in mock_pdf_to_image.call_args_list] == [(1, 2), (3, 3), (5, 5)]
+    assert mock_pdf_to_image.call_args.kwargs["dpi"] == 150
+    assert mock_pdf_to_image.call_args.kwargs["grayscale"] is True
+    pages[1].thumbnail.assert_called_once_with((2000, 2000))
+
+def test_rasterize_keeps_small_pages(mock_pdf_to_image):
+    """Test that pages within the size limit are not resampled."""
+    small_page = MagicMock(size=(800, 1000))
+    mock_pdf_to_image.return_value = [small_page]
+
+    assert list(PDFProcessor("dummy_path")._rasterize([1])) == [(1, small_page)]
+    small_page.thumbnail.assert_not_called()
+
+def test_rasterize_enforces_page_memory_budget(mock_pdf_to_image, mock_pdfinfo):
+    """Test that oversized pages are rendered at a lower DPI, or skipped, to fit the per-page byte budget."""
+    mock_pdfinfo.return_value = {
+        "Pages": 4,
+        "Page    1 size": "612 x 792 pts (letter)",
+        "Page    2 size": "1190.55 x 1683.78 pts (A2)",
+        "Page    3 size": "2383.94 x 3370.39 pts (A0)",
+        "Page    4 size": "612 x 792 pts (letter)",
+    }
+    mock_pdf_to_image.side_effect = lambda path, first_page, last_page, **kwargs: [
+        MagicMock(size=(800, 1000)) for _ in range(first_page, last_page + 1)
+    ]
+    processor = PDFProcessor(
+        "dummy_path", ocr_dpi=200, ocr_grayscale=True, ocr_page_window=4, ocr_max_page_bytes=10_000_000, ocr_min_dpi=100
+    )
+
+    rendered = [page_number for page_number, _ in processor._rasterize([1, 2, 3, 4])]
+
+    # letter fits at 200 DPI, A2 only at 160 DPI, and A0 would need less than the 100 DPI floor
+    assert rendered == [1, 2, 4]
+    mock_pdfinfo.assert_called_once_with(processor.document_path, first_page=1, last_page=4)
+    assert [(c.kwargs["first_page"], c.kwargs["last_page"], c.kwargs["dpi"]) for c in mock_pdf_to_image.call_args_list] == [
+        (1, 1, 200), (2, 2, 160), (4, 4, 200)
+    ]
+    assert processor.stats["ocr_oversized_pages"] == 1
+
+def test_rasterize_without_page_budget(mock_pdf_to_image, mock_pdfinfo):
+    """Test that disabling the budget renders every page at ocr_dpi without looking up page sizes."""
+    processor = PDFProcessor("dummy_path", ocr_max_page_bytes=None)
+
+    assert [page_number for page_number, _ in processor._rasterize([1])] == [1]
+    mock_pdfinfo.assert_not_called()
+    assert mock_pdf_to_image.call_args.kwargs["dpi"] == 200
+
+def test_invalid_page_window():
+    with pytest.raises(ValueError, match="ocr_page_window must be at least 1."):
+        PDFProcessor("dummy_path", ocr_page_window=0)
+
+def test_run_benchmark(mock_pdf_reader, mock_ocr_reader, mock_pdf_to_image, mock_numpy_array):
+    """Test that the benchmark reports throughput and peak memory for a document."""
+    mock_pdf_reader.load_data.return_value = [Document(text=""), Document(text="x" * 100)]
+
+    result = run_benchmark("dummy.pdf", parse_args(["dummy.pdf", "--dpi", "150", "--force-ocr"]))
+
+    assert result["pages"] == 2
+    assert result["ocr_pages"] == 2
+    assert result["pages_per_second"] > 0
+    assert result["peak_rss_mb"] > 0
@@ -1,10 +1,13 @@
+from datetime import datetime
 from pathlib import Path
+from unittest.mock import MagicMock
 
 import pandas as pd
 import pytest
+from openpyxl import Workbook
 
-from rag.parsing.parsing_xlsx import XLSXProcessor
-from rag.parsing.processor import TableInfo
+from rag.parsing.parsing_xlsx import XLSXProcessor, read_sheet_chunks, sheet_names
+from rag.parsing.processor import TableInfo, TableSummaryCache
 
 
 @pytest.fixture
@@ -93,6 +96,18 @@ def test_process(mock_openai_llm, mock_xlsx_data):
     
     mock_openai_llm.structured_predict.assert_called_once()
 
+def test_load_and_summarize(mock_openai_llm, mock_xlsx_data):
+    """Test the public load and summarize steps used to skip empty sheets before asking the LLM."""
+    processor = XLSXProcessor("dummy_path.xlsx", sample_rows=100)
+
+    df = processor.load()
+    table_info = processor.summarize()
+
+    assert processor.df is df
+    assert 'col1' in df.columns
+    assert table_info.table_name == "mocked_table"
+    mock_openai_llm.structured_predict.assert_called_once()
+
 def test_get_table_info_no_df():
     """Test _get_table_info raises a RuntimeError when DataFrame is not loaded."""
     processor = XLSXProcessor("dummy_path.xlsx")
@@ -100,3 +115,66 @@ def test_get_table_info_no_df():
     
     with pytest.raises(RuntimeError, match="DataFrame is not loaded."):
         processor._get_table_info()
+
+@pytest.fixture
+def workbook_path(tmp_path):
+    workbook = Workbook()
+    sales = workbook.active
+    sales.title = "Sales"
+    sales.append(["region", "units", None, "units"])
+    sales.append(["north", 10, datetime(2024, 12, 1, 8, 30), 1.5])
+    sales.append([None, None, None, None])
+    sales.append(["south", 20])
+    sales.append(["east", True, None, None])
+    workbook.create_sheet("Empty")
+    path = tmp_path / "workbook.xlsx"
+    workbook.save(path)
+    return path
+
+def test_sheet_names(workbook_path):
+    assert sheet_names(workbook_path) == ["Sales", "Empty"]
+
+def test_read_sheet_chunks(workbook_path):
+    chunks = list(read_sheet_chunks(workbook_path, "Sales", chunk_rows=2))
+
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert list(chunks[0].columns) == ["region", "units", "Unnamed: 2", "units.1"]
+    assert chunks[0].iloc[0].tolist() == ["north", "10", "2024-12-01 08:30:00", "1.5"]
+    assert chunks[0].iloc[1].tolist() == ["south", "20", None, None]
+    assert chunks[1].iloc[0].tolist() == ["east", "True", None, None]
+
+def test_read_sheet_chunks_empty_sheet(workbook_path):
+    assert list(read_sheet_chunks(workbook_path, "Empty")) == []
+
+def test_load_document_sample_rows(mocker):
+    """Test _load_document only reads the first sample_rows rows when asked to."""
+    mock_read_excel = mocker.patch('pandas.read_excel', return_value=pd.DataFrame({'col1': [1]}))
+    processor = XLSXProcessor("dummy_path.xlsx", sheet_name="Sheet1", sample_rows=100)
+    processor._load_document()
+    mock_read_excel.assert_called_once_with(Path("dummy_path.xlsx"), sheet_name="Sheet1", nrows=100)
+
+def test_get_table_info_cache_hit(mock_openai_llm):
+    """Test _get_table_info returns a cached summary without calling the LLM."""
+    summary_cache = MagicMock(spec=TableSummaryCache)
+    summary_cache.get.return_value = TableInfo(table_name="cached_table", table_summary="Cached summary.")
+    processor = XLSXProcessor("dummy_path.xlsx", sheet_name="Sheet1", summary_cache=summary_cache)
+    processor.df = pd.DataFrame({'col1': [1, 2], 'col2': [3, 4]})
+
+    table_info = processor._get_table_info()
+
+    assert table_info.table_name == "cached_table"
+    mock_openai_llm.structured_predict.assert_not_called()
+    summary_cache.put.assert_not_called()
+
+def test_get_table_info_cache_miss(mock_openai_llm):
+    """Test _get_table_info stores a fresh summary under the fingerprint it looked up."""
+    summary_cache = MagicMock(spec=TableSummaryCache)
+    summary_cache.get.return_value = None
+    processor = XLSXProcessor("dummy_path.xlsx", sheet_name="Sheet1", summary_cache=summary_cache)
+    processor.df = pd.DataFrame({'col1': [1, 2], 'col2': [3, 4]})
+
+    table_info = processor._get_table_info()
+
+    mock_openai_llm.structured_predict.assert_called_once()
+    fingerprint = summary_cache.get.call_args.args[0]
+    summary_cache.put.assert_called_once_with(fingerprint, table_info)
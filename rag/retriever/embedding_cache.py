@@ -0,0 +1,111 @@
+import hashlib
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+SLACK_MENTION_PATTERN = re.compile(r"<@[A-Z0-9]+>")
+
+
+class EmbeddingCacheBackend(ABC):
+    """Shared store (e.g. Redis, Postgres) consulted when the in-process cache misses."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[List[float]]:
+        """Returns the cached embedding for the key, or None."""
+
+    @abstractmethod
+    def set(self, key: str, embedding: List[float], ttl_seconds: float):
+        """Stores the embedding for the key, expiring after `ttl_seconds`."""
+
+
+class EmbeddingCache:
+    """Thread-safe LRU cache with TTL for query embeddings, keyed by normalized query text and model."""
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 3600, backend: Optional[EmbeddingCacheBackend] = None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.backend = backend
+        self._entries: "OrderedDict[str, Tuple[float, List[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "shared_hits": 0, "misses": 0, "evictions": 0}
+        self.logger = logger.bind(service="EmbeddingCache")
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Drops Slack user mentions, case and redundant whitespace, so the same question asked by
+        different people in different channels maps to one entry."""
+        text = SLACK_MENTION_PATTERN.sub("", text)
+        return " ".join(text.casefold().split())
+
+    def make_key(self, text: str, model: str) -> str:
+        return hashlib.sha256(f"{model}\0{self.normalize(text)}".encode()).hexdigest()
+
+    def get(self, text: str, model: str) -> Optional[List[float]]:
+        key = self.make_key(text, model)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, embedding = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return embedding
+                del self._entries[key]
+
+        embedding = self._backend_get(key)
+        with self._lock:
+            if embedding is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["shared_hits"] += 1
+            self._store(key, embedding)
+        return embedding
+
+    def set(self, text: str, model: str, embedding: List[float]):
+        key = self.make_key(text, model)
+        with self._lock:
+            self._store(key, embedding)
+        self._backend_set(key, embedding)
+
+    def _store(self, key: str, embedding: List[float]):
+        """Inserts an entry and evicts least recently used ones. Caller must hold the lock."""
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, embedding)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _backend_get(self, key: str) -> Optional[List[float]]:
+        if self.backend is None:
+            return None
+        try:
+            return self.backend.get(key)
+        except Exception as e:
+            self.logger.bind(err=str(e)).warning("shared embedding cache lookup failed")
+            return None
+
+    def _backend_set(self, key: str, embedding: List[float]):
+        if self.backend is None:
+            return
+        try:
+            self.backend.set(key, embedding, self.ttl_seconds)
+        except Exception as e:
+            self.logger.bind(err=str(e)).warning("shared embedding cache write failed")
+
+    def stats(self) -> Dict[str, float]:
+        """Returns hit/miss counters and the current size."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["shared_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["shared_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -1,19 +1,47 @@
+import asyncio
+from typing import Optional
+
 import openai
+from loguru import logger
 
+from rag.retriever.embedding_cache import EmbeddingCache
+from rag.vectordb.batch_embedder import EMBEDDING_MODEL
 from rag.vectordb.postgres_handler import PostgresHandler
 
+# per-stage limits for the async path; a stage that runs over is left out of the context
+EMBEDDING_TIMEOUT_SECONDS = 5.0
+VECTOR_TIMEOUT_SECONDS = 8.0
+TABULAR_TIMEOUT_SECONDS = 8.0
+
 
 class Retriever:
-    def __init__(self, postgres_handler: PostgresHandler):
+    def __init__(
+        self,
+        postgres_handler: PostgresHandler,
+        embedding_cache: Optional[EmbeddingCache] = None,
+        async_client: Optional[openai.AsyncOpenAI] = None,
+    ):
         self.postgres_handler = postgres_handler
+        self.embedding_cache = embedding_cache if embedding_cache is not None else EmbeddingCache()
+        self.async_client = async_client
+        self.logger = logger.bind(service="Retriever")
+
+    def _embed_query(self, query) -> list:
+        cached = self.embedding_cache.get(query, EMBEDDING_MODEL)
+        if cached is not None:
+            return cached
 
-    def _retrieve_context_vector(self, query, access_level, top_k=5) -> list:
         embedding_result = openai.embeddings.create(
             input=query,
-            model="text-embedding-3-small"
+            model=EMBEDDING_MODEL
         )
         query_vector = embedding_result.data[0].embedding
-        
+        self.embedding_cache.set(query, EMBEDDING_MODEL, query_vector)
+        return query_vector
+
+    def _retrieve_context_vector(self, query, access_level, top_k=5) -> list:
+        query_vector = self._embed_query(query)
+
         return self.postgres_handler.query(query_vector, access_level=access_level, top_k=top_k)
 
     def _retrieve_context_tabular(self, query, access_level) -> str:
@@ -32,3 +60,54 @@ class Retriever:
         final_context.append(context_tabular)
 
         return final_context
+
+    def _get_async_client(self) -> openai.AsyncOpenAI:
+        if self.async_client is None:
+            self.async_client = openai.AsyncOpenAI(api_key=openai.api_key)
+        return self.async_client
+
+    async def _aembed_query(self, query) -> list:
+        cached = self.embedding_cache.get(query, EMBEDDING_MODEL)
+        if cached is not None:
+            return cached
+
+        embedding_result = await asyncio.wait_for(
+            self._get_async_client().embeddings.create(input=query, model=EMBEDDING_MODEL),
+            EMBEDDING_TIMEOUT_SECONDS,
+        )
+        query_vector = embedding_result.data[0].embedding
+        self.embedding_cache.set(query, EMBEDDING_MODEL, query_vector)
+        return query_vector
+
+    async def _aretrieve_context_vector(self, query, access_level, top_k=5) -> list:
+        query_vector = await self._aembed_query(query)
+
+        # psycopg2 has no async API; the pooled query runs on the default executor instead of the event loop
+        return await asyncio.to_thread(self.postgres_handler.query, query_vector, access_level=access_level, top_k=top_k)
+
+    async def _aretrieve_context_tabular(self, query, access_level) -> str:
+        return await asyncio.to_thread(self._retrieve_context_tabular, query, access_level)
+
+    async def _within(self, stage: str, coroutine, timeout: float, fallback):
+        try:
+            return await asyncio.wait_for(coroutine, timeout)
+        except asyncio.TimeoutError:
+            self.logger.bind(stage=stage, timeout=timeout).warning("retrieval stage timed out, answering without it")
+            return fallback
+
+    async def aquery(self, query, access_level, top_k=5):
+        """Like query, but runs the vector and tabular retrievals concurrently. A stage that runs over its
+        timeout contributes nothing instead of holding up the answer."""
+        context_vector, context_tabular = await asyncio.gather(
+            self._within(
+                "vector", self._aretrieve_context_vector(query, access_level, top_k), VECTOR_TIMEOUT_SECONDS, []
+            ),
+            self._within(
+                "tabular", self._aretrieve_context_tabular(query, access_level), TABULAR_TIMEOUT_SECONDS, ""
+            ),
+        )
+
+        final_context = list(context_vector)
+        final_context.append(context_tabular)
+
+        return final_context
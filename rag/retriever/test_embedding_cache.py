@@ -0,0 +1,90 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from rag.retriever.embedding_cache import EmbeddingCache, EmbeddingCacheBackend
+
+
+@pytest.fixture
+def cache():
+    return EmbeddingCache(max_size=2, ttl_seconds=60)
+
+
+def test_cache_hit_after_set(cache):
+    cache.set("What is Broom?", "model", [0.1, 0.2])
+
+    assert cache.get("What is Broom?", "model") == [0.1, 0.2]
+    assert cache.stats()["hits"] == 1
+
+
+def test_cache_miss(cache):
+    assert cache.get("unknown question", "model") is None
+
+    stats = cache.stats()
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.0
+
+
+def test_cache_key_normalizes_query(cache):
+    cache.set('<@U123> asked: \n\n"What is   Broom?" ', "model", [0.1])
+
+    assert cache.get('<@U999> asked: "what is broom?"', "model") == [0.1]
+
+
+def test_cache_key_includes_model(cache):
+    cache.set("What is Broom?", "model-a", [0.1])
+
+    assert cache.get("What is Broom?", "model-b") is None
+
+
+def test_cache_evicts_least_recently_used(cache):
+    cache.set("first", "model", [1.0])
+    cache.set("second", "model", [2.0])
+    cache.get("first", "model")
+    cache.set("third", "model", [3.0])
+
+    assert cache.get("second", "model") is None
+    assert cache.get("first", "model") == [1.0]
+    assert cache.get("third", "model") == [3.0]
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["size"] == 2
+
+
+def test_cache_entries_expire(mocker):
+    mock_time = mocker.patch("rag.retriever.embedding_cache.time.monotonic", return_value=100.0)
+    cache = EmbeddingCache(ttl_seconds=10)
+    cache.set("question", "model", [0.1])
+
+    mock_time.return_value = 111.0
+
+    assert cache.get("question", "model") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_cache_uses_shared_backend():
+    backend = MagicMock(spec=EmbeddingCacheBackend)
+    backend.get.return_value = [0.5]
+    cache = EmbeddingCache(ttl_seconds=30, backend=backend)
+
+    assert cache.get("question", "model") == [0.5]
+    assert cache.get("question", "model") == [0.5]
+
+    # second lookup is served from the in-process cache
+    backend.get.assert_called_once()
+    stats = cache.stats()
+    assert stats["shared_hits"] == 1
+    assert stats["hits"] == 1
+
+    cache.set("other", "model", [0.7])
+    backend.set.assert_called_once_with(cache.make_key("other", "model"), [0.7], 30)
+
+
+def test_cache_survives_backend_failure():
+    backend = MagicMock(spec=EmbeddingCacheBackend)
+    backend.get.side_effect = ConnectionError("backend down")
+    backend.set.side_effect = ConnectionError("backend down")
+    cache = EmbeddingCache(backend=backend)
+
+    assert cache.get("question", "model") is None
+    cache.set("question", "model", [0.1])
+    assert cache.get("question", "model") == [0.1]
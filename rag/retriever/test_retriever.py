@@ -1,4 +1,6 @@
-from unittest.mock import MagicMock, patch
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
@@ -51,3 +53,64 @@ def test_query(retriever):
     assert result[0] == "Vector Context 1"
     assert result[1] == "Vector Context 2"
     assert result[2] == "Tabular Context"
+
+
+@patch("openai.embeddings.create")
+def test_retrieve_context_vector_uses_embedding_cache(mock_create_embedding, retriever):
+    mock_create_embedding.return_value = MagicMock(data=[MagicMock(embedding=[0.1, 0.2, 0.3])])
+
+    retriever._retrieve_context_vector("What is Broom?", 1)
+    retriever._retrieve_context_vector("what is broom?", 1)
+
+    mock_create_embedding.assert_called_once()
+    assert retriever.postgres_handler.query.call_count == 2
+    assert retriever.embedding_cache.stats()["hits"] == 1
+
+
+@pytest.fixture
+def async_retriever():
+    async_client = MagicMock()
+    async_client.embeddings.create = AsyncMock(return_value=MagicMock(data=[MagicMock(embedding=[0.1, 0.2, 0.3])]))
+    return Retriever(MagicMock(), async_client=async_client)
+
+
+@pytest.mark.asyncio
+async def test_aquery(async_retriever):
+    async_retriever.postgres_handler.query.return_value = ["Vector Context"]
+    async_retriever._retrieve_context_tabular = MagicMock(return_value="Tabular Context")
+
+    result = await async_retriever.aquery("sample query", 1, top_k=3)
+
+    assert result == ["Vector Context", "Tabular Context"]
+    async_retriever.async_client.embeddings.create.assert_awaited_once_with(
+        input="sample query", model="text-embedding-3-small"
+    )
+    async_retriever.postgres_handler.query.assert_called_once_with([0.1, 0.2, 0.3], access_level=1, top_k=3)
+
+
+@pytest.mark.asyncio
+async def test_aquery_runs_stages_concurrently(async_retriever):
+    async_retriever.postgres_handler.query.side_effect = lambda *args, **kwargs: time.sleep(0.3) or ["Vector Context"]
+    async_retriever._retrieve_context_tabular = MagicMock(side_effect=lambda *args: time.sleep(0.3) or "Tabular Context")
+
+    start = time.perf_counter()
+    result = await async_retriever.aquery("sample query", 1)
+
+    assert result == ["Vector Context", "Tabular Context"]
+    assert time.perf_counter() - start < 0.55
+
+
+@pytest.mark.asyncio
+async def test_aquery_degrades_slow_stage(async_retriever):
+    async def slow_embedding(**kwargs):
+        await asyncio.sleep(1)
+
+    async_retriever.async_client.embeddings.create = AsyncMock(side_effect=slow_embedding)
+    async_retriever._retrieve_context_tabular = MagicMock(return_value="Tabular Context")
+
+    with patch("rag.retriever.retriever.EMBEDDING_TIMEOUT_SECONDS", 0.05):
+        result = await async_retriever.aquery("sample query", 1)
+
+    assert result == ["Tabular Context"]
+    async_retriever.postgres_handler.query.assert_not_called()
+
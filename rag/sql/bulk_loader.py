@@ -0,0 +1,170 @@
+import io
+import itertools
+import re
+import resource
+import time
+import uuid
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import pandas as pd
+from loguru import logger
+from psycopg2 import sql
+from sqlalchemy.engine import Engine
+
+CHUNK_ROWS = 50_000
+
+# Postgres column types, narrowest first
+COLUMN_TYPES = ("BOOLEAN", "BIGINT", "DOUBLE PRECISION", "TEXT")
+
+# the types a column of each type can be altered to in place
+WIDER_TYPES = {
+    "BOOLEAN": ("TEXT",),
+    "BIGINT": ("DOUBLE PRECISION", "TEXT"),
+    "DOUBLE PRECISION": ("TEXT",),
+    "TEXT": ("TEXT",),
+}
+
+_INTEGER = re.compile(r"^[+-]?\d{1,18}$")
+_BOOLEANS = {"true", "false"}
+
+
+def _fits(values: pd.Series, column_type: str) -> bool:
+    values = values.dropna()
+    if column_type == "TEXT" or values.empty:
+        return True
+    if column_type == "BOOLEAN":
+        return values.str.strip().str.lower().isin(_BOOLEANS).all()
+    if column_type == "BIGINT":
+        return values.str.strip().str.match(_INTEGER).all()
+    return pd.to_numeric(values, errors="coerce").notna().all()
+
+
+def infer_column_type(values: pd.Series, current: Optional[str] = None) -> str:
+    """Returns the narrowest Postgres type every non-null string in `values` parses as.
+
+    With `current`, only `current` itself or the types it can be widened to are considered.
+    """
+    if current is None and values.dropna().empty:
+        # nothing to go on; anything fits in TEXT
+        return "TEXT"
+    candidates = COLUMN_TYPES if current is None else (current, *WIDER_TYPES[current])
+    for column_type in candidates:
+        if _fits(values, column_type):
+            return column_type
+    return "TEXT"
+
+
+def read_csv_chunks(file_path: str, chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    # strings throughout: types are decided by the loader, not by pandas' per-chunk guesses
+    with pd.read_csv(file_path, dtype=str, chunksize=chunk_rows) as reader:
+        yield from reader
+
+
+class TableLoader:
+    """Loads row chunks into a Postgres table without holding the whole table in memory.
+
+    Chunks are DataFrames of strings (None for empty cells), streamed into a staging table with COPY. Column
+    types are inferred from the first chunk and widened in place (e.g. BIGINT to DOUBLE PRECISION, anything
+    to TEXT) when a later chunk does not fit. The staging table replaces the target table in the same
+    transaction, so readers see either the old table or the complete new one.
+    """
+
+    def __init__(self, engine: Engine, chunk_rows: int = CHUNK_ROWS):
+        if chunk_rows < 1:
+            raise ValueError("chunk_rows must be at least 1.")
+        self.engine = engine
+        self.chunk_rows = chunk_rows
+        self.logger = logger.bind(service="TableLoader")
+
+    @staticmethod
+    def _create_staging(cursor, staging: str, column_types: Dict[str, str]):
+        cursor.execute(sql.SQL("CREATE TABLE {} ({})").format(
+            sql.Identifier(staging),
+            sql.SQL(", ").join(
+                sql.SQL("{} {}").format(sql.Identifier(column), sql.SQL(column_type))
+                for column, column_type in column_types.items()
+            ),
+        ))
+
+    def _widen(self, cursor, staging: str, column_types: Dict[str, str], chunk: pd.DataFrame):
+        for column, column_type in column_types.items():
+            if _fits(chunk[column], column_type):
+                continue
+            widened = infer_column_type(chunk[column], column_type)
+            self.logger.bind(column=column, was=column_type, now=widened).debug("widening column")
+            cursor.execute(sql.SQL("ALTER TABLE {} ALTER COLUMN {} TYPE {}").format(
+                sql.Identifier(staging), sql.Identifier(column), sql.SQL(widened)
+            ))
+            column_types[column] = widened
+
+    @staticmethod
+    def _copy_chunk(cursor, staging: str, columns: List[str], chunk: pd.DataFrame):
+        buffer = io.StringIO()
+        # unquoted empty fields are NULL in COPY's csv format
+        chunk.to_csv(buffer, columns=columns, header=False, index=False)
+        buffer.seek(0)
+        cursor.copy_expert(
+            sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)").format(
+                sql.Identifier(staging), sql.SQL(", ").join(map(sql.Identifier, columns))
+            ),
+            buffer,
+        )
+
+    @staticmethod
+    def _swap(cursor, staging: str, table_name: str):
+        cursor.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(table_name)))
+        cursor.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(sql.Identifier(staging), sql.Identifier(table_name)))
+
+    def load(
+        self, chunks: Iterable[pd.DataFrame], table_name: str, access_level: Optional[int] = None
+    ) -> Dict[str, float]:
+        """Replaces `table_name` with the rows of `chunks`, plus an access_level column when given.
+
+        Returns the row count, elapsed seconds, rows/sec and this process's peak RSS.
+        """
+        start = time.perf_counter()
+        chunks = iter(chunks)
+        first = next(chunks, None)
+        if first is None:
+            column_types = {}
+        else:
+            column_types = {column: infer_column_type(first[column]) for column in first.columns}
+            chunks = itertools.chain([first], chunks)
+        if access_level is not None:
+            column_types["access_level"] = "INTEGER"
+        columns = list(column_types)
+        staging = f"staging_{uuid.uuid4().hex}"
+        rows = 0
+
+        connection = self.engine.raw_connection()
+        try:
+            with connection.cursor() as cursor:
+                self._create_staging(cursor, staging, column_types)
+                for chunk in chunks:
+                    if access_level is not None:
+                        chunk["access_level"] = str(access_level)
+                    self._widen(cursor, staging, column_types, chunk)
+                    self._copy_chunk(cursor, staging, columns, chunk)
+                    rows += len(chunk)
+                self._swap(cursor, staging, table_name)
+            connection.commit()
+        except Exception:
+            # the staging table goes with the rolled back transaction; the old table is untouched
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+        elapsed = time.perf_counter() - start
+        stats = {
+            "rows": rows,
+            "seconds": round(elapsed, 3),
+            "rows_per_second": round(rows / elapsed, 1) if elapsed > 0 else 0.0,
+            # ru_maxrss is in kilobytes on Linux
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+        self.logger.bind(table=table_name, **stats).info("loaded table")
+        return stats
+
+    def load_csv(self, file_path: str, table_name: str, access_level: Optional[int] = None) -> Dict[str, float]:
+        return self.load(read_csv_chunks(file_path, self.chunk_rows), table_name, access_level)
@@ -2,8 +2,8 @@ import os
 
 from sqlalchemy import create_engine
 
-from rag.parsing.parsing_csv import CSVProcessor
-from rag.parsing.parsing_xlsx import XLSXProcessor
+from rag.parsing.parsing_xlsx import read_sheet_chunks
+from rag.sql.bulk_loader import TableLoader
 
 
 def get_postgres_engine():
@@ -18,26 +18,16 @@ def get_postgres_engine():
 def load_csv_to_db(file_path: str, access_level: int, table_name: str):
     """Loads a CSV file into a PostgreSQL table with an additional access_level column."""
     engine = get_postgres_engine()
-    csv_processor = CSVProcessor(file_path)
-    df = csv_processor._load_document()
-
-    df["access_level"] = access_level
-
-    df.to_sql(table_name, con=engine, if_exists="replace", index=False)
-    print(f"Loaded data into table '{table_name}' with access level {access_level}.")
+    stats = TableLoader(engine).load_csv(file_path, table_name, access_level)
+    print(f"Loaded data into table '{table_name}' with access level {access_level}: {stats}")
     return engine
 
 
 def load_xlsx_to_db(file_path: str, sheet_name: str, access_level: int, table_name: str):
     """Loads an Excel sheet into a PostgreSQL table with an additional access_level column."""
     engine = get_postgres_engine()
-    xlsx_processor = XLSXProcessor(file_path, sheet_name)
-    df = xlsx_processor._load_document()
-
-    df["access_level"] = access_level
-
-    df.to_sql(table_name, con=engine, if_exists="replace", index=False)
-    print(f"Loaded data into table '{table_name}' with access level {access_level}.")
+    stats = TableLoader(engine).load(read_sheet_chunks(file_path, sheet_name), table_name, access_level)
+    print(f"Loaded data into table '{table_name}' with access level {access_level}: {stats}")
     return engine
 
 
@@ -0,0 +1,115 @@
+from unittest.mock import MagicMock
+
+import pandas as pd
+import pytest
+from psycopg2 import sql
+
+from rag.sql.bulk_loader import TableLoader, infer_column_type
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_text(
+        "name,count,score,active\n"
+        "alpha,1,0.5,True\n"
+        "beta,2,,False\n"
+        "gamma,3,1.5,True\n"
+        "delta,4.5,2,False\n"
+        "epsilon,x,3,True\n"
+    )
+    return str(path)
+
+@pytest.fixture
+def mock_connection():
+    return MagicMock()
+
+@pytest.fixture
+def mock_cursor(mock_connection):
+    cursor = mock_connection.cursor.return_value.__enter__.return_value
+    copied = []
+    cursor.copy_expert.side_effect = lambda statement, buffer: copied.append(buffer.read())
+    cursor.copied = copied
+    return cursor
+
+@pytest.fixture
+def loader(mock_connection):
+    engine = MagicMock()
+    engine.raw_connection.return_value = mock_connection
+    return TableLoader(engine, chunk_rows=2)
+
+
+def render(statement) -> str:
+    if isinstance(statement, sql.Composed):
+        return "".join(render(part) for part in statement.seq)
+    if isinstance(statement, sql.Identifier):
+        return ".".join(f'"{name}"' for name in statement.strings)
+    return statement.string
+
+
+def statements(cursor):
+    return [render(call.args[0]) for call in cursor.execute.call_args_list]
+
+
+@pytest.mark.parametrize("values, expected", [
+    (["1", "-2", " 3 "], "BIGINT"),
+    (["1", "2.5", "1e3"], "DOUBLE PRECISION"),
+    (["True", "false"], "BOOLEAN"),
+    (["1", "two"], "TEXT"),
+    (["12345678901234567890"], "DOUBLE PRECISION"),
+    ([None, None], "TEXT"),
+])
+def test_infer_column_type(values, expected):
+    assert infer_column_type(pd.Series(values, dtype=object)) == expected
+
+def test_infer_column_type_only_widens():
+    assert infer_column_type(pd.Series(["1"]), current="DOUBLE PRECISION") == "DOUBLE PRECISION"
+    assert infer_column_type(pd.Series(["1"]), current="BOOLEAN") == "TEXT"
+
+def test_invalid_chunk_rows():
+    with pytest.raises(ValueError, match="chunk_rows must be at least 1."):
+        TableLoader(MagicMock(), chunk_rows=0)
+
+def test_load_csv_copies_chunks_and_swaps(loader, csv_file, mock_connection, mock_cursor):
+    stats = loader.load_csv(csv_file, "sales", access_level=2)
+
+    assert stats["rows"] == 5
+    assert set(stats) == {"rows", "seconds", "rows_per_second", "peak_rss_mb"}
+    assert mock_cursor.copied == [
+        "alpha,1,0.5,True,2\nbeta,2,,False,2\n",
+        "gamma,3,1.5,True,2\ndelta,4.5,2,False,2\n",
+        "epsilon,x,3,True,2\n",
+    ]
+
+    executed = statements(mock_cursor)
+    staging = executed[0].split('"')[1]
+    assert executed == [
+        f'CREATE TABLE "{staging}" ("name" TEXT, "count" BIGINT, "score" DOUBLE PRECISION, "active" BOOLEAN, '
+        '"access_level" INTEGER)',
+        # types come from the first chunk; count is widened once a later chunk no longer fits
+        f'ALTER TABLE "{staging}" ALTER COLUMN "count" TYPE DOUBLE PRECISION',
+        f'ALTER TABLE "{staging}" ALTER COLUMN "count" TYPE TEXT',
+        'DROP TABLE IF EXISTS "sales"',
+        f'ALTER TABLE "{staging}" RENAME TO "sales"',
+    ]
+    mock_connection.commit.assert_called_once()
+    mock_connection.close.assert_called_once()
+
+def test_load_rolls_back_on_failure(loader, csv_file, mock_connection, mock_cursor):
+    mock_cursor.copy_expert.side_effect = RuntimeError("copy failed")
+
+    with pytest.raises(RuntimeError, match="copy failed"):
+        loader.load_csv(csv_file, "sales")
+
+    assert not any("DROP TABLE" in statement for statement in statements(mock_cursor))
+    mock_connection.rollback.assert_called_once()
+    mock_connection.commit.assert_not_called()
+    mock_connection.close.assert_called_once()
+
+def test_load_without_rows(loader, mock_connection, mock_cursor):
+    stats = loader.load(iter([]), "empty", access_level=1)
+
+    assert stats["rows"] == 0
+    assert statements(mock_cursor)[0].endswith('("access_level" INTEGER)')
+    mock_cursor.copy_expert.assert_not_called()
+    mock_connection.commit.assert_called_once()
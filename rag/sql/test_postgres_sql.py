@@ -154,31 +154,26 @@ def test_get_postgres_engine(mock_create_engine):
         assert engine == mock_create_engine.return_value
 
 @patch("rag.sql.postgres_db_loader.get_postgres_engine")
-@patch("rag.sql.postgres_db_loader.CSVProcessor")
-def test_load_csv_to_db(mock_csv_processor, mock_get_engine):
+@patch("rag.sql.postgres_db_loader.TableLoader")
+def test_load_csv_to_db(mock_loader, mock_get_engine):
     """Test loading CSV data into PostgreSQL."""
     mock_engine = mock_get_engine.return_value
-    mock_df = MagicMock()
-    mock_csv_processor.return_value._load_document.return_value = mock_df
 
     engine = load_csv_to_db("dummy_path.csv", access_level=3, table_name="test_table")
 
-    mock_csv_processor.return_value._load_document.assert_called_once()
-    mock_df.__setitem__.assert_called_once_with("access_level", 3)  # Ensure "access_level" is set
-    mock_df.to_sql.assert_called_once_with("test_table", con=mock_engine, if_exists="replace", index=False)
+    mock_loader.assert_called_once_with(mock_engine)
+    mock_loader.return_value.load_csv.assert_called_once_with("dummy_path.csv", "test_table", 3)
     assert engine == mock_engine
 
 @patch("rag.sql.postgres_db_loader.get_postgres_engine")
-@patch("rag.sql.postgres_db_loader.XLSXProcessor")
-def test_load_xlsx_to_db(mock_xlsx_processor, mock_get_engine):
+@patch("rag.sql.postgres_db_loader.TableLoader")
+@patch("rag.sql.postgres_db_loader.read_sheet_chunks")
+def test_load_xlsx_to_db(mock_read_sheet_chunks, mock_loader, mock_get_engine):
     """Test loading XLSX data into PostgreSQL."""
     mock_engine = mock_get_engine.return_value
-    mock_df = MagicMock()
-    mock_xlsx_processor.return_value._load_document.return_value = mock_df
 
     engine = load_xlsx_to_db("dummy_path.xlsx", "Sheet1", access_level=3, table_name="test_table")
 
-    mock_xlsx_processor.return_value._load_document.assert_called_once()
-    mock_df.__setitem__.assert_called_once_with("access_level", 3)  # Ensure "access_level" is set
-    mock_df.to_sql.assert_called_once_with("test_table", con=mock_engine, if_exists="replace", index=False)
+    mock_read_sheet_chunks.assert_called_once_with("dummy_path.xlsx", "Sheet1")
+    mock_loader.return_value.load.assert_called_once_with(mock_read_sheet_chunks.return_value, "test_table", 3)
     assert engine == mock_engine
\ No newline at end of file
@@ -0,0 +1,127 @@
+import hashlib
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import openai
+from loguru import logger
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+
+def content_hash(text: str, model: str, dimension: int) -> str:
+    """Identifies an embedding by everything that determines it: the exact text, the model and the dimension."""
+    return hashlib.sha256(f"{model}\0{dimension}\0{text}".encode()).hexdigest()
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used for rate budgeting, not billing."""
+    return max(1, len(text) // 4)
+
+
+class TokenBudget:
+    """Token bucket that refills `tokens_per_minute` tokens per minute and blocks callers until enough are available."""
+
+    def __init__(self, tokens_per_minute: int):
+        self.tokens_per_minute = tokens_per_minute
+        self._available = float(tokens_per_minute)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated_at
+        self._available = min(self.tokens_per_minute, self._available + elapsed * self.tokens_per_minute / 60)
+        self._updated_at = now
+
+    def acquire(self, tokens: int):
+        # a single request larger than the whole budget is let through once the bucket is full
+        tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._available >= tokens:
+                    self._available -= tokens
+                    return
+                wait = (tokens - self._available) * 60 / self.tokens_per_minute
+            time.sleep(wait)
+
+
+class BatchEmbedder:
+    """Embeds texts with batched, concurrent OpenAI requests, retrying rate limits with exponential backoff."""
+
+    def __init__(
+        self,
+        model: str = EMBEDDING_MODEL,
+        batch_size: int = 100,
+        max_concurrency: int = 4,
+        max_retries: int = 5,
+        initial_backoff: float = 1.0,
+        tokens_per_minute: Optional[int] = None,
+    ):
+        if batch_size < 1 or max_concurrency < 1:
+            raise ValueError("batch_size and max_concurrency must be at least 1.")
+        self.model = model
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.budget = TokenBudget(tokens_per_minute) if tokens_per_minute else None
+        self.logger = logger.bind(service="BatchEmbedder")
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = None
+        response = getattr(error, "response", None)
+        if response is not None:
+            retry_after = response.headers.get("retry-after")
+        try:
+            return float(retry_after)
+        except (TypeError, ValueError):
+            return self.initial_backoff * (2 ** attempt) * (1 + random.random())
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        if self.budget is not None:
+            self.budget.acquire(sum(estimate_tokens(text) for text in batch))
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = openai.embeddings.create(input=batch, model=self.model)
+                break
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt, e)
+                self.logger.bind(attempt=attempt + 1, delay=round(delay, 2), err=str(e)).warning("embedding request failed, retrying")
+                time.sleep(delay)
+
+        embeddings = [item.embedding for item in response.data]
+        if len(embeddings) != len(batch):
+            raise ValueError(f"Expected {len(batch)} embeddings, got {len(embeddings)}.")
+        return embeddings
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Returns one embedding per text, in input order."""
+        if not texts:
+            return []
+
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        start = time.perf_counter()
+        if len(batches) == 1 or self.max_concurrency == 1:
+            results = [self._embed_batch(batch) for batch in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as executor:
+                results = list(executor.map(self._embed_batch, batches))
+
+        self.logger.bind(
+            texts=len(texts), batches=len(batches), seconds=round(time.perf_counter() - start, 3)
+        ).debug("embedded texts")
+        return [embedding for batch in results for embedding in batch]
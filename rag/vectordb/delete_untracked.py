@@ -0,0 +1,38 @@
+# python -m rag.vectordb.delete_untracked
+import argparse
+import os
+
+from rag.vectordb.postgres_handler import PostgresHandler
+
+
+def parse_args(argv=None):
+    # the chunk tables cleaned up follow VECTOR_STORAGE_MODE, like the app's
+    parser = argparse.ArgumentParser(
+        description="Delete the chunks stored before vectors were tracked per document (those without a document_id)."
+    )
+    return parser.parse_args(argv)
+
+
+def delete_untracked(args) -> int:
+    postgres_handler = PostgresHandler(
+        db_name=os.getenv("POSTGRES_DB"),
+        user=os.getenv("POSTGRES_USER"),
+        password=os.getenv("POSTGRES_PASSWORD"),
+        host=os.getenv("POSTGRES_HOST"),
+        port=int(os.getenv("POSTGRES_PORT", 5432)),
+        dimension=1536,
+        min_connections=1,
+        max_connections=1,
+    )
+    try:
+        return postgres_handler.delete_untracked_chunks()
+    finally:
+        postgres_handler.close()
+
+
+if __name__ == "__main__":  # pragma: no cover
+    if not (os.getenv("POSTGRES_DB") and os.getenv("POSTGRES_USER") and os.getenv("POSTGRES_PASSWORD")):
+        raise EnvironmentError("PostgreSQL credentials must be set.")
+
+    rows = delete_untracked(parse_args())
+    print(f"Deleted {rows} untracked chunks.")
@@ -0,0 +1,42 @@
+# python -m rag.vectordb.migrate_single_table [--drop-legacy-tables]
+import argparse
+import os
+
+from rag.vectordb.postgres_handler import PostgresHandler
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Collapse the per-level index_l{level} tables into the single access-level filtered chunk table."
+    )
+    parser.add_argument(
+        "--drop-legacy-tables", action="store_true",
+        help="drop index_l{level} once migrated; only do this after switching VECTOR_STORAGE_MODE to single_table",
+    )
+    return parser.parse_args(argv)
+
+
+def migrate(args) -> int:
+    postgres_handler = PostgresHandler(
+        db_name=os.getenv("POSTGRES_DB"),
+        user=os.getenv("POSTGRES_USER"),
+        password=os.getenv("POSTGRES_PASSWORD"),
+        host=os.getenv("POSTGRES_HOST"),
+        port=int(os.getenv("POSTGRES_PORT", 5432)),
+        dimension=1536,
+        min_connections=1,
+        max_connections=1,
+        storage_mode="single_table",
+    )
+    try:
+        return postgres_handler.migrate_to_single_table(drop_legacy_tables=args.drop_legacy_tables)
+    finally:
+        postgres_handler.close()
+
+
+if __name__ == "__main__":  # pragma: no cover
+    if not (os.getenv("POSTGRES_DB") and os.getenv("POSTGRES_USER") and os.getenv("POSTGRES_PASSWORD")):
+        raise EnvironmentError("PostgreSQL credentials must be set.")
+
+    rows = migrate(parse_args())
+    print(f"Migrated {rows} chunks into the single chunk table.")
@@ -1,37 +1,28 @@
 import os
-from typing import List
+from typing import List, Optional
 
 import openai
 
 from rag.parsing.parsing_txt import TXTProcessor
+from rag.vectordb.batch_embedder import BatchEmbedder
 from rag.vectordb.pinecone.pinecone_handler import PineconeHandler
 
 
 class PineconeNodeStorage:
     """Orchestrates the storage of document nodes into Pinecone via embedding vectors."""
 
-    def __init__(self, pinecone_handler: PineconeHandler):
+    def __init__(self, pinecone_handler: PineconeHandler, embedder: Optional[BatchEmbedder] = None):
         self.pinecone_handler = pinecone_handler
-
-    def _embed_node(self, node_text: str):
-        """Converts node text into a vector using OpenAI's text-embedding-3-small model."""
-        response = openai.embeddings.create(
-            input=node_text,
-            model="text-embedding-3-small"
-        )
-        
-        return response.data[0].embedding
+        self.embedder = embedder if embedder is not None else BatchEmbedder()
 
     def store_nodes(self, nodes: List[str]):
         """Stores the nodes as vectors in Pinecone."""
-        vectors = []
-        for i, node in enumerate(nodes):
-            vector = self._embed_node(node)
-            vectors.append({"id": str(i), "values": vector})
-            
-        if not vectors:
+        if not nodes:
           raise ValueError("No vectors to store.")
 
+        embeddings = self.embedder.embed(nodes)
+        vectors = [{"id": str(i), "values": vector} for i, vector in enumerate(embeddings)]
+
         self.pinecone_handler.upsert_vectors(vectors)
 
 if __name__ == "__main__":  # pragma: no cover
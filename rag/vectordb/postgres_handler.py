@@ -1,14 +1,85 @@
 import os
-from typing import Any, Dict, List
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Set
 
 import openai
 import psycopg2
+from loguru import logger
+from psycopg2 import pool
+from psycopg2.extras import execute_values
+
+# distance metric -> (query operator, pgvector operator class)
+DISTANCE_METRICS = {
+    "l2": ("<->", "vector_l2_ops"),
+    "cosine": ("<=>", "vector_cosine_ops"),
+    "inner_product": ("<#>", "vector_ip_ops"),
+}
+
+INDEX_TYPES = ("hnsw", "ivfflat")
+
+# per_level: one index_l{level} table per access level, each chunk duplicated into every higher level
+# single_table: one CHUNK_TABLE row per chunk, filtered with access_level <= user level at query time
+STORAGE_MODES = ("per_level", "single_table")
+
+# partial: one partial ANN index per access level; iterative: one index scanned iteratively (pgvector >= 0.8)
+FILTER_STRATEGIES = ("partial", "iterative")
+
+CHUNK_TABLE = "index_chunks"
+
+# index settings used when the constructor isn't given them; "none" as VECTOR_INDEX_TYPE disables ANN indexes
+VECTOR_INDEX_DEFAULTS = {
+    "VECTOR_DISTANCE_METRIC": "l2",
+    "VECTOR_INDEX_TYPE": "hnsw",
+    "VECTOR_HNSW_M": "16",
+    "VECTOR_HNSW_EF_CONSTRUCTION": "64",
+    "VECTOR_IVFFLAT_LISTS": "100",
+    "VECTOR_HNSW_EF_SEARCH": "40",
+    "VECTOR_IVFFLAT_PROBES": "10",
+}
+
+
+def _configured(value, env_var: str, cast=str):
+    """`value` if given, else the VECTOR_* environment setting, else its default. The app, the workers and the
+    reindex command all resolve index settings here, so indexes are built for the operator queries use."""
+    if value is not None:
+        return value
+    return cast(os.getenv(env_var) or VECTOR_INDEX_DEFAULTS[env_var])
+
+# content hash -> embedding, shared by every storage mode so unchanged chunks are never re-embedded
+EMBEDDING_CACHE_TABLE = "embedding_cache"
 
 
 class PostgresHandler:
-    """Handles interactions with PostgreSQL (pgvector), including multi-table access for hierarchical access levels."""
+    """Handles interactions with PostgreSQL (pgvector), including multi-table access for hierarchical access levels.
 
-    def __init__(self, db_name: str, user: str, password: str, host: str, port: int, dimension: int):
+    Connections come from a thread-safe pool and are checked out per operation, so concurrent
+    retrievals (one per Slack conversation thread) never share a connection or cursor.
+    """
+
+    def __init__(
+        self,
+        db_name: str,
+        user: str,
+        password: str,
+        host: str,
+        port: int,
+        dimension: int,
+        min_connections: int = 2,
+        max_connections: int = 10,
+        pool_timeout: float = 30.0,
+        health_check_interval: float = 60.0,
+        distance_metric: Optional[str] = None,
+        index_type: Optional[str] = None,
+        hnsw_m: Optional[int] = None,
+        hnsw_ef_construction: Optional[int] = None,
+        ivfflat_lists: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        storage_mode: Optional[str] = None,
+        filter_strategy: str = "partial",
+    ):
         self.db_name = db_name
         self.user = user
         self.password = password
@@ -16,76 +87,611 @@ class PostgresHandler:
         self.port = port
         self.dimension = dimension
         self.total_access_levels = int(os.getenv("TOTAL_ACCESS_LEVELS"))
-        
-        # Initialize the connection
-        self.conn = psycopg2.connect(
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self.pool_timeout = pool_timeout
+        self.health_check_interval = health_check_interval
+        self.logger = logger.bind(service="PostgresHandler")
+
+        distance_metric = _configured(distance_metric, "VECTOR_DISTANCE_METRIC")
+        index_type = _configured(index_type, "VECTOR_INDEX_TYPE")
+        if distance_metric not in DISTANCE_METRICS:
+            raise ValueError(f"Unsupported distance metric: {distance_metric}")
+        if index_type != "none" and index_type not in INDEX_TYPES:
+            raise ValueError(f"Unsupported index type: {index_type}")
+        self.distance_metric = distance_metric
+        self.distance_operator, self.operator_class = DISTANCE_METRICS[distance_metric]
+        self.index_type = None if index_type == "none" else index_type
+        self.hnsw_m = _configured(hnsw_m, "VECTOR_HNSW_M", int)
+        self.hnsw_ef_construction = _configured(hnsw_ef_construction, "VECTOR_HNSW_EF_CONSTRUCTION", int)
+        self.ivfflat_lists = _configured(ivfflat_lists, "VECTOR_IVFFLAT_LISTS", int)
+        self.ef_search = _configured(ef_search, "VECTOR_HNSW_EF_SEARCH", int)
+        self.probes = _configured(probes, "VECTOR_IVFFLAT_PROBES", int)
+
+        storage_mode = storage_mode or os.getenv("VECTOR_STORAGE_MODE") or "per_level"
+        if storage_mode not in STORAGE_MODES:
+            raise ValueError(f"Unsupported storage mode: {storage_mode}")
+        if filter_strategy not in FILTER_STRATEGIES:
+            raise ValueError(f"Unsupported filter strategy: {filter_strategy}")
+        self.storage_mode = storage_mode
+        self.filter_strategy = filter_strategy
+
+        # psycopg2 pools raise instead of blocking when exhausted, so callers queue on a semaphore
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._stats_lock = threading.Lock()
+        self._last_used: Dict[int, float] = {}
+        self._stats = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "reconnects": 0,
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+        }
+
+        # Initialize the connection pool; `min_connections` are opened eagerly and kept warm
+        self.pool = pool.ThreadedConnectionPool(
+            min_connections,
+            max_connections,
             dbname=self.db_name,
             user=self.user,
             password=self.password,
             host=self.host,
             port=self.port
         )
-        self.cursor = self.conn.cursor()
         
         # Ensure pgvector extension is available
         self._initialize_pgvector_extension()
         
-        # Pre-create tables for each access level
+        # Pre-create tables (and their ANN indexes) for each access level
         self._initialize_tables()
 
+    def _record_wait(self, wait: float, timed_out: bool = False):
+        with self._stats_lock:
+            if timed_out:
+                self._stats["timeouts"] += 1
+                return
+            self._stats["checkouts"] += 1
+            self._stats["total_wait_seconds"] += wait
+            self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], wait)
+
+    def _ping(self, conn) -> bool:
+        """Returns whether the connection still answers a trivial query."""
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT 1;")
+            finally:
+                cursor.close()
+            conn.rollback()
+            return True
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            return False
+
+    def _discard(self, conn):
+        with self._stats_lock:
+            self._last_used.pop(id(conn), None)
+            self._stats["reconnects"] += 1
+        self.pool.putconn(conn, close=True)
+
+    def _getconn(self):
+        """Takes a connection from the pool, replacing it if it has gone stale while idle."""
+        conn = self.pool.getconn()
+        with self._stats_lock:
+            last_used = self._last_used.get(id(conn))
+        if last_used is not None and time.monotonic() - last_used > self.health_check_interval and not self._ping(conn):
+            self.logger.warning("discarding stale database connection")
+            self._discard(conn)
+            conn = self.pool.getconn()
+        return conn
+
+    @contextmanager
+    def _checkout(self):
+        """Borrows a connection for the duration of the block, waiting up to `pool_timeout` for a free slot."""
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.pool_timeout):
+            self._record_wait(time.perf_counter() - start, timed_out=True)
+            raise pool.PoolError(f"Timed out after {self.pool_timeout}s waiting for a database connection.")
+        try:
+            conn = self._getconn()
+            self._record_wait(time.perf_counter() - start)
+            broken = False
+            try:
+                yield conn
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                broken = True
+                raise
+            finally:
+                # every other error (bad SQL, constraint violations, errors raised by the caller) leaves a usable
+                # connection that must go back to the pool; the pool rolls back whatever transaction is still open
+                if broken:
+                    self._discard(conn)
+                else:
+                    with self._stats_lock:
+                        self._last_used[id(conn)] = time.monotonic()
+                    self.pool.putconn(conn)
+        finally:
+            self._slots.release()
+
+    def _run(self, work: Callable[[Any], Any]):
+        """Runs `work(cursor)` in its own transaction, retrying once on a fresh connection if the old one dropped."""
+        for attempt in range(2):
+            try:
+                with self._checkout() as conn:
+                    cursor = conn.cursor()
+                    try:
+                        result = work(cursor)
+                        conn.commit()
+                        return result
+                    except Exception:
+                        if not conn.closed:
+                            conn.rollback()
+                        raise
+                    finally:
+                        cursor.close()
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                if attempt == 1:
+                    raise
+                self.logger.bind(err=str(e)).warning("database connection lost, retrying on a new connection")
+
+    def _run_outside_transaction(self, work: Callable[[Any], Any]):
+        """Runs `work(cursor)` in autocommit mode, for statements such as CREATE INDEX CONCURRENTLY that
+        cannot run inside a transaction block."""
+        with self._checkout() as conn:
+            conn.autocommit = True
+            cursor = conn.cursor()
+            try:
+                return work(cursor)
+            finally:
+                cursor.close()
+                if not conn.closed:
+                    conn.autocommit = False
+
+    def pool_stats(self) -> Dict[str, float]:
+        """Returns a snapshot of connection checkout and wait-time metrics."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["avg_wait_seconds"] = stats["total_wait_seconds"] / stats["checkouts"] if stats["checkouts"] else 0.0
+        return stats
+
     def _initialize_pgvector_extension(self):
         """Creates pgvector extension if it does not exist."""
-        self.cursor.execute("CREATE EXTENSION IF NOT EXISTS vector;")
-        self.conn.commit()
+        self._run(lambda cursor: cursor.execute("CREATE EXTENSION IF NOT EXISTS vector;"))
+
+    def _index_name(self, table_name: str, level: Optional[int] = None) -> str:
+        if level is not None:
+            return f"{table_name}_embedding_l{level}_idx"
+        return f"{table_name}_embedding_idx"
+
+    def _create_index_query(
+        self, table_name: str, level: Optional[int] = None, index_name: Optional[str] = None, concurrently: bool = False
+    ) -> str:
+        """Builds the ANN index DDL for a table, matching the operator class to the distance metric.
+
+        With a `level`, the index is partial and only covers chunks visible at that access level.
+        """
+        if self.index_type == "hnsw":
+            params = f"m = {int(self.hnsw_m)}, ef_construction = {int(self.hnsw_ef_construction)}"
+        else:
+            params = f"lists = {int(self.ivfflat_lists)}"
+        predicate = f" WHERE access_level <= {int(level)}" if level is not None else ""
+        return (
+            f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS "
+            f"{index_name or self._index_name(table_name, level)} ON {table_name} "
+            f"USING {self.index_type} (embedding {self.operator_class}) WITH ({params}){predicate};"
+        )
+
+    def _index_targets(self, levels: Optional[List[int]] = None) -> List[tuple]:
+        """Lists the (table, partial index level) pairs that carry an ANN index in the current storage mode."""
+        levels = levels or range(1, self.total_access_levels + 1)
+        if self.storage_mode == "per_level":
+            return [(f"index_l{level}", None) for level in levels]
+        if self.filter_strategy == "partial":
+            return [(CHUNK_TABLE, level) for level in levels]
+        return [(CHUNK_TABLE, None)]
+
+    def _apply_search_params(self, cursor, ef_search: Optional[int] = None, probes: Optional[int] = None):
+        """Sets the index search parameters for the current transaction only."""
+        iterative = self.storage_mode == "single_table" and self.filter_strategy == "iterative"
+        if self.index_type == "hnsw":
+            cursor.execute("SET LOCAL hnsw.ef_search = %s;", (ef_search or self.ef_search,))
+            if iterative:
+                cursor.execute("SET LOCAL hnsw.iterative_scan = relaxed_order;")
+        elif self.index_type == "ivfflat":
+            cursor.execute("SET LOCAL ivfflat.probes = %s;", (probes or self.probes,))
+            if iterative:
+                cursor.execute("SET LOCAL ivfflat.iterative_scan = relaxed_order;")
 
     def _initialize_tables(self):
-        """Creates tables for each access level if they do not exist."""
-        for level in range(1, self.total_access_levels + 1):
-            table_name = f"index_l{level}"
-            create_table_query = f"""
-            CREATE TABLE IF NOT EXISTS {table_name} (
-                id SERIAL PRIMARY KEY,
-                item_id TEXT UNIQUE,
-                embedding VECTOR({self.dimension}),
-                text_content TEXT
+        """Creates the chunk tables of the current storage mode, plus their ANN indexes, if they do not exist."""
+        def create_tables(cursor):
+            if self.storage_mode == "single_table":
+                cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {CHUNK_TABLE} (
+                    id SERIAL PRIMARY KEY,
+                    item_id TEXT UNIQUE,
+                    access_level INTEGER NOT NULL,
+                    embedding VECTOR({self.dimension}),
+                    text_content TEXT,
+                    document_id TEXT
+                );
+                """)
+            else:
+                for level in range(1, self.total_access_levels + 1):
+                    table_name = f"index_l{level}"
+                    create_table_query = f"""
+                    CREATE TABLE IF NOT EXISTS {table_name} (
+                        id SERIAL PRIMARY KEY,
+                        item_id TEXT UNIQUE,
+                        embedding VECTOR({self.dimension}),
+                        text_content TEXT,
+                        document_id TEXT
+                    );
+                    """
+                    cursor.execute(create_table_query)
+
+            # ALTER TABLE and CREATE INDEX lock the table even when IF NOT EXISTS makes them a no-op,
+            # so look up what already exists and only run the DDL that is missing
+            chunk_tables = self._chunk_tables()
+            cursor.execute(
+                "SELECT table_name FROM information_schema.columns "
+                "WHERE table_schema = current_schema() AND column_name = 'document_id' AND table_name = ANY(%s);",
+                (chunk_tables,)
+            )
+            tracked_tables = {row[0] for row in cursor.fetchall()}
+            cursor.execute(
+                "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = ANY(%s);",
+                (chunk_tables,)
+            )
+            existing_indexes = {row[0] for row in cursor.fetchall()}
+
+            # tables created before chunks were tracked per document lack the column
+            for table_name in chunk_tables:
+                if table_name not in tracked_tables:
+                    cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS document_id TEXT;")
+                if f"{table_name}_document_id_idx" not in existing_indexes:
+                    cursor.execute(f"CREATE INDEX IF NOT EXISTS {table_name}_document_id_idx ON {table_name} (document_id);")
+
+            if self.index_type is not None:
+                for table_name, level in self._index_targets():
+                    if self._index_name(table_name, level) not in existing_indexes:
+                        cursor.execute(self._create_index_query(table_name, level))
+
+            cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {EMBEDDING_CACHE_TABLE} (
+                content_hash TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                embedding VECTOR({self.dimension}) NOT NULL,
+                created_at TIMESTAMPTZ DEFAULT NOW()
             );
-            """
-            self.cursor.execute(create_table_query)
-        self.conn.commit()
-
-    def upsert_vectors(self, vectors: List[Dict[str, Any]], level: int):
-        """Inserts vectors into the PostgreSQL table for the given level and duplicates them in higher levels."""
-        for lvl in range(level, self.total_access_levels + 1):  # Start from the specified level up to the highest level
-            table_name = f"index_l{lvl}"
-            for vector in vectors:
-                item_id = vector['id']
-                embedding = vector['values']
-                text_content = vector.get('text_content', '')
-                self.cursor.execute(
-                    f"INSERT INTO {table_name} (item_id, embedding, text_content) VALUES (%s, %s, %s) "
-                    f"ON CONFLICT (item_id) DO UPDATE SET embedding = EXCLUDED.embedding, text_content = EXCLUDED.text_content;",
-                    (item_id, embedding, text_content)
+            """)
+
+        self._run(create_tables)
+
+    def _chunk_tables(self) -> List[str]:
+        if self.storage_mode == "single_table":
+            return [CHUNK_TABLE]
+        return [f"index_l{level}" for level in range(1, self.total_access_levels + 1)]
+
+    def rebuild_indexes(self, levels: Optional[List[int]] = None):
+        """Rebuilds the ANN indexes of the given access levels with the current build parameters.
+
+        Run this after changing the index type, distance metric or build parameters, and after bulk
+        ingestion when using IVFFlat, whose list centroids are only computed from the rows present at build time.
+
+        Each new index is built CONCURRENTLY under a temporary name, so writes keep flowing and queries keep
+        using the old index during the build; the old index is then dropped and the new one renamed in a
+        short transaction. Disk space for both indexes is needed while the new one is built.
+        """
+        if self.index_type is None:
+            raise ValueError("No index type configured to rebuild.")
+
+        for table_name, level in self._index_targets(levels):
+            index_name = self._index_name(table_name, level)
+            new_index_name = f"{index_name}_new"
+
+            def build(cursor):
+                # an interrupted rebuild leaves an invalid index behind under the temporary name
+                cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {new_index_name};")
+                cursor.execute(self._create_index_query(table_name, level, index_name=new_index_name, concurrently=True))
+
+            def swap(cursor):
+                cursor.execute(f"DROP INDEX IF EXISTS {index_name};")
+                cursor.execute(f"ALTER INDEX {new_index_name} RENAME TO {index_name};")
+
+            start = time.perf_counter()
+            self._run_outside_transaction(build)
+            self._run(swap)
+            self.logger.bind(index=index_name, seconds=round(time.perf_counter() - start, 3)).info("rebuilt vector index")
+
+    def migrate_to_single_table(self, drop_legacy_tables: bool = False) -> int:
+        """Collapses the per-level index_l{level} tables into the single chunk table and returns the rows written.
+
+        Each chunk keeps the lowest level it was stored at, and its document_id where the level table has one.
+        Chunks that share an item_id but not their text (ids were per-document ordinals, so different documents
+        collided) get a `@l{level}` suffix.
+        """
+        if self.storage_mode != "single_table":
+            raise ValueError("Migration requires the handler to run in single_table storage mode.")
+
+        def migrate(cursor):
+            levels = []
+            for level in range(1, self.total_access_levels + 1):
+                cursor.execute("SELECT to_regclass(%s);", (f"index_l{level}",))
+                if cursor.fetchone()[0] is not None:
+                    levels.append(level)
+            if not levels:
+                return 0
+
+            # level tables no handler has opened since chunks were tracked per document lack the column
+            cursor.execute(
+                "SELECT table_name FROM information_schema.columns "
+                "WHERE table_schema = current_schema() AND column_name = 'document_id' AND table_name = ANY(%s);",
+                ([f"index_l{level}" for level in levels],)
+            )
+            tracked_tables = {row[0] for row in cursor.fetchall()}
+
+            legacy_rows = " UNION ALL ".join(
+                f"SELECT {level} AS access_level, item_id, embedding, text_content, "
+                f"{'document_id' if f'index_l{level}' in tracked_tables else 'NULL::text'} AS document_id "
+                f"FROM index_l{level}"
+                for level in levels
+            )
+            cursor.execute(f"""
+            WITH collapsed AS (
+                SELECT DISTINCT ON (item_id, md5(coalesce(text_content, '')))
+                       access_level, item_id, embedding, text_content, document_id
+                FROM ({legacy_rows}) AS legacy
+                ORDER BY item_id, md5(coalesce(text_content, '')), access_level
+            )
+            INSERT INTO {CHUNK_TABLE} (item_id, access_level, embedding, text_content, document_id)
+            SELECT CASE WHEN count(*) OVER (PARTITION BY item_id) > 1 THEN item_id || '@l' || access_level ELSE item_id END,
+                   access_level, embedding, text_content, document_id
+            FROM collapsed
+            ON CONFLICT (item_id) DO NOTHING;
+            """)
+            migrated = cursor.rowcount
+
+            if drop_legacy_tables:
+                for level in levels:
+                    cursor.execute(f"DROP TABLE index_l{level};")
+            return migrated
+
+        migrated = self._run(migrate)
+        self.logger.bind(rows=migrated, dropped_legacy=drop_legacy_tables).info("migrated vectors to single chunk table")
+        return migrated
+
+    def delete_untracked_chunks(self) -> int:
+        """Deletes the chunks that carry no document_id and returns how many were removed.
+
+        Those were stored before vectors were tracked per document (under per-document ordinal ids), so
+        re-indexing a document never replaces them. Only run this once every document has been re-indexed,
+        or their content drops out of search until it is.
+        """
+        def delete(cursor):
+            deleted = 0
+            for table_name in self._chunk_tables():
+                cursor.execute(f"DELETE FROM {table_name} WHERE document_id IS NULL;")
+                deleted += cursor.rowcount
+            return deleted
+
+        deleted = self._run(delete)
+        self.logger.bind(rows=deleted, storage_mode=self.storage_mode).info("deleted untracked chunks")
+        return deleted
+
+    @staticmethod
+    def _vector_literal(values) -> str:
+        """Formats an embedding as pgvector text input, which is smaller and cheaper to parse than an ARRAY[...] cast."""
+        return "[" + ",".join(str(float(value)) for value in values) + "]"
+
+    def _vector_rows(self, vectors: List[Dict[str, Any]], document_id: Optional[str]) -> List[tuple]:
+        # a multi-row upsert cannot touch the same row twice, so keep only the last vector per id
+        unique_vectors = list({vector['id']: vector for vector in vectors}.values())
+        return [
+            (vector['id'], self._vector_literal(vector['values']), vector.get('text_content', ''), document_id)
+            for vector in unique_vectors
+        ]
+
+    def _upsert_statements(self, level: int) -> List[tuple]:
+        """Returns (statement, template) pairs writing rows visible from `level` upwards."""
+        if self.storage_mode == "single_table":
+            return [(
+                f"INSERT INTO {CHUNK_TABLE} (item_id, access_level, embedding, text_content, document_id) VALUES %s "
+                f"ON CONFLICT (item_id) DO UPDATE SET access_level = EXCLUDED.access_level, "
+                f"embedding = EXCLUDED.embedding, text_content = EXCLUDED.text_content, document_id = EXCLUDED.document_id;",
+                f"(%s, {int(level)}, %s::vector, %s, %s)",
+            )]
+        return [
+            (
+                f"INSERT INTO index_l{lvl} (item_id, embedding, text_content, document_id) VALUES %s "
+                f"ON CONFLICT (item_id) DO UPDATE SET embedding = EXCLUDED.embedding, "
+                f"text_content = EXCLUDED.text_content, document_id = EXCLUDED.document_id;",
+                "(%s, %s::vector, %s, %s)",
+            )
+            for lvl in range(level, self.total_access_levels + 1)  # Start from the specified level up to the highest level
+        ]
+
+    @staticmethod
+    def _write_rows(cursor, rows: List[tuple], statements: List[tuple], batch_size: int):
+        for statement, template in statements:
+            for start in range(0, len(rows), batch_size):
+                execute_values(cursor, statement, rows[start:start + batch_size], template=template, page_size=batch_size)
+
+    def upsert_vectors(
+        self, vectors: List[Dict[str, Any]], level: int, batch_size: int = 500, document_id: Optional[str] = None
+    ) -> int:
+        """Stores vectors visible from the given access level upwards and returns the number of rows written.
+
+        In per_level mode they are written to the table of the given level and duplicated in higher levels;
+        in single_table mode each vector is written once, tagged with its access level.
+        Rows are sent as multi-row INSERT ... ON CONFLICT statements of `batch_size` rows, all in one transaction,
+        so a document is either fully stored or not at all.
+        """
+        rows = self._vector_rows(vectors, document_id)
+        statements = self._upsert_statements(level)
+
+        start = time.perf_counter()
+        self._run(lambda cursor: self._write_rows(cursor, rows, statements, batch_size))
+        elapsed = time.perf_counter() - start
+
+        written = len(rows) * len(statements)
+        self.logger.bind(
+            rows=written,
+            seconds=round(elapsed, 3),
+            rows_per_second=round(written / elapsed, 1) if elapsed > 0 else None,
+        ).info("upserted vectors")
+        return written
+
+    def missing_item_ids(self, document_id: str, item_ids: List[str], level: int) -> Set[str]:
+        """Returns the ids among `item_ids` that are not yet stored for the document everywhere `level` requires."""
+        if self.storage_mode == "single_table":
+            tables = [CHUNK_TABLE]
+        else:
+            tables = [f"index_l{lvl}" for lvl in range(level, self.total_access_levels + 1)]
+
+        def lookup(cursor):
+            missing = set()
+            for table_name in tables:
+                cursor.execute(f"SELECT item_id FROM {table_name} WHERE document_id = %s;", (document_id,))
+                stored = {row[0] for row in cursor.fetchall()}
+                missing.update(item_id for item_id in item_ids if item_id not in stored)
+            return missing
+
+        return self._run(lookup)
+
+    def sync_document_vectors(
+        self,
+        document_id: str,
+        vectors: List[Dict[str, Any]],
+        item_ids: List[str],
+        level: int,
+        batch_size: int = 500,
+    ) -> Dict[str, int]:
+        """Makes the document's stored chunks exactly `item_ids` at the given access level, in one transaction.
+
+        `vectors` only needs to hold the chunks reported by `missing_item_ids`; rows that are already stored
+        are left untouched, rows of the document not in `item_ids` (or below `level`) are deleted.
+        """
+        rows = self._vector_rows(vectors, document_id)
+        statements = self._upsert_statements(level)
+
+        def sync(cursor):
+            deleted = 0
+            if self.storage_mode == "single_table":
+                cursor.execute(
+                    f"DELETE FROM {CHUNK_TABLE} WHERE document_id = %s AND NOT (item_id = ANY(%s));",
+                    (document_id, item_ids)
                 )
-        self.conn.commit()
+                deleted += cursor.rowcount
+                cursor.execute(
+                    f"UPDATE {CHUNK_TABLE} SET access_level = %s WHERE document_id = %s AND access_level <> %s;",
+                    (level, document_id, level)
+                )
+            else:
+                for lvl in range(1, self.total_access_levels + 1):
+                    if lvl < level:
+                        cursor.execute(f"DELETE FROM index_l{lvl} WHERE document_id = %s;", (document_id,))
+                    else:
+                        cursor.execute(
+                            f"DELETE FROM index_l{lvl} WHERE document_id = %s AND NOT (item_id = ANY(%s));",
+                            (document_id, item_ids)
+                        )
+                    deleted += cursor.rowcount
+            self._write_rows(cursor, rows, statements, batch_size)
+            return deleted
+
+        deleted = self._run(sync)
+        result = {"written": len(rows) * len(statements), "deleted": deleted}
+        self.logger.bind(document_id=document_id, chunks=len(item_ids), **result).info("synced document vectors")
+        return result
+
+    def get_cached_embeddings(self, content_hashes: List[str], batch_size: int = 1000) -> Dict[str, List[float]]:
+        """Returns the stored embeddings for the given content hashes; unknown hashes are absent from the result."""
+        def lookup(cursor):
+            found = {}
+            for start in range(0, len(content_hashes), batch_size):
+                cursor.execute(
+                    f"SELECT content_hash, embedding::real[] FROM {EMBEDDING_CACHE_TABLE} WHERE content_hash = ANY(%s);",
+                    (content_hashes[start:start + batch_size],)
+                )
+                found.update({content_hash: list(embedding) for content_hash, embedding in cursor.fetchall()})
+            return found
+
+        if not content_hashes:
+            return {}
+        return self._run(lookup)
+
+    def store_cached_embeddings(self, embeddings: Dict[str, List[float]], model: str, batch_size: int = 500):
+        """Persists embeddings by content hash so identical chunks can reuse them later."""
+        rows = [(content_hash, model, self._vector_literal(values)) for content_hash, values in embeddings.items()]
+
+        def store(cursor):
+            execute_values(
+                cursor,
+                f"INSERT INTO {EMBEDDING_CACHE_TABLE} (content_hash, model, embedding) VALUES %s "
+                f"ON CONFLICT (content_hash) DO NOTHING;",
+                rows,
+                template="(%s, %s, %s::vector)",
+                page_size=batch_size,
+            )
+
+        if rows:
+            self._run(store)
+
+    def query(self, vector, access_level: int, top_k: int = 10, ef_search: Optional[int] = None, probes: Optional[int] = None):
+        """Queries only the table corresponding to the specified access level using the configured distance metric.
+
+        `ef_search` (HNSW) and `probes` (IVFFlat) override the handler defaults for this query, trading latency for recall.
+        """
+        if self.storage_mode == "single_table":
+            return self._query_single_table(vector, access_level, top_k, ef_search, probes)
 
-    def query(self, vector, access_level: int, top_k: int = 10):
-        """Queries only the table corresponding to the specified access level using cosine similarity."""
         table_name = f"index_l{access_level}"
-        self.cursor.execute(
-            f"""
-            SELECT item_id, text_content, embedding <-> %s::vector AS distance
+
+        def search(cursor):
+            self._apply_search_params(cursor, ef_search, probes)
+            cursor.execute(
+                f"""
+            SELECT item_id, text_content, embedding {self.distance_operator} %s::vector AS distance
             FROM {table_name}
             ORDER BY distance
             LIMIT %s;
             """,
-            (vector, top_k)
-        )
-        return self.cursor.fetchall()
+                (vector, top_k)
+            )
+            return cursor.fetchall()
+
+        return self._run(search)
+
+    def _query_single_table(self, vector, access_level: int, top_k: int, ef_search: Optional[int], probes: Optional[int]):
+        """Filtered ANN search over the single chunk table.
+
+        The level is inlined as a literal so the planner can match it to the partial index of that level.
+        Iterative scans may return rows slightly out of order, so results are re-sorted.
+        """
+        access_level = int(access_level)
+
+        def search(cursor):
+            self._apply_search_params(cursor, ef_search, probes)
+            cursor.execute(
+                f"""
+            WITH candidates AS MATERIALIZED (
+                SELECT item_id, text_content, embedding {self.distance_operator} %s::vector AS distance
+                FROM {CHUNK_TABLE}
+                WHERE access_level <= {access_level}
+                ORDER BY distance
+                LIMIT %s
+            )
+            SELECT item_id, text_content, distance FROM candidates ORDER BY distance;
+            """,
+                (vector, top_k)
+            )
+            return cursor.fetchall()
+
+        return self._run(search)
 
     def close(self):
-        """Closes the database connection."""
-        self.cursor.close()
-        self.conn.close()
+        """Closes every pooled database connection."""
+        self.pool.closeall()
 
 
 if __name__ == "__main__":  # pragma: no cover
@@ -1,42 +1,110 @@
+import hashlib
 import os
-from typing import List
+from typing import Dict, List, Optional
 
 import openai
+from loguru import logger
 
 from rag.parsing.parsing_pdf import PDFProcessor
+from rag.vectordb.batch_embedder import BatchEmbedder, content_hash
 from rag.vectordb.postgres_handler import PostgresHandler
 
 
+def chunk_ids(nodes: List[str], document_id: Optional[str] = None) -> List[str]:
+    """Deterministic chunk ids: `{document_id}:{ordinal}:{text hash}`.
+
+    The ordinal counts earlier chunks with the same text rather than all earlier chunks, so repeated
+    chunks stay distinct while inserting or removing a page does not renumber every chunk after it.
+    """
+    seen: Dict[str, int] = {}
+    ids = []
+    for node in nodes:
+        text_hash = hashlib.sha256(node.encode()).hexdigest()[:16]
+        ordinal = seen.get(text_hash, 0)
+        seen[text_hash] = ordinal + 1
+        ids.append(f"{document_id}:{ordinal}:{text_hash}" if document_id else f"{ordinal}:{text_hash}")
+    return ids
+
+
 class PostgresNodeStorage:
     """Orchestrates the storage of document nodes into PostgreSQL (pgvector) via embedding vectors."""
 
-    def __init__(self, postgres_handler: PostgresHandler):
+    def __init__(
+        self,
+        postgres_handler: PostgresHandler,
+        embedder: Optional[BatchEmbedder] = None,
+        use_embedding_cache: bool = True,
+    ):
         self.postgres_handler = postgres_handler
+        self.embedder = embedder if embedder is not None else BatchEmbedder()
+        self.use_embedding_cache = use_embedding_cache
+        self.stats = {"chunks": 0, "reused": 0, "embedded": 0}
+        self.logger = logger.bind(service="PostgresNodeStorage")
+
+    def _embed_nodes(self, nodes: List[str]) -> List[List[float]]:
+        """Embeds the nodes, reusing persisted vectors of byte-identical chunks and only calling the API for the rest."""
+        if not self.use_embedding_cache:
+            embeddings = self.embedder.embed(nodes)
+            self._record_stats(len(nodes), reused=0, embedded=len(nodes))
+            return embeddings
+
+        hashes = [content_hash(node, self.embedder.model, self.postgres_handler.dimension) for node in nodes]
+        by_hash: Dict[str, List[float]] = self.postgres_handler.get_cached_embeddings(list(dict.fromkeys(hashes)))
+        reused = sum(1 for content_hash_ in hashes if content_hash_ in by_hash)
+
+        # identical chunks within the document are embedded once
+        missing = {content_hash_: node for content_hash_, node in zip(hashes, nodes) if content_hash_ not in by_hash}
+        if missing:
+            fresh = dict(zip(missing.keys(), self.embedder.embed(list(missing.values()))))
+            self.postgres_handler.store_cached_embeddings(fresh, self.embedder.model)
+            by_hash.update(fresh)
 
-    def _embed_node(self, node_text: str):
-        """Converts node text into a vector using OpenAI's text-embedding-3-small model."""
-        response = openai.embeddings.create(
-            input=node_text,
-            model="text-embedding-3-small"
-        )
-        return response.data[0].embedding
-
-    def store_nodes(self, nodes: List[str], access_level: int):
-        """Stores the nodes as vectors in PostgreSQL for the given access level and duplicates them in higher levels."""
-        vectors = []
-        for i, node in enumerate(nodes):
-            vector = self._embed_node(node)
-            vectors.append({
-                "id": str(i), 
-                "values": vector, 
-                "text_content": node
-            })
-            
-        if not vectors:
+        self._record_stats(len(nodes), reused=reused, embedded=len(missing))
+        return [by_hash[content_hash_] for content_hash_ in hashes]
+
+    def _record_stats(self, chunks: int, reused: int, embedded: int):
+        self.stats["chunks"] += chunks
+        self.stats["reused"] += reused
+        self.stats["embedded"] += embedded
+        self.logger.bind(
+            chunks=chunks, reused=reused, embedded=embedded, reuse_ratio=round(reused / chunks, 3)
+        ).info("embedded nodes")
+
+    def reuse_ratio(self) -> float:
+        """Share of chunks stored so far whose embedding came from the persistent cache."""
+        return self.stats["reused"] / self.stats["chunks"] if self.stats["chunks"] else 0.0
+
+    def store_nodes(self, nodes: List[str], access_level: int, document_id: Optional[str] = None):
+        """Stores the nodes as vectors in PostgreSQL for the given access level and duplicates them in higher levels.
+
+        With a `document_id` the nodes replace the document's previously stored chunks: only chunks that are not
+        stored yet are embedded and written, and chunks that no longer occur in the document are deleted.
+        """
+        if not nodes:
             raise ValueError("No vectors to store.")
 
+        ids = chunk_ids(nodes, document_id)
+        if document_id is None:
+            changed = list(range(len(nodes)))
+        else:
+            missing = self.postgres_handler.missing_item_ids(document_id, ids, access_level)
+            changed = [i for i, item_id in enumerate(ids) if item_id in missing]
+
+        embeddings = self._embed_nodes([nodes[i] for i in changed]) if changed else []
+        vectors = [
+            {
+                "id": ids[i],
+                "values": vector,
+                "text_content": nodes[i]
+            }
+            for i, vector in zip(changed, embeddings)
+        ]
+
         # Store vectors in tables for the given access level and higher levels
-        self.postgres_handler.upsert_vectors(vectors, access_level)
+        if document_id is None:
+            self.postgres_handler.upsert_vectors(vectors, access_level)
+        else:
+            self.postgres_handler.sync_document_vectors(document_id, vectors, ids, access_level)
 
 if __name__ == "__main__":  # pragma: no cover
     POSTGRES_DB = os.getenv("POSTGRES_DB")
@@ -0,0 +1,52 @@
+# python -m rag.vectordb.reindex --levels 1 2
+import argparse
+import os
+
+from rag.vectordb.postgres_handler import INDEX_TYPES, PostgresHandler
+
+
+def parse_args(argv=None):
+    # the distance metric always comes from VECTOR_DISTANCE_METRIC, the one the app queries with;
+    # the other settings default to their VECTOR_* configuration too
+    parser = argparse.ArgumentParser(
+        description="Rebuild the ANN indexes of the vector chunk tables. Each index is built concurrently and then "
+        "swapped in, so searches and writes keep working, but a build takes minutes on a large corpus and needs "
+        "disk space for both the old and the new index until the swap."
+    )
+    parser.add_argument("--index-type", choices=INDEX_TYPES, help="default: VECTOR_INDEX_TYPE")
+    parser.add_argument("--m", type=int, help="HNSW: max connections per layer (default: VECTOR_HNSW_M)")
+    parser.add_argument(
+        "--ef-construction", type=int,
+        help="HNSW: candidate list size while building (default: VECTOR_HNSW_EF_CONSTRUCTION)",
+    )
+    parser.add_argument("--lists", type=int, help="IVFFlat: number of inverted lists (default: VECTOR_IVFFLAT_LISTS)")
+    parser.add_argument("--levels", type=int, nargs="*", help="access levels to rebuild (default: all)")
+    return parser.parse_args(argv)
+
+
+def rebuild(args) -> PostgresHandler:
+    postgres_handler = PostgresHandler(
+        db_name=os.getenv("POSTGRES_DB"),
+        user=os.getenv("POSTGRES_USER"),
+        password=os.getenv("POSTGRES_PASSWORD"),
+        host=os.getenv("POSTGRES_HOST"),
+        port=int(os.getenv("POSTGRES_PORT", 5432)),
+        dimension=1536,
+        min_connections=1,
+        max_connections=1,
+        index_type=args.index_type,
+        hnsw_m=args.m,
+        hnsw_ef_construction=args.ef_construction,
+        ivfflat_lists=args.lists,
+    )
+    postgres_handler.rebuild_indexes(levels=args.levels)
+    return postgres_handler
+
+
+if __name__ == "__main__":  # pragma: no cover
+    if not (os.getenv("POSTGRES_DB") and os.getenv("POSTGRES_USER") and os.getenv("POSTGRES_PASSWORD")):
+        raise EnvironmentError("PostgreSQL credentials must be set.")
+
+    handler = rebuild(parse_args())
+    print(f"Rebuilt {handler.index_type} ({handler.distance_metric}) indexes.")
+    handler.close()
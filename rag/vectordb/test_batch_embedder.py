@@ -0,0 +1,112 @@
+from unittest.mock import MagicMock
+
+import httpx
+import openai
+import pytest
+
+from rag.vectordb.batch_embedder import BatchEmbedder, TokenBudget, content_hash, estimate_tokens
+
+
+def make_response(batch):
+    """Returns a fake embeddings response with one vector per input, encoding the input text length."""
+    return MagicMock(data=[MagicMock(embedding=[float(len(text))]) for text in batch])
+
+def make_rate_limit_error(retry_after=None):
+    headers = {"retry-after": retry_after} if retry_after else {}
+    response = httpx.Response(429, headers=headers, request=httpx.Request("POST", "https://api.openai.com/v1/embeddings"))
+    return openai.RateLimitError("Rate limit reached", response=response, body=None)
+
+@pytest.fixture
+def mock_openai_embed(mocker):
+    mock_embed = mocker.patch("openai.embeddings.create")
+    mock_embed.side_effect = lambda input, model: make_response(input)
+    return mock_embed
+
+@pytest.fixture
+def mock_sleep(mocker):
+    return mocker.patch("rag.vectordb.batch_embedder.time.sleep")
+
+
+def test_embed_splits_into_batches_and_keeps_order(mock_openai_embed):
+    embedder = BatchEmbedder(batch_size=2, max_concurrency=3)
+    texts = ["a", "bb", "ccc", "dddd", "eeeee"]
+
+    embeddings = embedder.embed(texts)
+
+    assert embeddings == [[1.0], [2.0], [3.0], [4.0], [5.0]]
+    assert mock_openai_embed.call_count == 3
+    mock_openai_embed.assert_any_call(input=["a", "bb"], model="text-embedding-3-small")
+    mock_openai_embed.assert_any_call(input=["eeeee"], model="text-embedding-3-small")
+
+def test_embed_empty_input(mock_openai_embed):
+    assert BatchEmbedder().embed([]) == []
+    mock_openai_embed.assert_not_called()
+
+def test_embed_retries_rate_limits(mock_openai_embed, mock_sleep):
+    mock_openai_embed.side_effect = [make_rate_limit_error(retry_after="2"), make_response(["a"])]
+
+    embeddings = BatchEmbedder(max_retries=2).embed(["a"])
+
+    assert embeddings == [[1.0]]
+    assert mock_openai_embed.call_count == 2
+    mock_sleep.assert_called_once_with(2.0)
+
+def test_embed_gives_up_after_max_retries(mock_openai_embed, mock_sleep):
+    mock_openai_embed.side_effect = make_rate_limit_error()
+
+    with pytest.raises(openai.RateLimitError):
+        BatchEmbedder(max_retries=2, initial_backoff=0.5).embed(["a"])
+
+    assert mock_openai_embed.call_count == 3
+    assert mock_sleep.call_count == 2
+
+def test_embed_does_not_retry_other_errors(mock_openai_embed, mock_sleep):
+    mock_openai_embed.side_effect = Exception("OpenAI error")
+
+    with pytest.raises(Exception, match="OpenAI error"):
+        BatchEmbedder().embed(["a"])
+
+    mock_sleep.assert_not_called()
+
+def test_embed_rejects_mismatched_response(mock_openai_embed):
+    mock_openai_embed.side_effect = lambda input, model: make_response(input[:1])
+
+    with pytest.raises(ValueError, match="Expected 2 embeddings, got 1."):
+        BatchEmbedder().embed(["a", "b"])
+
+def test_embed_acquires_token_budget(mock_openai_embed, mocker):
+    embedder = BatchEmbedder(batch_size=1, max_concurrency=1, tokens_per_minute=1000)
+    acquire = mocker.spy(embedder.budget, "acquire")
+
+    embedder.embed(["x" * 40, "y" * 8])
+
+    assert [c.args[0] for c in acquire.call_args_list] == [10, 2]
+
+def test_invalid_batch_settings():
+    with pytest.raises(ValueError, match="at least 1"):
+        BatchEmbedder(batch_size=0)
+
+def test_token_budget_waits_for_refill(mocker, mock_sleep):
+    mock_time = mocker.patch("rag.vectordb.batch_embedder.time.monotonic", return_value=0.0)
+    budget = TokenBudget(tokens_per_minute=600)
+    budget.acquire(600)
+
+    def advance(seconds):
+        mock_time.return_value += seconds
+    mock_sleep.side_effect = advance
+
+    budget.acquire(60)
+
+    # 60 tokens at 600 tokens/minute take 6 seconds to refill
+    mock_sleep.assert_called_once_with(pytest.approx(6.0))
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 1
+    assert estimate_tokens("a" * 400) == 100
+
+def test_content_hash_depends_on_text_model_and_dimension():
+    base = content_hash("chunk", "text-embedding-3-small", 1536)
+    assert base == content_hash("chunk", "text-embedding-3-small", 1536)
+    assert base != content_hash("chunk ", "text-embedding-3-small", 1536)
+    assert base != content_hash("chunk", "text-embedding-3-large", 1536)
+    assert base != content_hash("chunk", "text-embedding-3-small", 512)
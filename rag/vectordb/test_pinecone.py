@@ -26,13 +26,16 @@ def test_pinecone_node_storage_happy_path(mock_pinecone_handler, mock_openai_emb
     """Test storing nodes in Pinecone with proper embeddings."""
     storage = PineconeNodeStorage(pinecone_handler=mock_pinecone_handler)
     nodes = ["This is a test node", "Another test node"]
+    mock_openai_embed.return_value = MagicMock(
+        data=[MagicMock(embedding=[0.1, 0.2, 0.3]), MagicMock(embedding=[0.1, 0.2, 0.3])]
+    )
     
     storage.store_nodes(nodes)
 
-    # Verify that OpenAI embedding is called twice (for two nodes)
-    assert mock_openai_embed.call_count == 2
-    mock_openai_embed.assert_any_call(input="This is a test node", model="text-embedding-3-small")
-    mock_openai_embed.assert_any_call(input="Another test node", model="text-embedding-3-small")
+    # Verify that both nodes are embedded in a single batched request
+    mock_openai_embed.assert_called_once_with(
+        input=["This is a test node", "Another test node"], model="text-embedding-3-small"
+    )
     
     # Verify that vectors were upserted into Pinecone
     mock_pinecone_handler.upsert_vectors.assert_called_once()
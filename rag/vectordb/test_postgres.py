@@ -1,16 +1,26 @@
 import os
 from unittest.mock import MagicMock, call, create_autospec, patch
 
+import psycopg2
+import psycopg2.pool
 import pytest
 
 from rag.vectordb.postgres_handler import PostgresHandler
-from rag.vectordb.postgres_node_storage import PostgresNodeStorage
+from rag.vectordb.batch_embedder import content_hash
+from rag.vectordb.delete_untracked import delete_untracked
+from rag.vectordb.delete_untracked import parse_args as parse_delete_untracked_args
+from rag.vectordb.migrate_single_table import migrate
+from rag.vectordb.migrate_single_table import parse_args as parse_migrate_args
+from rag.vectordb.postgres_node_storage import PostgresNodeStorage, chunk_ids
+from rag.vectordb.reindex import parse_args, rebuild
 
 
 @pytest.fixture
 def mock_postgres_handler():
     """Mock PostgresHandler for testing."""
     handler = create_autospec(PostgresHandler)
+    handler.dimension = 1536
+    handler.get_cached_embeddings.return_value = {}
     return handler
 
 @pytest.fixture
@@ -44,13 +54,16 @@ def test_postgres_node_storage_happy_path(mock_postgres_handler, mock_openai_emb
     """Test storing nodes in Postgres with proper embeddings."""
     storage = PostgresNodeStorage(postgres_handler=mock_postgres_handler)
     nodes = ["This is a test node", "Another test node"]
+    mock_openai_embed.return_value = MagicMock(
+        data=[MagicMock(embedding=[0.1, 0.2, 0.3]), MagicMock(embedding=[0.1, 0.2, 0.3])]
+    )
     
     storage.store_nodes(nodes, access_level=2)
 
-    # Verify that OpenAI embedding is called twice (for two nodes)
-    assert mock_openai_embed.call_count == 2
-    mock_openai_embed.assert_any_call(input="This is a test node", model="text-embedding-3-small")
-    mock_openai_embed.assert_any_call(input="Another test node", model="text-embedding-3-small")
+    # Verify that both nodes are embedded in a single batched request
+    mock_openai_embed.assert_called_once_with(
+        input=["This is a test node", "Another test node"], model="text-embedding-3-small"
+    )
     
     # Verify that vectors were upserted into Postgres
     mock_postgres_handler.upsert_vectors.assert_called_once()
@@ -86,6 +99,72 @@ def test_postgres_node_storage_openai_failure(mock_postgres_handler, mocker):
     # Ensure no vectors are upserted since embedding failed
     mock_postgres_handler.upsert_vectors.assert_not_called()
 
+def test_postgres_node_storage_reuses_cached_embeddings(mock_postgres_handler, mock_openai_embed):
+    """Test that unchanged chunks reuse stored embeddings and only new chunks are embedded."""
+    storage = PostgresNodeStorage(postgres_handler=mock_postgres_handler)
+    cached_hash = content_hash("Unchanged node", "text-embedding-3-small", 1536)
+    mock_postgres_handler.get_cached_embeddings.return_value = {cached_hash: [0.9, 0.9, 0.9]}
+
+    storage.store_nodes(["Unchanged node", "New node", "New node"], access_level=1)
+
+    # Duplicate new chunks are embedded once, cached ones not at all
+    mock_openai_embed.assert_called_once_with(input=["New node"], model="text-embedding-3-small")
+    stored = mock_postgres_handler.store_cached_embeddings.call_args[0][0]
+    assert list(stored.values()) == [[0.1, 0.2, 0.3]]
+
+    upserted_vectors = mock_postgres_handler.upsert_vectors.call_args[0][0]
+    assert [vector['values'] for vector in upserted_vectors] == [[0.9, 0.9, 0.9], [0.1, 0.2, 0.3], [0.1, 0.2, 0.3]]
+    assert storage.stats == {"chunks": 3, "reused": 1, "embedded": 1}
+    assert storage.reuse_ratio() == pytest.approx(1 / 3)
+
+def test_postgres_node_storage_without_embedding_cache(mock_postgres_handler, mock_openai_embed):
+    """Test that the persistent cache can be bypassed."""
+    storage = PostgresNodeStorage(postgres_handler=mock_postgres_handler, use_embedding_cache=False)
+
+    storage.store_nodes(["This is a test node"], access_level=1)
+
+    mock_postgres_handler.get_cached_embeddings.assert_not_called()
+    mock_postgres_handler.store_cached_embeddings.assert_not_called()
+    assert storage.reuse_ratio() == 0.0
+
+def test_chunk_ids_are_deterministic():
+    """Test that chunk ids depend on document, text and repeat count, not on position."""
+    ids = chunk_ids(["intro", "body", "intro"], document_id="doc-1")
+
+    assert ids == chunk_ids(["intro", "body", "intro"], document_id="doc-1")
+    assert ids[0].startswith("doc-1:0:") and ids[2].startswith("doc-1:1:")
+    assert len(set(ids)) == 3
+    # inserting a chunk does not renumber the chunks after it
+    assert chunk_ids(["new page", "intro", "body", "intro"], document_id="doc-1")[1:] == ids
+    assert chunk_ids(["intro"], document_id="doc-2")[0] != ids[0]
+    assert chunk_ids(["intro"])[0] == ids[0].split(":", 1)[1]
+
+def test_postgres_node_storage_reindexes_only_changed_chunks(mock_postgres_handler, mock_openai_embed):
+    """Test that re-indexing a document embeds and writes only the chunks that are not stored yet."""
+    storage = PostgresNodeStorage(postgres_handler=mock_postgres_handler)
+    nodes = ["Unchanged page", "Edited page"]
+    ids = chunk_ids(nodes, document_id="doc-1")
+    mock_postgres_handler.missing_item_ids.return_value = {ids[1]}
+
+    storage.store_nodes(nodes, access_level=2, document_id="doc-1")
+
+    mock_postgres_handler.missing_item_ids.assert_called_once_with("doc-1", ids, 2)
+    mock_openai_embed.assert_called_once_with(input=["Edited page"], model="text-embedding-3-small")
+    mock_postgres_handler.upsert_vectors.assert_not_called()
+    document_id, vectors, item_ids, level = mock_postgres_handler.sync_document_vectors.call_args[0]
+    assert (document_id, item_ids, level) == ("doc-1", ids, 2)
+    assert vectors == [{"id": ids[1], "values": [0.1, 0.2, 0.3], "text_content": "Edited page"}]
+
+def test_postgres_node_storage_unchanged_document(mock_postgres_handler, mock_openai_embed):
+    """Test that re-indexing an unchanged document embeds nothing and only prunes stale chunks."""
+    storage = PostgresNodeStorage(postgres_handler=mock_postgres_handler)
+    mock_postgres_handler.missing_item_ids.return_value = set()
+
+    storage.store_nodes(["Same page"], access_level=1, document_id="doc-1")
+
+    mock_openai_embed.assert_not_called()
+    assert mock_postgres_handler.sync_document_vectors.call_args[0][1] == []
+
 
 def test_postgres_handler_query(mock_psycopg2_connect):
     """Test querying vectors from Postgres."""
@@ -122,9 +201,10 @@ def test_postgres_handler_initialization_error(mocker):
     with pytest.raises(Exception, match="Database connection error"):
         PostgresHandler(db_name="test_db", user="user", password=mock_password, host="localhost", port=5432, dimension=1536)
         
-def test_upsert_vectors(mock_psycopg2_connect):
-    """Test the upsert_vectors method to ensure correct insertion of vectors."""
+def test_upsert_vectors(mock_psycopg2_connect, mocker):
+    """Test the upsert_vectors method to ensure correct bulk insertion of vectors."""
     _, mock_cursor = mock_psycopg2_connect
+    mock_execute_values = mocker.patch("rag.vectordb.postgres_handler.execute_values")
 
     with patch.dict(os.environ, {"TOTAL_ACCESS_LEVELS": "5"}):
         handler = PostgresHandler(
@@ -142,18 +222,498 @@ def test_upsert_vectors(mock_psycopg2_connect):
     ]
     level = 2
 
-    handler.upsert_vectors(vectors, level=level)
+    written = handler.upsert_vectors(vectors, level=level)
 
+    rows = [("item1", "[0.1,0.2,0.3]", '', None), ("item2", "[0.4,0.5,0.6]", '', None)]
     insert_calls = [
         call(
-            f"INSERT INTO index_l{lvl} (item_id, embedding, text_content) VALUES (%s, %s, %s) "
-            f"ON CONFLICT (item_id) DO UPDATE SET embedding = EXCLUDED.embedding, text_content = EXCLUDED.text_content;",
-            (vector["id"], vector["values"], '')
+            mock_cursor,
+            f"INSERT INTO index_l{lvl} (item_id, embedding, text_content, document_id) VALUES %s "
+            f"ON CONFLICT (item_id) DO UPDATE SET embedding = EXCLUDED.embedding, "
+            f"text_content = EXCLUDED.text_content, document_id = EXCLUDED.document_id;",
+            rows,
+            template="(%s, %s::vector, %s, %s)",
+            page_size=500
         )
         for lvl in range(level, handler.total_access_levels + 1)
-        for vector in vectors
     ]
 
-    mock_cursor.execute.assert_has_calls(insert_calls, any_order=False)
+    mock_execute_values.assert_has_calls(insert_calls, any_order=False)
+    assert written == 2 * 4
+
+    handler.close()
+
+def test_missing_item_ids(mock_psycopg2_connect):
+    """Test that ids missing from any table the access level writes to are reported."""
+    _, mock_cursor = mock_psycopg2_connect
+    handler = PostgresHandler(db_name="test_db", user="user", password="password", host="localhost", port=5432, dimension=1536)
+    mock_cursor.execute.reset_mock()
+    # level 4 and 5 tables; the level 5 copy of "b" is missing
+    mock_cursor.fetchall.side_effect = [[("a",), ("b",)], [("a",)]]
+
+    assert handler.missing_item_ids("doc-1", ["a", "b", "c"], level=4) == {"b", "c"}
+    mock_cursor.execute.assert_has_calls([
+        call("SELECT item_id FROM index_l4 WHERE document_id = %s;", ("doc-1",)),
+        call("SELECT item_id FROM index_l5 WHERE document_id = %s;", ("doc-1",)),
+    ])
+
+    handler.close()
+
+def test_sync_document_vectors(mock_psycopg2_connect, mocker):
+    """Test that syncing deletes stale and lower-level rows and writes new ones in one transaction."""
+    _, mock_cursor = mock_psycopg2_connect
+    mock_execute_values = mocker.patch("rag.vectordb.postgres_handler.execute_values")
+    handler = PostgresHandler(db_name="test_db", user="user", password="password", host="localhost", port=5432, dimension=1536)
+    mock_conn = mock_psycopg2_connect[0].return_value
+    mock_conn.commit.reset_mock()
+    mock_cursor.execute.reset_mock()
+    mock_cursor.rowcount = 1
+
+    result = handler.sync_document_vectors("doc-1", [{"id": "c", "values": [0.1]}], ["a", "c"], level=4)
+
+    mock_cursor.execute.assert_has_calls([
+        call("DELETE FROM index_l3 WHERE document_id = %s;", ("doc-1",)),
+        call("DELETE FROM index_l4 WHERE document_id = %s AND NOT (item_id = ANY(%s));", ("doc-1", ["a", "c"])),
+        call("DELETE FROM index_l5 WHERE document_id = %s AND NOT (item_id = ANY(%s));", ("doc-1", ["a", "c"])),
+    ])
+    assert [c.args[2] for c in mock_execute_values.call_args_list] == [[("c", "[0.1]", "", "doc-1")]] * 2
+    assert result == {"written": 2, "deleted": 5}
+    mock_conn.commit.assert_called_once()
+
+    handler.close()
+
+def test_cached_embeddings_round_trip(mock_psycopg2_connect, mocker):
+    """Test looking up and persisting embeddings by content hash."""
+    _, mock_cursor = mock_psycopg2_connect
+    mock_execute_values = mocker.patch("rag.vectordb.postgres_handler.execute_values")
+    handler = PostgresHandler(db_name="test_db", user="user", password="password", host="localhost", port=5432, dimension=1536)
+    mock_cursor.fetchall.return_value = [("hash1", [0.1, 0.2])]
+
+    assert handler.get_cached_embeddings(["hash1", "hash2"]) == {"hash1": [0.1, 0.2]}
+    mock_cursor.execute.assert_any_call(
+        "SELECT content_hash, embedding::real[] FROM embedding_cache WHERE content_hash = ANY(%s);",
+        (["hash1", "hash2"],)
+    )
+    assert handler.get_cached_embeddings([]) == {}
+
+    handler.store_cached_embeddings({"hash2": [0.3, 0.4]}, model="text-embedding-3-small")
+    mock_execute_values.assert_called_once_with(
+        mock_cursor,
+        "INSERT INTO embedding_cache (content_hash, model, embedding) VALUES %s ON CONFLICT (content_hash) DO NOTHING;",
+        [("hash2", "text-embedding-3-small", "[0.3,0.4]")],
+        template="(%s, %s, %s::vector)",
+        page_size=500
+    )
+
+    handler.close()
+
+def test_upsert_vectors_in_batches(mock_psycopg2_connect, mocker):
+    """Test that large documents are written in bounded multi-row batches within one transaction."""
+    _, mock_cursor = mock_psycopg2_connect
+    mock_execute_values = mocker.patch("rag.vectordb.postgres_handler.execute_values")
+    handler = PostgresHandler(db_name="test_db", user="user", password="password", host="localhost", port=5432, dimension=1536)
+    mock_conn = mock_psycopg2_connect[0].return_value
+    mock_conn.commit.reset_mock()
+
+    vectors = [{"id": f"item{i}", "values": [float(i)]} for i in range(5)]
+    vectors.append({"id": "item0", "values": [9.0], "text_content": "updated"})
+
+    handler.upsert_vectors(vectors, level=5, batch_size=2)
+
+    batches = [c.args[2] for c in mock_execute_values.call_args_list]
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    # duplicate ids keep the last vector
+    assert ("item0", "[9.0]", "updated", None) in batches[0]
+    mock_conn.commit.assert_called_once()
+
+def test_postgres_handler_uses_connection_pool(mocker):
+    """Test that the handler opens a bounded pool and records checkout metrics."""
+    mock_pool_class = mocker.patch("rag.vectordb.postgres_handler.pool.ThreadedConnectionPool")
+    handler = PostgresHandler(
+        db_name="test_db", user="user", password="password", host="localhost", port=5432,
+        dimension=1536, min_connections=1, max_connections=4
+    )
+
+    mock_pool_class.assert_called_once_with(
+        1, 4, dbname="test_db", user="user", password="password", host="localhost", port=5432
+    )
+
+    handler.query([0.1, 0.2, 0.3], access_level=1, top_k=3)
+
+    stats = handler.pool_stats()
+    # extension + tables + query
+    assert stats["checkouts"] == 3
+    assert stats["timeouts"] == 0
+    assert stats["avg_wait_seconds"] >= 0
+    assert mock_pool_class.return_value.putconn.call_count == 3
+
+    handler.close()
+    mock_pool_class.return_value.closeall.assert_called_once()
+
+def test_postgres_handler_reconnects_on_connection_failure(mocker):
+    """Test that a dropped connection is discarded and the query is retried on a fresh one."""
+    mock_pool_class = mocker.patch("rag.vectordb.postgres_handler.pool.ThreadedConnectionPool")
+    mock_pool = mock_pool_class.return_value
+    handler = PostgresHandler(
+        db_name="test_db", user="user", password="password", host="localhost", port=5432, dimension=1536
+    )
+
+    broken_conn, healthy_conn = MagicMock(), MagicMock()
+    broken_conn.cursor.return_value.execute.side_effect = psycopg2.OperationalError("server closed the connection")
+    healthy_conn.cursor.return_value.fetchall.return_value = [("id1", "text", 0.1)]
+    mock_pool.getconn.side_effect = [broken_conn, healthy_conn]
+
+    results = handler.query([0.1, 0.2, 0.3], access_level=1)
+
+    assert results == [("id1", "text", 0.1)]
+    mock_pool.putconn.assert_any_call(broken_conn, close=True)
+    mock_pool.putconn.assert_any_call(healthy_conn)
+    assert handler.pool_stats()["reconnects"] == 1
+
+def test_postgres_handler_returns_connection_on_query_error(mocker):
+    """Test that SQL and caller errors hand the connection back, so they cannot exhaust the pool."""
+    mock_pool_class = mocker.patch("rag.vectordb.postgres_handler.pool.ThreadedConnectionPool")
+    mock_pool = mock_pool_class.return_value
+    handler = PostgresHandler(
+        db_name="test_db", user="user", password="password", host="localhost", port=5432,
+        dimension=1536, max_connections=2
+    )
+    checked_out = []
+    mock_pool.getconn.side_effect = lambda: checked_out.append(MagicMock(closed=False)) or checked_out[-1]
+    mock_pool.putconn.side_effect = lambda conn, close=False: checked_out.remove(conn)
+
+    errors = [psycopg2.ProgrammingError("relation does not exist"), psycopg2.IntegrityError("duplicate key"), ValueError("bad row")]
+    for error in errors:
+        def fail(cursor, error=error):
+            raise error
+        with pytest.raises(type(error)):
+            handler._run(fail)
+
+    assert checked_out == []
+    assert handler.pool_stats()["reconnects"] == 0
+    assert handler._run(lambda cursor: "ok") == "ok"
+
+def test_postgres_handler_pool_timeout(mocker):
+    """Test that checkouts fail with a PoolError once every slot is taken for longer than the timeout."""
+    mocker.patch("rag.vectordb.postgres_handler.pool.ThreadedConnectionPool")
+    handler = PostgresHandler(
+        db_name="test_db", user="user", password="password", host="localhost", port=5432,
+        dimension=1536, max_connections=1, pool_timeout=0.01
+    )
+
+    with handler._checkout():
+        with pytest.raises(psycopg2.pool.PoolError, match="Timed out"):
+            handler.query([0.1, 0.2, 0.3], access_level=1)
+
+    assert handler.pool_stats()["timeouts"] == 1
+
+def test_postgres_handler_creates_hnsw_index(mock_psycopg2_connect):
+    """Test that each level table gets an HNSW index whose operator class matches the metric."""
+    _, mock_cursor = mock_psycopg2_connect
+    handler = PostgresHandler(
+        db_name="test_db", user="user", password="password", host="localhost", port=5432,
+        dimension=1536, distance_metric="cosine", hnsw_m=32, hnsw_ef_construction=128
+    )
+
+    mock_cursor.execute.assert_any_call(
+        "CREATE INDEX IF NOT EXISTS index_l3_embedding_idx ON index_l3 "
+        "USING hnsw (embedding vector_cosine_ops) WITH (m = 32, ef_construction = 128);"
+    )
+
+    handler.query([0.1, 0.2, 0.3], access_level=3, top_k=5, ef_search=100)
+
+    mock_cursor.execute.assert_any_call("SET LOCAL hnsw.ef_search = %s;", (100,))
+    assert "embedding <=> %s::vector" in mock_cursor.execute.call_args[0][0]
+    handler.close()
+
+def test_postgres_handler_creates_ivfflat_index(mock_psycopg2_connect):
+    """Test IVFFlat index creation and per-query probes."""
+    _, mock_cursor = mock_psycopg2_connect
+    handler = PostgresHandler(
+        db_name="test_db", user="user", password="password", host="localhost", port=5432,
+        dimension=1536, index_type="ivfflat", ivfflat_lists=50, probes=7
+    )
+
+    mock_cursor.execute.assert_any_call(
+        "CREATE INDEX IF NOT EXISTS index_l1_embedding_idx ON index_l1 "
+        "USING ivfflat (embedding vector_l2_ops) WITH (lists = 50);"
+    )
+
+    handler.query([0.1, 0.2, 0.3], access_level=1)
+
+    mock_cursor.execute.assert_any_call("SET LOCAL ivfflat.probes = %s;", (7,))
+    handler.close()
+
+def test_postgres_handler_rebuild_indexes(mock_psycopg2_connect):
+    """Test that rebuilding builds the new index concurrently, then swaps it in for the old one."""
+    mock_connect, mock_cursor = mock_psycopg2_connect
+    handler = PostgresHandler(db_name="test_db", user="user", password="password", host="localhost", port=5432, dimension=1536)
+    mock_conn = mock_connect.return_value
+    mock_conn.closed = False
+    mock_cursor.execute.reset_mock()
+    autocommit = []
+    mock_cursor.execute.side_effect = lambda *args: autocommit.append(mock_conn.autocommit)
+
+    handler.rebuild_indexes(levels=[2])
+
+    assert mock_cursor.execute.call_args_list == [
+        call("DROP INDEX CONCURRENTLY IF EXISTS index_l2_embedding_idx_new;"),
+        call(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS index_l2_embedding_idx_new ON index_l2 "
+            "USING hnsw (embedding vector_l2_ops) WITH (m = 16, ef_construction = 64);"
+        ),
+        call("DROP INDEX IF EXISTS index_l2_embedding_idx;"),
+        call("ALTER INDEX index_l2_embedding_idx_new RENAME TO index_l2_embedding_idx;"),
+    ]
+    # the concurrent build runs outside a transaction; the swap commits as one
+    assert autocommit == [True, True, False, False]
+    assert mock_conn.autocommit is False
+    handler.close()
+
+def test_postgres_handler_invalid_index_settings(mock_psycopg2_connect):
+    """Test that unknown metrics and index types are rejected."""
+    with pytest.raises(ValueError, match="Unsupported distance metric: manhattan"):
+        PostgresHandler(db_name="test_db", user="user", password="password", host="localhost", port=5432, dimension=1536, distance_metric="manhattan")
+
+    with pytest.raises(ValueError, match="Unsupported index type: btree"):
+        PostgresHandler(db_name="test_db", user="user", password="password", host="localhost", port=5432, dimension=1536, index_type="btree")
+
+    handler = PostgresHandler(db_name="test_db", user="user", password="password", host="localhost", port=5432, dimension=1536, index_type="none")
+    with pytest.raises(ValueError, match="No index type configured to rebuild."):
+        handler.rebuild_indexes()
+
+def test_reindex_command(mocker):
+    """Test that the reindex command builds a handler from the CLI flags and rebuilds its indexes."""
+    mock_handler_class = mocker.patch("rag.vectordb.reindex.PostgresHandler")
+
+    args = parse_args(["--index-type", "ivfflat", "--lists", "200", "--levels", "1", "2"])
+    handler = rebuild(args)
+
+    assert mock_handler_class.call_args.kwargs["index_type"] == "ivfflat"
+    assert mock_handler_class.call_args.kwargs["ivfflat_lists"] == 200
+    # left to the configuration, so the rebuilt indexes match the metric the app queries with
+    assert "distance_metric" not in mock_handler_class.call_args.kwargs
+    assert mock_handler_class.call_args.kwargs["hnsw_m"] is None
+    handler.rebuild_indexes.assert_called_once_with(levels=[1, 2])
+
+    with pytest.raises(SystemExit):
+        parse_args(["--metric", "cosine"])
+
+def test_postgres_handler_index_settings_from_env(mock_psycopg2_connect, monkeypatch):
+    """Test that handlers built without index settings use the VECTOR_* configuration."""
+    _, mock_cursor = mock_psycopg2_connect
+    monkeypatch.setenv("VECTOR_DISTANCE_METRIC", "cosine")
+    monkeypatch.setenv("VECTOR_HNSW_M", "32")
+    monkeypatch.setenv("VECTOR_HNSW_EF_SEARCH", "80")
+
+    handler = PostgresHandler(db_name="test_db", user="user", password="password", host="localhost", port=5432, dimension=1536)
+
+    assert handler.distance_operator == "<=>"
+    assert (handler.index_type, handler.hnsw_m, handler.hnsw_ef_construction, handler.ef_search) == ("hnsw", 32, 64, 80)
+    mock_cursor.execute.assert_any_call(
+        "CREATE INDEX IF NOT EXISTS index_l1_embedding_idx ON index_l1 "
+        "USING hnsw (embedding vector_cosine_ops) WITH (m = 32, ef_construction = 64);"
+    )
+    handler.close()
+
+    monkeypatch.setenv("VECTOR_INDEX_TYPE", "none")
+    assert PostgresHandler(db_name="test_db", user="user", password="password", host="localhost", port=5432, dimension=1536).index_type is None
+
+@pytest.fixture
+def single_table_handler(mock_psycopg2_connect):
+    handler = PostgresHandler(
+        db_name="test_db", user="user", password="password", host="localhost", port=5432,
+        dimension=1536, storage_mode="single_table"
+    )
+    yield handler
+    handler.close()
+
+def test_single_table_creates_partial_indexes(mock_psycopg2_connect, single_table_handler):
+    """Test that single_table mode creates one chunk table with a partial index per access level."""
+    _, mock_cursor = mock_psycopg2_connect
+    executed = [c.args[0] for c in mock_cursor.execute.call_args_list]
+
+    assert any("CREATE TABLE IF NOT EXISTS index_chunks" in sql and "access_level INTEGER NOT NULL" in sql for sql in executed)
+    assert not any("CREATE TABLE IF NOT EXISTS index_l" in sql for sql in executed)
+    assert (
+        "CREATE INDEX IF NOT EXISTS index_chunks_embedding_l2_idx ON index_chunks "
+        "USING hnsw (embedding vector_l2_ops) WITH (m = 16, ef_construction = 64) WHERE access_level <= 2;"
+    ) in executed
+
+def test_single_table_upsert_writes_once(mock_psycopg2_connect, single_table_handler, mocker):
+    """Test that single_table mode writes each vector once, tagged with its access level."""
+    mock_execute_values = mocker.patch("rag.vectordb.postgres_handler.execute_values")
+
+    single_table_handler.upsert_vectors([{"id": "item1", "values": [0.1], "text_content": "a"}], level=2)
+
+    mock_execute_values.assert_called_once()
+    _, sql, rows = mock_execute_values.call_args.args
+    assert sql.startswith("INSERT INTO index_chunks (item_id, access_level, embedding, text_content, document_id)")
+    assert rows == [("item1", "[0.1]", "a", None)]
+    assert mock_execute_values.call_args.kwargs["template"] == "(%s, 2, %s::vector, %s, %s)"
+
+def test_single_table_sync_document_vectors(mock_psycopg2_connect, single_table_handler, mocker):
+    """Test that single_table sync prunes stale chunks and moves kept chunks to the new access level."""
+    _, mock_cursor = mock_psycopg2_connect
+    mocker.patch("rag.vectordb.postgres_handler.execute_values")
+    mock_cursor.execute.reset_mock()
+
+    single_table_handler.sync_document_vectors("doc-1", [], ["a"], level=3)
+
+    mock_cursor.execute.assert_has_calls([
+        call("DELETE FROM index_chunks WHERE document_id = %s AND NOT (item_id = ANY(%s));", ("doc-1", ["a"])),
+        call("UPDATE index_chunks SET access_level = %s WHERE document_id = %s AND access_level <> %s;", (3, "doc-1", 3)),
+    ])
+
+def test_single_table_query_filters_by_access_level(mock_psycopg2_connect, single_table_handler):
+    """Test that single_table queries filter on access_level instead of picking a level table."""
+    _, mock_cursor = mock_psycopg2_connect
+    mock_cursor.fetchall.return_value = [("id1", "text", 0.1)]
+
+    results = single_table_handler.query([0.1, 0.2], access_level=3, top_k=4)
+
+    sql, params = mock_cursor.execute.call_args[0]
+    assert "FROM index_chunks" in sql
+    assert "WHERE access_level <= 3" in sql
+    assert params == ([0.1, 0.2], 4)
+    assert results == [("id1", "text", 0.1)]
+
+def test_single_table_iterative_scan(mock_psycopg2_connect):
+    """Test that the iterative filter strategy uses one index and enables iterative scans per query."""
+    _, mock_cursor = mock_psycopg2_connect
+    handler = PostgresHandler(
+        db_name="test_db", user="user", password="password", host="localhost", port=5432,
+        dimension=1536, storage_mode="single_table", filter_strategy="iterative"
+    )
+
+    mock_cursor.execute.assert_any_call(
+        "CREATE INDEX IF NOT EXISTS index_chunks_embedding_idx ON index_chunks "
+        "USING hnsw (embedding vector_l2_ops) WITH (m = 16, ef_construction = 64);"
+    )
+
+    handler.query([0.1, 0.2], access_level=1)
+
+    mock_cursor.execute.assert_any_call("SET LOCAL hnsw.iterative_scan = relaxed_order;")
+    handler.close()
+
+def test_storage_mode_from_env(mock_psycopg2_connect, monkeypatch):
+    """Test that the storage mode defaults to VECTOR_STORAGE_MODE and rejects unknown values."""
+    monkeypatch.setenv("VECTOR_STORAGE_MODE", "single_table")
+    handler = PostgresHandler(db_name="test_db", user="user", password="password", host="localhost", port=5432, dimension=1536)
+    assert handler.storage_mode == "single_table"
+
+    monkeypatch.setenv("VECTOR_STORAGE_MODE", "sharded")
+    with pytest.raises(ValueError, match="Unsupported storage mode: sharded"):
+        PostgresHandler(db_name="test_db", user="user", password="password", host="localhost", port=5432, dimension=1536)
+
+def test_migrate_to_single_table(mock_psycopg2_connect, single_table_handler):
+    """Test that the legacy level tables that exist are collapsed into the chunk table and optionally dropped."""
+    _, mock_cursor = mock_psycopg2_connect
+    mock_cursor.execute.reset_mock()
+    # index_l1..index_l3 exist, index_l4 and index_l5 do not
+    mock_cursor.fetchone.side_effect = [("index_l1",), ("index_l2",), ("index_l3",), (None,), (None,)]
+    mock_cursor.rowcount = 42
+
+    migrated = single_table_handler.migrate_to_single_table(drop_legacy_tables=True)
+
+    assert migrated == 42
+    executed = [c.args[0] for c in mock_cursor.execute.call_args_list]
+    insert_sql = next(sql for sql in executed if "INSERT INTO index_chunks" in sql)
+    assert "FROM index_l3" in insert_sql
+    assert "FROM index_l4" not in insert_sql
+    assert executed[-3:] == ["DROP TABLE index_l1;", "DROP TABLE index_l2;", "DROP TABLE index_l3;"]
+
+def test_migrate_to_single_table_keeps_document_ids(mock_psycopg2_connect, single_table_handler):
+    """Test that chunks tagged with their document keep the tag, and untagged level tables migrate as NULL."""
+    _, mock_cursor = mock_psycopg2_connect
+    mock_cursor.execute.reset_mock()
+    mock_cursor.fetchone.side_effect = [("index_l1",), ("index_l2",), (None,), (None,), (None,)]
+    # index_l1 was written since chunks were tracked per document, index_l2 never was
+    mock_cursor.fetchall.side_effect = [[("index_l1",)]]
+
+    single_table_handler.migrate_to_single_table()
+
+    executed = [c.args[0] for c in mock_cursor.execute.call_args_list]
+    insert_sql = next(sql for sql in executed if "INSERT INTO index_chunks" in sql)
+    assert "document_id AS document_id FROM index_l1" in insert_sql
+    assert "NULL::text AS document_id FROM index_l2" in insert_sql
+    assert "INSERT INTO index_chunks (item_id, access_level, embedding, text_content, document_id)" in insert_sql
+    assert "access_level, item_id, embedding, text_content, document_id" in insert_sql
+
+def test_migrate_requires_single_table_mode(mock_psycopg2_connect):
+    """Test that migrating from a per_level handler is rejected."""
+    handler = PostgresHandler(db_name="test_db", user="user", password="password", host="localhost", port=5432, dimension=1536)
+    with pytest.raises(ValueError, match="single_table storage mode"):
+        handler.migrate_to_single_table()
+
+def test_migrate_single_table_command(mocker):
+    """Test that the migration command runs the migration on a single_table handler and closes it."""
+    mock_handler_class = mocker.patch("rag.vectordb.migrate_single_table.PostgresHandler")
+    mock_handler_class.return_value.migrate_to_single_table.return_value = 7
+
+    rows = migrate(parse_migrate_args(["--drop-legacy-tables"]))
+
+    assert rows == 7
+    assert mock_handler_class.call_args.kwargs["storage_mode"] == "single_table"
+    mock_handler_class.return_value.migrate_to_single_table.assert_called_once_with(drop_legacy_tables=True)
+    mock_handler_class.return_value.close.assert_called_once()
+
+def test_initialize_tables_skips_existing_ddl(mock_psycopg2_connect):
+    """Test that the column and indexes that already exist are not altered or recreated on startup."""
+    _, mock_cursor = mock_psycopg2_connect
+    mock_cursor.fetchall.side_effect = [
+        [("index_chunks",)],
+        [("index_chunks_document_id_idx",), ("index_chunks_embedding_idx",)],
+    ]
+
+    handler = PostgresHandler(
+        db_name="test_db", user="user", password="password", host="localhost", port=5432,
+        dimension=1536, storage_mode="single_table", filter_strategy="iterative"
+    )
+
+    executed = [c.args[0] for c in mock_cursor.execute.call_args_list]
+    assert not any(sql.startswith("ALTER TABLE") for sql in executed)
+    assert not any(sql.startswith("CREATE INDEX") for sql in executed)
+    handler.close()
+
+def test_initialize_tables_adds_missing_ddl(mock_psycopg2_connect, monkeypatch):
+    """Test that only the tables missing the document_id column or an index get the DDL."""
+    _, mock_cursor = mock_psycopg2_connect
+    monkeypatch.setenv("TOTAL_ACCESS_LEVELS", "2")
+    mock_cursor.fetchall.side_effect = [
+        [("index_l1",), ("index_l2",)],
+        [("index_l1_document_id_idx",), ("index_l1_embedding_idx",), ("index_l2_embedding_idx",)],
+    ]
+
+    handler = PostgresHandler(
+        db_name="test_db", user="user", password="password", host="localhost", port=5432,
+        dimension=1536
+    )
+
+    executed = [c.args[0] for c in mock_cursor.execute.call_args_list]
+    assert [sql for sql in executed if sql.startswith(("ALTER TABLE", "CREATE INDEX"))] == [
+        "CREATE INDEX IF NOT EXISTS index_l2_document_id_idx ON index_l2 (document_id);",
+    ]
+    handler.close()
+
+def test_delete_untracked_chunks(mock_psycopg2_connect, single_table_handler):
+    """Test that chunks without a document_id are deleted from the chunk tables of the storage mode."""
+    _, mock_cursor = mock_psycopg2_connect
+    mock_cursor.execute.reset_mock()
+    mock_cursor.rowcount = 12
+
+    deleted = single_table_handler.delete_untracked_chunks()
+
+    assert deleted == 12
+    mock_cursor.execute.assert_called_once_with("DELETE FROM index_chunks WHERE document_id IS NULL;")
+
+def test_delete_untracked_command(mocker):
+    """Test that the cleanup command deletes the untracked chunks and closes the handler."""
+    mock_handler_class = mocker.patch("rag.vectordb.delete_untracked.PostgresHandler")
+    mock_handler_class.return_value.delete_untracked_chunks.return_value = 3
+
+    rows = delete_untracked(parse_delete_untracked_args([]))
 
-    handler.close()
\ No newline at end of file
+    assert rows == 3
+    mock_handler_class.return_value.delete_untracked_chunks.assert_called_once_with()
+    mock_handler_class.return_value.close.assert_called_once()
@@ -4,7 +4,7 @@ CREATE TYPE message_adapters AS ENUM('SLACK');
 
 CREATE TYPE login_methods AS ENUM('GOOGLE');
 
-CREATE TYPE document_type AS ENUM ('csv', 'pdf', 'txt');
+CREATE TYPE document_type AS ENUM ('csv', 'pdf', 'txt', 'xlsx');
 
 CREATE TYPE reactions AS ENUM('POSITIVE', 'NEGATIVE');
 